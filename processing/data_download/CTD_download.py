@@ -6,6 +6,11 @@
 
 import pandas as pd
 import os
+import sys
+
+# Shared processing helpers live in ../tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import profile_store
 
 # Define the URL
 url = 'https://erddap.ondeckdata.com/erddap/tabledap/shelf_fleet_profiles_1m_binned.htmlTable?sea_pressure%2Clatitude%2Clongitude%2Ctemperature%2Cconductivity%2Cchlorophyll%2Cdescent_rate%2Cacceleration%2Cpractical_salinity%2Cabsolute_salinity%2Cconservative_temperature%2Cdensity%2Cprofile_id%2Cproject_id%2Ctime&time>=2024-08-01T00%3A00%3A00Z'
@@ -236,4 +241,8 @@ for profile in processed_data.keys():
 # Save combined metadata CSV
 metadata_df = pd.DataFrame(metadata_list)
 metadata_filename = f"{output_dir}/metadata.csv"
-metadata_df.to_csv(metadata_filename, index=False)
\ No newline at end of file
+metadata_df.to_csv(metadata_filename, index=False)
+
+# Every profile in one ragged-array file (profiles.nc) plus its columnar
+# JSON for the dashboard (profiles.json), so readers load the month in one go
+profile_store.write(output_dir, metadata_df, processed_data, 'CTD')
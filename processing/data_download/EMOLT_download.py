@@ -17,6 +17,11 @@ from erddapy import ERDDAP
 import pandas as pd
 import os
 import random
+import sys
+
+# Shared processing helpers live in ../tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import profile_store
 
 # Initialize ERDDAP server connection
 e = ERDDAP(
@@ -146,6 +151,6 @@ metadata_df = pd.DataFrame(metadata_list)
 metadata_filename = f"{output_dir}/metadata.csv"
 metadata_df.to_csv(metadata_filename, index=False)
 
-
-
-
+# Every tow in one ragged-array file (profiles.nc) plus its columnar JSON for
+# the dashboard (profiles.json), so readers load them in one go
+profile_store.write(output_dir, metadata_df, processed_data, 'EMOLT')
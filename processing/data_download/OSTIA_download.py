@@ -9,6 +9,10 @@ except Exception as exc:
     print(f"ERROR: copernicusmarine is required but not importable: {exc}")
     sys.exit(1)
 
+# Shared processing helpers live in ../tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import manifest
+
 
 DATASET_ID = "METOFFICE-GLO-SST-L4-NRT-OBS-SST-V2"
 VARIABLES = [
@@ -108,6 +112,10 @@ def main(argv=None) -> int:
     output_dir = args.output_dir
     ensure_directory(output_dir)
 
+    # Date index read by the figure scripts instead of listing the directory
+    files = manifest.load(output_dir)
+    n_indexed = len(files)
+
     for cur_date in iter_dates(start_dt, end_dt):
         date_str = cur_date.isoformat()
         # print(f"Checking data for {date_str}...")
@@ -117,6 +125,7 @@ def main(argv=None) -> int:
 
         if os.path.isfile(expected_path):
             # print(f"File for {date_str} already exists. Skipping download.")
+            files[date_str] = expected_filename
             continue
 
         print(f"Downloading data for {date_str}...")
@@ -150,8 +159,15 @@ def main(argv=None) -> int:
                 f"ERROR downloading {date_str}: {exc}\n"
                 # "Hint: ensure 'copernicusmarine login' has been run and consider setting --service files"
             )
+            manifest.write(output_dir, files)
             return 2
 
+        if os.path.isfile(expected_path):
+            files[date_str] = expected_filename
+
+    if len(files) != n_indexed and not args.dry_run:
+        manifest.write(output_dir, files)
+
     print("Download process completed!")
     return 0
 
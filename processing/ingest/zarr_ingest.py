@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Append newly downloaded gridded files to the per-product Zarr cubes
+# (see ../tools/zarr_cube.py for the store layout and reader), then bring the
+# time-chunked series stores up to date (../tools/series_store.py).
+import os
+import sys
+import shutil
+
+# Shared processing helpers live in ../tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import zarr_cube
+import series_store
+
+
+def parse_args(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Append new raw files to the chunked, region-cropped Zarr cube of each gridded product."
+    )
+    parser.add_argument(
+        "products",
+        nargs="*",
+        choices=sorted(zarr_cube.PRODUCTS),
+        help="Products to ingest. Default: all",
+    )
+    parser.add_argument(
+        "--store-dir",
+        default=os.environ.get("ZARR_STORE_DIR", zarr_cube.DEFAULT_STORE_DIR),
+        help=f"Directory holding the <product>.zarr cubes. Default: {zarr_cube.DEFAULT_STORE_DIR}",
+    )
+    parser.add_argument(
+        "--batch",
+        type=int,
+        default=int(os.environ.get("ZARR_BATCH", zarr_cube.DEFAULT_BATCH)),
+        help=f"Raw files per append. Default: {zarr_cube.DEFAULT_BATCH}",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Delete each cube (and series store with its tail) and re-ingest its whole raw archive (picks up back-filled files).",
+    )
+    parser.add_argument(
+        "--fold",
+        action="store_true",
+        help="Fold each series store's tail of recent days into its long time chunks now (periodic compaction).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+
+    args = parse_args(argv)
+    products = args.products or sorted(zarr_cube.PRODUCTS)
+
+    failed = []
+    for product in products:
+        path = zarr_cube.store_path(product, args.store_dir)
+        series_path = series_store.series_path(product, args.store_dir)
+        if args.rebuild:
+            for old in (path, series_path, series_store.tail_path(product, args.store_dir)):
+                if os.path.exists(old):
+                    print(f"Removing {old} for rebuild")
+                    shutil.rmtree(old)
+        try:
+            n = zarr_cube.append_files(product, store_dir=args.store_dir, batch=args.batch)
+        except Exception as exc:
+            print(f"ERROR ingesting {product}: {exc}")
+            failed.append(product)
+            continue
+        print(f"SUMMARY: {product}: {n} new step(s) in {path}")
+
+        # Products queried over long periods also get a time-chunked copy
+        if product in series_store.SERIES:
+            try:
+                n = series_store.sync(product, store_dir=args.store_dir, fold=args.fold)
+            except Exception as exc:
+                print(f"ERROR syncing {product} series store: {exc}")
+                failed.append(product)
+                continue
+            print(f"SUMMARY: {product}: {n} new step(s) in {series_path}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,26 @@
+#!/bin/bash
+
+# Source logging utilities
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+source "$SCRIPT_DIR/../tools/log_utils.sh"
+
+# Setup logging
+LOGDIR="$SCRIPT_DIR/logs"
+mkdir -p "$LOGDIR"
+exec >> "$LOGDIR/zarr_ingest.log" 2>&1
+
+# Cubes live here (one <product>.zarr per gridded product); override from cron if needed
+export ZARR_STORE_DIR="${ZARR_STORE_DIR:-/vast/clidex/data/obs/CCCFA/zarr}"
+
+# Log start and take snapshot
+log_changes "start" "$ZARR_STORE_DIR"
+
+# Activate environment and run
+source ~/mambaforge/etc/profile.d/conda.sh
+conda activate CCCFA
+cd "$SCRIPT_DIR"
+python zarr_ingest.py "$@"
+conda deactivate
+
+# Log end and show changes
+log_changes "end" "$ZARR_STORE_DIR"
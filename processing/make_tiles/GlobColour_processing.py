@@ -7,19 +7,22 @@
 import xarray as xr
 import numpy as np
 import rasterio
-import subprocess
 from rasterio.transform import from_origin
 from rasterio.transform import from_bounds
 import matplotlib.pyplot as plt
 import cmocean
 import pyproj
 import os
+import sys
 from pyproj import Transformer
-import shutil
 import json
 from datetime import datetime
 from pathlib import Path
-from rasterio.warp import calculate_default_transform, reproject, Resampling
+
+# Shared processing helpers live in ../tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import tile_engine
+import parallel
 
 
 # In[110]:
@@ -32,9 +35,11 @@ raw_data_dir = os.path.join(base_dir, 'raw_data', 'CHL', 'GlobColour', 'daily')
 tiles_dir = os.path.join(base_dir, 'processed_data', 'CHL', 'tiles')
 os.makedirs(tiles_dir, exist_ok=True)
 
-# Path for the temp_files directory
-temp_files_dir = os.path.join(base_dir, 'processed_data', 'CHL', 'temp_files')
-os.makedirs(temp_files_dir, exist_ok=True)
+# Colormap lookup table (index 0 transparent, 1-255 speed) and the matching
+# color-relief file kept alongside the tiles
+chl_lut = tile_engine.colormap_lut(cmocean.cm.speed)
+color_filename = os.path.join(base_dir, 'processed_data', 'CHL', 'thermal_colormap.txt')
+tile_engine.write_colormap_file(color_filename, chl_lut)
 
 # Get list of existing tile dates
 existing_tiles = set()
@@ -78,41 +83,27 @@ print(raw_files_to_process)
 
 
 #Attempt at dynamic log scaling
-def apply_log_scaling(data):
-    """Apply log transformation and normalize based on actual data min/max, handling masked values properly."""
-    
-    # Convert to masked array, preserving NaNs
-    masked_data = np.ma.masked_invalid(data)
-    
-    # Extract actual min/max ignoring NaNs (2nd and 98th percentiles to avoid outliers)
-    valid_data = masked_data.compressed()  # Convert MaskedArray to regular array
-    if valid_data.size == 0:  # If all values are NaN, return empty
-        return masked_data
-    
+def log_scaling_limits(valid_data):
+    """Log10 stretch limits from the actual data min/max (0th and 99th percentiles to avoid outliers)."""
     data_min, data_max = np.percentile(valid_data, [0, 99])
     
     # Ensure log safety
     data_min = max(data_min, 0.001)  # Avoid log10(0)
     data_max = max(data_max, data_min * 20)  # Prevent zero range
     
-    # Compute log scaling
-    log_min, log_max = np.log10(data_min), np.log10(data_max)
-    log_data = np.ma.log10(np.clip(masked_data, data_min, data_max))
+    return np.log10(data_min), np.log10(data_max)
 
-    # Normalize to 1-255 range
-    scaled_data = 1 + (254 * (log_data - log_min) / (log_max - log_min))
 
-    # Preserve NoData values
-    return np.ma.masked_where(masked_data.mask, scaled_data)
+def apply_log_scaling(log_data, log_min, log_max):
+    """Stretch log10 values onto the 1-255 color indices; NaN (nodata) stays NaN."""
+    # Normalize to 1-255 range
+    return 1 + (254 * (np.clip(log_data, log_min, log_max) - log_min) / (log_max - log_min))
 
 
 # In[95]:
 
 
 files = []
-chl_data = {}
-chl = {}
-chl_stats = {}
 
 # Get list of files and sort by date
 for filename in os.listdir(raw_data_dir):
@@ -126,348 +117,8 @@ for filename in os.listdir(raw_data_dir):
 # Sort files by date
 files.sort(key=lambda x: x[0])
 
-# Iterate over files
-for date_int, filename in files:
-    file_path = os.path.join(raw_data_dir, filename)
-    dict_key = f"{date_int}"
-
-    # Open dataset
-    chl_data[dict_key] = xr.open_dataset(file_path)
-    #chl[dict_key] = chl_data[dict_key]['CHL'].squeeze()
-    chl[dict_key] = chl_data[dict_key]['CHL'].isel(time=0).squeeze()
-
-
-    # Mask NaN values before applying log scaling
-    chl_masked = np.ma.masked_invalid(chl[dict_key])
-    
-    #chl_min_original, chl_max_original = np.nanpercentile(chl_masked.compressed(), [0, 99])
-
-    #Update that allows for empty arrays
-    valid_data = chl_masked.compressed()  # Convert MaskedArray to a regular array of valid (non-NaN) values
-
-    if valid_data.size == 0:
-        # If there's NO data at all for this region/time, skip percentile or set them to NaN
-        print(f"[WARNING] No valid data for {dict_key}. Creating empty TIF with all NaN.")
-
-        # Create an array of all masked values
-        chl_scaled = np.ma.masked_all_like(chl_masked)
-
-        # Optionally record NaN range, or skip
-        chl_min_original, chl_max_original = np.nan, np.nan
-    else:
-        # If we have at least some data, do your usual percentile calculations
-        chl_min_original, chl_max_original = np.nanpercentile(valid_data, [0, 99])
-
-        # Apply your log scaling function
-        chl_scaled = apply_log_scaling(chl_masked)
-
-
-
-    # Apply log scaling WITHOUT losing masked values
-    chl_scaled = apply_log_scaling(chl_masked)  # No .filled(np.nan)!
-    
-    chl_stats[dict_key] = {'min': float(chl_min_original), 'max': float(chl_max_original)}
-
-    # Assign CRS if missing
-    if 'crs' not in chl_data[dict_key].attrs:
-        chl_data[dict_key] = chl_data[dict_key].rio.write_crs("EPSG:32662")
-
-    #print(f"Assigned CRS for {filename}: {chl_data[dict_key].rio.crs}")
-
-    # Extract coordinate bounds
-    lon_min, lon_max = chl_data[dict_key]['longitude'].values.min(), chl_data[dict_key]['longitude'].values.max()
-    lat_min, lat_max = chl_data[dict_key]['latitude'].values.min(), chl_data[dict_key]['latitude'].values.max()
-
-    #print(f"Latitude order before checking: {chl_data[dict_key]['latitude'].values}")
-
-    # **Ensure CRS is EPSG:4326**
-    if -180 <= lon_min <= 180 and -90 <= lat_min <= 90:
-        #print(f"Data appears to be in degrees; setting CRS as EPSG:4326 for {filename}.")
-        chl_data[dict_key] = chl_data[dict_key].rio.write_crs("EPSG:4326")
-    
-    # **If CRS is EPSG:32662, reproject to EPSG:4326**
-    if chl_data[dict_key].rio.crs.to_epsg() == 32662:
-        chl_data[dict_key] = chl_data[dict_key].rio.reproject("EPSG:4326")
-
-        #print(f"Reprojected {filename} to EPSG:4326.")
-
-    # **Check if latitude is inverted**
-    if chl_data[dict_key]['latitude'][0] < chl_data[dict_key]['latitude'][-1]:  
-        #print(f"Flipping latitude order for {filename}")
-        
-        # Flip data **AND** latitude axis
-        chl_scaled = np.flipud(chl_scaled)  
-        chl_data[dict_key] = chl_data[dict_key].assign_coords(
-            latitude=chl_data[dict_key]['latitude'][::-1]
-        )
-
-    #print(f"Latitude order AFTER checking: {chl_data[dict_key]['latitude'].values}")
-
-    # **Define correct transform**
-    transform = from_bounds(
-        lon_min, lat_max,  # Top-left (max latitude)
-        lon_max, lat_min,  # Bottom-right (min latitude)
-        chl[dict_key].shape[1],  # Raster width (columns)
-        chl[dict_key].shape[0]   # Raster height (rows)
-    )
-
-    # **Save as GeoTIFF**
-    output_file = os.path.join(temp_files_dir, f"chl_data_{dict_key}.tif")
-    with rasterio.open(
-        output_file,
-        'w',
-        driver='GTiff',
-        height=chl_scaled.shape[0],
-        width=chl_scaled.shape[1],
-        count=1,
-        dtype=str(chl_scaled.dtype),
-        crs="EPSG:4326",
-        transform=transform
-    ) as dst:
-        dst.write(chl_scaled.filled(np.nan), 1)
-
-    print(f"Saved GeoTIFF: {output_file}")
-
-
-# In[96]:
-
-
-#chl_stats
-
-
-# In[97]:
-
-
-# test_file = "/home/finn.wimberly/Documents/CCCFA_app_dev/data/processed_data/CHL/temp_files/chl_data_20240801.tif"
-
-# with rasterio.open(test_file) as src:
-#     img = src.read(1)  # Read first band
-#     plt.imshow(np.ma.masked_invalid(img), cmap="viridis")
-#     plt.colorbar()
-#     plt.title("CHL Data (First File)")
-#     plt.show()
-
-
-# In[98]:
-
-
-# Reproject GeoTIFFs to EPSG:3857
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('.tif') or "3857" in filename:
-        continue
-        
-    # Open the original GeoTIFF
-    input_tiff = os.path.join(temp_files_dir, filename)
-    
-    date_str = filename.split('_')[2].split('.')[0]
-    output_tiff = os.path.join(temp_files_dir, f"chl_data_{date_str}_3857.tif")
-
-    with rasterio.open(input_tiff) as src:
-        # Get the original latitude range
-        lat_min, lat_max = src.bounds.bottom, src.bounds.top
-
-        # Check if latitude axis is inverted
-        if lat_min > lat_max:
-            #print(f"Flipping latitude for {filename}")
-            img_data = src.read(1)
-            img_data = np.flipud(img_data)  # Flip image vertically
-        else:
-            img_data = src.read(1)
-
-        # Calculate new transformation for reprojection
-        transform, width, height = calculate_default_transform(
-            src.crs, "EPSG:3857", src.width, src.height, *src.bounds
-        )
-
-        # Update metadata
-        kwargs = src.meta.copy()
-        kwargs.update({
-            "crs": "EPSG:3857",
-            "transform": transform,
-            "width": width,
-            "height": height
-        })
-
-        # Write reprojected GeoTIFF
-        with rasterio.open(output_tiff, "w", **kwargs) as dst:
-            reproject(
-                source=img_data,
-                destination=rasterio.band(dst, 1),
-                src_transform=src.transform,
-                src_crs=src.crs,
-                dst_transform=transform,
-                dst_crs="EPSG:3857",
-                resampling=Resampling.bilinear
-            )
-
-    #print(f"Saved reprojected GeoTIFF: {output_tiff}")
-
-
-# In[99]:
-
-
-# test_file = "/home/finn.wimberly/Documents/CCCFA_app_dev/data/processed_data/CHL2/temp_files/chl_data_20240801_3857.tif"
-
-# with rasterio.open(test_file) as src:
-#     img = src.read(1)  # Read first band
-#     plt.imshow(np.ma.masked_invalid(img), cmap="viridis")
-#     plt.colorbar()
-#     plt.title("CHL Data (Second File)")
-#     plt.show()
-
-
-# In[100]:
-
-
-# Generate VRT files
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('_3857.tif'):
-        continue
-
-    date_str = filename.split('_')[2].split('.')[0]
-    tiff_3857 = os.path.join(temp_files_dir, filename)
-    vrt_file = os.path.join(temp_files_dir, f"chl_data_{date_str}.vrt")
-
-    #print(f"Creating VRT for {filename}...")
-
-    subprocess.run([
-        'gdal_translate', '-of', 'VRT', '-a_srs', 'EPSG:3857', 
-        tiff_3857, vrt_file
-    ])
-
-    #print(f"Created VRT: {vrt_file}")
-
-
-# In[101]:
-
-
-# Step 3: Generate colorized VRTs
-# Create colormap file for gdaldem color-relief
-color_filename = os.path.join(base_dir, 'processed_data', 'CHL', 'thermal_colormap.txt')
-
-colors = cmocean.cm.speed(np.linspace(0, 1, 255))  # Use 255 colors
-with open(color_filename, 'w') as f:
-    f.write("0 0 0 0 0\n")  # Transparent for masked values
-    for i, color in enumerate(colors, start=1):
-        f.write(f"{i} {int(color[0]*255)} {int(color[1]*255)} {int(color[2]*255)} 255\n")
-
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('.vrt'):
-        continue
-
-    date_str = filename.split('_')[2].split('.')[0]
-    vrt_file = os.path.join(temp_files_dir, filename)
-    colored_vrt_file = os.path.join(temp_files_dir, f"colored_{date_str}.vrt")
-
-    #print(f"Creating colorized VRT for {filename}...")
-
-    subprocess.run([
-        'gdaldem', 'color-relief', vrt_file, color_filename, colored_vrt_file, '-of', 'VRT', '-alpha'
-    ])
-
-    #print(f"Created colorized VRT: {colored_vrt_file}")
-
-
-# In[102]:
-
-
-# Generate XYZ Tiles with gdal2tiles.py
-for filename in os.listdir(temp_files_dir):
-    if not filename.startswith('color'):
-        continue
-
-    raw_date_str = filename.split('_')[1].split('.')[0]
-    #print(raw_date_str)
-    year = raw_date_str[:4]
-    month = raw_date_str[4:6]
-    day = raw_date_str[6:8]
-
-    # Convert MMDD to DDD (Julian Day)
-    date_obj = datetime(int(year), int(month), int(day))
-    day_of_year = date_obj.timetuple().tm_yday
-
-    # Format YYYY_DDD
-    date_str = f"{year}_{day_of_year:03d}"
-    #print(date_str)
-
-    # Define paths
-    colored_vrt_file = os.path.join(temp_files_dir, f"colored_{raw_date_str}.vrt")
-    tiles_directory = os.path.join(tiles_dir, date_str)
-    #print(tiles_directory)
-
-    print(f"Creating tiles in: {tiles_directory}")
-
-    subprocess.run([
-        'gdal2tiles.py', 
-        '--config', 'GDAL_PAM_ENABLED', 'NO',
-        '-p', 'mercator', 
-        '-z', '0-7', 
-        '-r', 'bilinear', 
-        '-w', 'none',
-        '--xyz',
-        colored_vrt_file, 
-        tiles_directory
-    ])
-
-    #print(f"Generated tiles for {date_str} in {tiles_directory}")
-
-
-# In[103]:
-
-
-# Iterate over chl_stats dictionary
-for dict_key in chl_stats.keys():
-  # Convert dict_key (YYYYMMDD) -> (YYYY_DDD)
-  year = dict_key[:4]  # Extract year (YYYY)
-  month = dict_key[4:6]  # Extract month (MM)
-  day = dict_key[6:8]  # Extract day (DD)
-
-  # Convert to day-of-year (DDD)
-  date_obj = datetime.strptime(f"{year}{month}{day}", "%Y%m%d")
-  doy = date_obj.timetuple().tm_yday  # Get day-of-year (1-365)
-
-  # Construct new directory name in YYYY_DDD format
-  out_dir = os.path.join(tiles_dir, f"{year}_{doy:03d}")  # Ensure DDD is 3-digit
-  #print(out_dir)
-
-  # Create a dictionary with the chlorophyll range
-  chl_range = {
-      "min_chl": chl_stats[dict_key]['min'],
-      "max_chl": chl_stats[dict_key]['max']
-  }
-
-  # Save JSON file in the correct tiles folder
-  json_file_path = os.path.join(out_dir, "chl_range_global.json")
-  with open(json_file_path, "w") as f:
-      json.dump(chl_range, f, indent=4)
-
-  #print(f"Saved range stats for {dict_key} ({year}_{doy:03d}) to {json_file_path}")
-
-
-# In[107]:
-
-
-#Clean up files
-shutil.rmtree(temp_files_dir)
 
-# Path for the temp_files directory
-temp_files_dir = os.path.join(base_dir, 'processed_data', 'CHL', 'temp_files')
-os.makedirs(temp_files_dir, exist_ok=True)
-
-
-# Cape cod tiles:
-
-# In[105]:
-
-
-tiles_dir = os.path.join(base_dir, 'processed_data', 'CHL', 'tiles')
-os.makedirs(tiles_dir, exist_ok=True)
-
-
-# In[112]:
-
-
-# Define the bounds in lat/lon
+# Cape cod bounds in lat/lon
 cape_cod_bounds_latlon = {
     'min_lon': -74,
     'max_lon': -66,
@@ -475,370 +126,149 @@ cape_cod_bounds_latlon = {
     'max_lat': 43.5
 }
 
-files = []
-chl_data = {}
-chl = {}
-chl_stats = {}
+# Regions tiled from each file in one pass: the full file extent at zoom 0-7
+# and the refined Cape Cod view at zoom 8-10 share one read and one
+# reprojection; each gets its own log stretch and range JSON
+regions = [
+    {'bounds': None, 'zooms': range(0, 8), 'json_name': "chl_range_global.json"},
+    {'bounds': cape_cod_bounds_latlon, 'zooms': range(8, 11), 'json_name': "chl_range_local.json"},
+]
 
-# Get list of files and sort by date
-for filename in os.listdir(raw_data_dir):
-    if filename.endswith('.nc'):
-        date_part = filename.split('_')[-1].split('.')[0]  # Extract "2025-02-02"
-        date_cleaned = date_part.replace("-", "")  # "20250202"
-        date_int = int(date_cleaned)
-        if filename in raw_files_to_process:
-            files.append((date_int, filename))
 
-# Sort files by date
-files.sort(key=lambda x: x[0])
+def process_chl_date(date_int, filename, regions):
+    """Log-scale, reproject and tile one GlobColour file for every region; returns (dict_key, {json_name: stats}).
 
-# Process files
-for date_int, filename in files:  # Process only the first 3 files for testing
+    The log10 field is reprojected once; each region's stretch (from the
+    values inside its bounds, or the whole file for bounds=None) is applied
+    to the projected array, which is only tiled within the region.
+    """
     file_path = os.path.join(raw_data_dir, filename)
     dict_key = f"{date_int}"
 
     # Open dataset
-    chl_data[dict_key] = xr.open_dataset(file_path)
-
-    # Extract CHL variable
-    #chl_var = chl_data[dict_key]['CHL'].squeeze()
-    chl_var = chl_data[dict_key]['CHL'].isel(time=0).squeeze()
-
-
-    # Mask values outside the Cape Cod region
-    chl_var_masked = chl_var.where(
-        (chl_data[dict_key]['longitude'] >= cape_cod_bounds_latlon['min_lon']) &
-        (chl_data[dict_key]['longitude'] <= cape_cod_bounds_latlon['max_lon']) &
-        (chl_data[dict_key]['latitude'] >= cape_cod_bounds_latlon['min_lat']) &
-        (chl_data[dict_key]['latitude'] <= cape_cod_bounds_latlon['max_lat']),
-        np.nan  # Set everything outside the bounds to NaN
-    )
-
-    # Store the masked CHL data
-    chl[dict_key] = chl_var_masked
+    with xr.open_dataset(file_path) as chl_data:
+        chl = chl_data['CHL'].isel(time=0).squeeze().load()
+
+        # log10 field shared by every region (floored like the stretch limits);
+        # NaN (land, cloud, no data) stays NaN so it is tiled transparent
+        chl_values = chl.values
+        with np.errstate(invalid='ignore'):
+            chl_log = np.where(np.isfinite(chl_values), np.log10(np.maximum(chl_values, 0.001)), np.nan)
+
+        # Mask NaN values per region before computing the stretch
+        region_valid = {}
+        for region in regions:
+            region_bounds = region['bounds']
+            region_chl = chl
+            if region_bounds is not None:
+                region_chl = chl.where(
+                    (chl_data['longitude'] >= region_bounds['min_lon']) &
+                    (chl_data['longitude'] <= region_bounds['max_lon']) &
+                    (chl_data['latitude'] >= region_bounds['min_lat']) &
+                    (chl_data['latitude'] <= region_bounds['max_lat']),
+                    np.nan  # Set everything outside the bounds to NaN
+                )
+            region_valid[region['json_name']] = np.ma.masked_invalid(region_chl).compressed()
+
+        # Assign CRS if missing
+        if 'crs' not in chl_data.attrs:
+            chl_data = chl_data.rio.write_crs("EPSG:32662")
+
+        # Extract coordinate bounds
+        lon_min, lon_max = chl_data['longitude'].values.min(), chl_data['longitude'].values.max()
+        lat_min, lat_max = chl_data['latitude'].values.min(), chl_data['latitude'].values.max()
+
+        # **Ensure CRS is EPSG:4326**
+        if -180 <= lon_min <= 180 and -90 <= lat_min <= 90:
+            chl_data = chl_data.rio.write_crs("EPSG:4326")
     
-    chl_masked = np.ma.masked_invalid(chl[dict_key])
-    valid_data = chl_masked.compressed()  # Convert MaskedArray to a regular array of valid (non-NaN) values
-
-    if valid_data.size == 0:
-        # If there's NO data at all for this region/time, skip percentile or set them to NaN
-        print(f"[WARNING] No valid data for {dict_key}. Creating empty TIF with all NaN.")
-
-        # Create an array of all masked values
-        chl_scaled = np.ma.masked_all_like(chl_masked)
-
-        # Optionally record NaN range, or skip
-        chl_min_original, chl_max_original = np.nan, np.nan
-    else:
-        # If we have at least some data, do your usual percentile calculations
-        chl_min_original, chl_max_original = np.nanpercentile(valid_data, [0, 99])
-
-        # Apply your log scaling function
-        chl_scaled = apply_log_scaling(chl_masked)
-
-    # (Optional) Store or print your min/max stats in chl_stats
-    chl_stats[dict_key] = {'min': float(chl_min_original), 'max': float(chl_max_original)}
-
-#     # Convert to masked array
-#     chl_masked = np.ma.masked_invalid(chl[dict_key])
-    
-#     chl_min_original, chl_max_original = np.nanpercentile(chl_masked.compressed(), [0, 99])
-
-
-#     # Apply log scaling WITHOUT losing masked values
-#     chl_scaled = apply_log_scaling(chl_masked)  # No .filled(np.nan)!
-    
-#     chl_stats[dict_key] = {'min': float(chl_min_original), 'max': float(chl_max_original)}
-
-    # Assign CRS if missing
-    if 'crs' not in chl_data[dict_key].attrs:
-        chl_data[dict_key] = chl_data[dict_key].rio.write_crs("EPSG:32662")
-
-    #print(f"Assigned CRS for {filename}: {chl_data[dict_key].rio.crs}")
-
-    # Extract coordinate bounds
-    lon_min, lon_max = chl_data[dict_key]['longitude'].values.min(), chl_data[dict_key]['longitude'].values.max()
-    lat_min, lat_max = chl_data[dict_key]['latitude'].values.min(), chl_data[dict_key]['latitude'].values.max()
-
-    #print(f"Latitude order before checking: {chl_data[dict_key]['latitude'].values}")
-
-    # **Ensure CRS is EPSG:4326**
-    if -180 <= lon_min <= 180 and -90 <= lat_min <= 90:
-        #print(f"Data appears to be in degrees; setting CRS as EPSG:4326 for {filename}.")
-        chl_data[dict_key] = chl_data[dict_key].rio.write_crs("EPSG:4326")
-    
-    # **If CRS is EPSG:32662, reproject to EPSG:4326**
-    if chl_data[dict_key].rio.crs.to_epsg() == 32662:
-        chl_data[dict_key] = chl_data[dict_key].rio.reproject("EPSG:4326")
-
-        #print(f"Reprojected {filename} to EPSG:4326.")
-
-    # **Check if latitude is inverted**
-    if chl_data[dict_key]['latitude'][0] < chl_data[dict_key]['latitude'][-1]:  
-        #print(f"Flipping latitude order for {filename}")
-        
-        # Flip data **AND** latitude axis
-        chl_scaled = np.flipud(chl_scaled)  
-        chl_data[dict_key] = chl_data[dict_key].assign_coords(
-            latitude=chl_data[dict_key]['latitude'][::-1]
-        )
-
-    #print(f"Latitude order AFTER checking: {chl_data[dict_key]['latitude'].values}")
+        # **If CRS is EPSG:32662, reproject to EPSG:4326**
+        if chl_data.rio.crs.to_epsg() == 32662:
+            chl_data = chl_data.rio.reproject("EPSG:4326")
+
+        # **Check if latitude is inverted**
+        if chl_data['latitude'][0] < chl_data['latitude'][-1]:  
+            # Flip data **AND** latitude axis
+            chl_log = np.flipud(chl_log)  
+            chl_data = chl_data.assign_coords(
+                latitude=chl_data['latitude'][::-1]
+            )
 
-    # **Define correct transform**
+    # **Define correct transform (north-up: chl_log rows run max -> min latitude)**
     transform = from_bounds(
-        lon_min, lat_max,  # Top-left (max latitude)
-        lon_max, lat_min,  # Bottom-right (min latitude)
-        chl[dict_key].shape[1],  # Raster width (columns)
-        chl[dict_key].shape[0]   # Raster height (rows)
+        lon_min, lat_min,  # Lower left
+        lon_max, lat_max,  # Upper right
+        chl.shape[1],  # Raster width (columns)
+        chl.shape[0]   # Raster height (rows)
     )
 
-    # **Save as GeoTIFF**
-    output_file = os.path.join(temp_files_dir, f"chl_data_{dict_key}.tif")
-    with rasterio.open(
-        output_file,
-        'w',
-        driver='GTiff',
-        height=chl_scaled.shape[0],
-        width=chl_scaled.shape[1],
-        count=1,
-        dtype=str(chl_scaled.dtype),
-        crs="EPSG:4326",
-        transform=transform
-    ) as dst:
-        dst.write(chl_scaled.filled(np.nan), 1)
-
-    print(f"Saved GeoTIFF: {output_file}")
-
-
-# In[115]:
-
-
-# test_file = "/home/finn.wimberly/Documents/CCCFA_app_dev/data/processed_data/CHL/temp_files/chl_data_20240810.tif"
-
-# with rasterio.open(test_file) as src:
-#     img = src.read(1)  # Read first band
-#     plt.imshow(np.ma.masked_invalid(img), cmap="viridis")
-#     plt.colorbar()
-#     plt.title("CHL Data (First File)")
-#     plt.show()
-
-
-# In[116]:
-
+    # **Reproject to EPSG:3857 in memory (once for all regions)**
+    chl_log_3857, transform_3857 = tile_engine.reproject_to_mercator(
+        chl_log.astype(np.float32), transform
+    )
 
-# Reproject GeoTIFFs to EPSG:3857
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('.tif') or "3857" in filename:
-        continue
-        
-    # Open the original GeoTIFF
-    input_tiff = os.path.join(temp_files_dir, filename)
-    
-    date_str = filename.split('_')[2].split('.')[0]
-    output_tiff = os.path.join(temp_files_dir, f"chl_data_{date_str}_3857.tif")
-
-    with rasterio.open(input_tiff) as src:
-        # Get the original latitude range
-        lat_min, lat_max = src.bounds.bottom, src.bounds.top
-
-        # Check if latitude axis is inverted
-        if lat_min > lat_max:
-            print(f"Flipping latitude for {filename}")
-            img_data = src.read(1)
-            img_data = np.flipud(img_data)  # Flip image vertically
+    # **Generate each region's XYZ tiles in the YYYY_DDD folder**
+    date_obj = datetime.strptime(dict_key, "%Y%m%d")
+    tiles_directory = os.path.join(tiles_dir, f"{date_obj.year}_{date_obj.timetuple().tm_yday:03d}")
+    region_stats = {}
+    for region in regions:
+        valid_data = region_valid[region['json_name']]
+
+        if valid_data.size == 0:
+            # If there's NO data at all for this region/time, skip percentile or set them to NaN
+            print(f"[WARNING] No valid data for {dict_key} ({region['json_name']}). Rendering empty tiles.")
+            chl_scaled = np.full(chl_log_3857.shape, np.nan, dtype=np.float32)
+            chl_min_original, chl_max_original = np.nan, np.nan
         else:
-            img_data = src.read(1)
-
-        # Calculate new transformation for reprojection
-        transform, width, height = calculate_default_transform(
-            src.crs, "EPSG:3857", src.width, src.height, *src.bounds
+            # If we have at least some data, do your usual percentile calculations
+            chl_min_original, chl_max_original = np.nanpercentile(valid_data, [0, 99])
+
+            # Apply this region's log scaling; NaN stays NaN
+            log_min, log_max = log_scaling_limits(valid_data)
+            chl_scaled = apply_log_scaling(chl_log_3857, log_min, log_max)
+
+        n_tiles = tile_engine.render_tiles(
+            chl_scaled, transform_3857, tiles_directory,
+            zooms=region['zooms'],
+            lut=chl_lut,
+            vmin=1, vmax=255,  # Data is already log-scaled onto the 1-255 color indices
+            clip_bounds=None if region['bounds'] is None else tile_engine.mercator_bounds(region['bounds'])
         )
+        print(f"Generated {n_tiles} tiles for {dict_key} in {tiles_directory}")
+        region_stats[region['json_name']] = {'min': float(chl_min_original), 'max': float(chl_max_original)}
 
-        # Update metadata
-        kwargs = src.meta.copy()
-        kwargs.update({
-            "crs": "EPSG:3857",
-            "transform": transform,
-            "width": width,
-            "height": height
-        })
-
-        # Write reprojected GeoTIFF
-        with rasterio.open(output_tiff, "w", **kwargs) as dst:
-            reproject(
-                source=img_data,
-                destination=rasterio.band(dst, 1),
-                src_transform=src.transform,
-                src_crs=src.crs,
-                dst_transform=transform,
-                dst_crs="EPSG:3857",
-                resampling=Resampling.bilinear
-            )
-
-    #print(f"Saved reprojected GeoTIFF: {output_tiff}")
-
-
-# In[119]:
-
-
-# test_file = "/home/finn.wimberly/Documents/CCCFA_app_dev/data/processed_data/CHL/temp_files/chl_data_20240801_3857.tif"
-
-# with rasterio.open(test_file) as src:
-#     img = src.read(1)  # Read first band
-#     plt.imshow(np.ma.masked_invalid(img), cmap="viridis")
-#     plt.colorbar()
-#     plt.title("CHL Data (Second File)")
-#     plt.show()
-
-
-# In[120]:
-
-
-# Generate VRT files
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('_3857.tif'):
-        continue
-
-    date_str = filename.split('_')[2].split('.')[0]
-    tiff_3857 = os.path.join(temp_files_dir, filename)
-    vrt_file = os.path.join(temp_files_dir, f"chl_data_{date_str}.vrt")
-
-    print(f"Creating VRT for {filename}...")
-
-    subprocess.run([
-        'gdal_translate', '-of', 'VRT', '-a_srs', 'EPSG:3857', 
-        tiff_3857, vrt_file
-    ])
-
-    #print(f"Created VRT: {vrt_file}")
-
-
-# In[121]:
-
-
-# Step 3: Generate colorized VRTs
-# Create colormap file for gdaldem color-relief
-color_filename = os.path.join(base_dir, 'processed_data', 'CHL', 'thermal_colormap.txt')
-
-colors = cmocean.cm.speed(np.linspace(0, 1, 255))  # Use 255 colors
-with open(color_filename, 'w') as f:
-    f.write("0 0 0 0 0\n")  # Transparent for masked values
-    for i, color in enumerate(colors, start=1):
-        f.write(f"{i} {int(color[0]*255)} {int(color[1]*255)} {int(color[2]*255)} 255\n")
-
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('.vrt'):
-        continue
-
-    date_str = filename.split('_')[2].split('.')[0]
-    vrt_file = os.path.join(temp_files_dir, filename)
-    colored_vrt_file = os.path.join(temp_files_dir, f"colored_{date_str}.vrt")
-
-    print(f"Creating colorized VRT for {filename}...")
-
-    subprocess.run([
-        'gdaldem', 'color-relief', vrt_file, color_filename, colored_vrt_file, '-of', 'VRT', '-alpha'
-    ])
-
-    print(f"Created colorized VRT: {colored_vrt_file}")
-
-
-# In[122]:
-
-
-# Generate XYZ Tiles with gdal2tiles.py
-for filename in os.listdir(temp_files_dir):
-    if not filename.startswith('color'):
-        continue
-
-    raw_date_str = filename.split('_')[1].split('.')[0]
-    year = raw_date_str[:4]
-    month = raw_date_str[4:6]
-    day = raw_date_str[6:8]
-
-    # Convert MMDD to DDD (Julian Day)
-    date_obj = datetime(int(year), int(month), int(day))
-    day_of_year = date_obj.timetuple().tm_yday
-
-    # Format YYYY_DDD
-    date_str = f"{year}_{day_of_year:03d}"
-
-    # Define paths
-    colored_vrt_file = os.path.join(temp_files_dir, f"colored_{raw_date_str}.vrt")
-    tiles_directory = os.path.join(tiles_dir, date_str)
-
-    print(f"Creating tiles in: {tiles_directory}")
-
-    # subprocess.run([
-    #     'gdal2tiles.py', 
-    #     '--config', 'GDAL_PAM_ENABLED', 'NO',
-    #     '-p', 'mercator', 
-    #     '-z', '8-10', 
-    #     '-r', 'bilinear', 
-    #     '-w', 'none',
-    #     '--xyz',
-    #     colored_vrt_file, 
-    #     tiles_directory
-    # ])
-    
-    # Generate tiles using gdal2tiles with internal parallel processing
-    gdal2tiles_command = [
-        'gdal2tiles.py', 
-        '--config', 'GDAL_PAM_ENABLED', 'NO',
-        '--profile=mercator', 
-        '--webviewer=none', 
-        '--xyz',
-        '--processes=24',  # Let gdal2tiles handle multiprocessing
-        '--tiledriver=PNG',
-        '-z', '8-10',  # Adjust zoom levels as needed
-        colored_vrt_file, 
-        tiles_directory
-    ]
-
-    # Run the command
-    subprocess.run(gdal2tiles_command)
-
-    #print(f"Generated tiles for {date_str} in {tiles_directory}")
-
-
-# In[123]:
-
-
-# Iterate over chl_stats dictionary
-for dict_key in chl_stats.keys():
-   # Convert dict_key (YYYYMMDD) -> (YYYY_DDD)
-   year = dict_key[:4]  # Extract year (YYYY)
-   month = dict_key[4:6]  # Extract month (MM)
-   day = dict_key[6:8]  # Extract day (DD)
-
-   # Convert to day-of-year (DDD)
-   date_obj = datetime.strptime(f"{year}{month}{day}", "%Y%m%d")
-   doy = date_obj.timetuple().tm_yday  # Get day-of-year (1-365)
-
-   # Construct new directory name in YYYY_DDD format
-   out_dir = os.path.join(tiles_dir, f"{year}_{doy:03d}")  # Ensure DDD is 3-digit
-   #print(out_dir)
+    return dict_key, region_stats
 
-   # Create a dictionary with the chlorophyll range
-   chl_range = {
-       "min_chl": chl_stats[dict_key]['min'],
-       "max_chl": chl_stats[dict_key]['max']
-   }
 
-   # Save JSON file in the correct tiles folder
-   json_file_path = os.path.join(out_dir, "chl_range_local.json")
-   with open(json_file_path, "w") as f:
-       json.dump(chl_range, f, indent=4)
+def write_chl_range(dict_key, stats, json_name):
+    """Write one date's chlorophyll range JSON into its YYYY_DDD tiles folder."""
+    # Convert dict_key (YYYYMMDD) -> (YYYY_DDD)
+    date_obj = datetime.strptime(dict_key, "%Y%m%d")
+    doy = date_obj.timetuple().tm_yday  # Get day-of-year (1-365)
 
-   #print(f"Saved range stats for {dict_key} ({year}_{doy:03d}) to {json_file_path}")
+    # Construct new directory name in YYYY_DDD format
+    out_dir = os.path.join(tiles_dir, f"{date_obj.year}_{doy:03d}")  # Ensure DDD is 3-digit
+    os.makedirs(out_dir, exist_ok=True)
 
+    # Create a dictionary with the chlorophyll range
+    chl_range = {
+        "min_chl": stats['min'],
+        "max_chl": stats['max']
+    }
 
-# In[124]:
+    # Save JSON file in the correct tiles folder
+    json_file_path = os.path.join(out_dir, json_name)
+    with open(json_file_path, "w") as f:
+        json.dump(chl_range, f, indent=4)
 
 
-#Clean up files
-shutil.rmtree(temp_files_dir)
+# Stream CHL files (all regions) through a pool of date workers; each date's
+# range JSONs are written as soon as its stats record comes back
+for dict_key, region_stats in parallel.map_jobs(
+    process_chl_date, ((date_int, filename, regions) for date_int, filename in files)
+):
+    for json_name, stats in region_stats.items():
+        write_chl_range(dict_key, stats, json_name)
 
 
 # In[126]:
@@ -7,32 +7,41 @@
 import xarray as xr
 import numpy as np
 import rasterio
-import subprocess
 from rasterio.transform import from_origin
 from rasterio.transform import from_bounds
 import matplotlib.pyplot as plt
 import cmocean
 import pyproj
 import os
+import sys
 from pyproj import Transformer
-import shutil
 import json
 from datetime import datetime
 import re
 from pathlib import Path
-from rasterio.warp import calculate_default_transform, reproject, Resampling
 from matplotlib.colors import Normalize
 from matplotlib import cm  # Add this import
 
+# Shared processing helpers live in ../tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import tile_engine
+import parallel
+import climatology_cache
+
 
 # # Load and process data
 
 # In[2]:
 
 
-# read in saved baseline files 
-ostia_clim_2007_2024 = xr.open_dataset('/vast/clidex/data/obs/SST/OSTIA/baselines/ostia_baseline_2007_2024_85W-40W_20N-50N.nc')['analysed_sst']
-ostia_clim_2010_2019 = xr.open_dataset('/vast/clidex/data/obs/SST/OSTIA/baselines/ostia_baseline_2010_2019_85W-40W_20N-50N.nc')['analysed_sst']
+# Baselines to build anomalies against (names from climatology_cache.OSTIA_BASELINES).
+# Each day's SST is read once and differenced against every baseline; the
+# 2010-2019 set keeps the OSTIA_anomaly product the web app loads, any others
+# go to OSTIA_anomaly_<name>.  Only the published baseline is built by
+# default; ANOMALY_BASELINES (comma-separated, e.g. "2010_2019,2007_2024")
+# adds more, and adding one backfills only it.
+default_baseline = '2010_2019'
+anomaly_baselines = [name for name in os.environ.get('ANOMALY_BASELINES', default_baseline).split(',') if name]
 
 
 # In[3]:
@@ -42,28 +51,46 @@ ostia_clim_2010_2019 = xr.open_dataset('/vast/clidex/data/obs/SST/OSTIA/baseline
 base_dir = '/home/finn.wimberly/Documents/CCCFA_app_dev/data'
 raw_data_dir = '/vast/clidex/data/obs/SST/OSTIA/data/daily/'
 
-# Create output directories
-tiles_dir = os.path.join(base_dir, 'processed_data', 'OSTIA_anomaly', 'tiles')
-os.makedirs(tiles_dir, exist_ok=True)
+# Create output directories (one product per baseline)
+def anomaly_product(name):
+    """processed_data product folder for a baseline's anomalies."""
+    return 'OSTIA_anomaly' if name == default_baseline else f'OSTIA_anomaly_{name}'
+
+tiles_dirs = {
+    name: os.path.join(base_dir, 'processed_data', anomaly_product(name), 'tiles')
+    for name in anomaly_baselines
+}
+for tiles_dir in tiles_dirs.values():
+    os.makedirs(tiles_dir, exist_ok=True)
+
+# Cached EPSG:4326 -> EPSG:3857 warp maps (built on first use per source grid)
+warp_cache_dir = os.path.join(base_dir, 'processed_data', 'warp_cache')
 
-# Path for the temp_files directory
-temp_files_dir = os.path.join(base_dir, 'processed_data', 'OSTIA_anomaly', 'temp_files')
-os.makedirs(temp_files_dir, exist_ok=True)
+# Baselines cropped to the tiling bounds, one float32 day-of-year block each
+clim_cache_dir = os.path.join(base_dir, 'processed_data', 'clim_cache')
+
+# Colormap lookup table (index 0 transparent, 1-255 RdBu_r) and the matching
+# color-relief file kept alongside the tiles
+ssta_lut = tile_engine.colormap_lut(cm.RdBu_r)
+for name in anomaly_baselines:
+    color_filename = os.path.join(base_dir, 'processed_data', anomaly_product(name), 'thermal_colormap.txt')
+    tile_engine.write_colormap_file(color_filename, ssta_lut)
 
 
 # In[4]:
 
 
-# Get list of existing tile dates
-existing_tiles = set()
+# Get list of existing tile dates for each baseline
+existing_tiles = {name: set() for name in anomaly_baselines}
 
-for folder_name in os.listdir(tiles_dir):
-    if os.path.isdir(os.path.join(tiles_dir, folder_name)) and folder_name.startswith('20'):
-        # Convert tile folder name (e.g., "2024_211") to raw file format (e.g., "20240730")
-        year, doy = folder_name.split('_')
-        date_obj = datetime.strptime(f"{year} {doy}", "%Y %j")
-        date_cleaned = date_obj.strftime("%Y%m%d")  # "YYYYMMDD" format
-        existing_tiles.add(date_cleaned)
+for name, tiles_dir in tiles_dirs.items():
+    for folder_name in os.listdir(tiles_dir):
+        if os.path.isdir(os.path.join(tiles_dir, folder_name)) and folder_name.startswith('20'):
+            # Convert tile folder name (e.g., "2024_211") to raw file format (e.g., "20240730")
+            year, doy = folder_name.split('_')
+            date_obj = datetime.strptime(f"{year} {doy}", "%Y %j")
+            date_cleaned = date_obj.strftime("%Y%m%d")  # "YYYYMMDD" format
+            existing_tiles[name].add(date_cleaned)
 
 # Regular expression pattern to extract dates from filenames
 date_pattern = re.compile(r"(\d{4}-\d{2}-\d{2})\.nc")
@@ -80,8 +107,9 @@ for filename in os.listdir(raw_data_dir):
             date_obj = datetime.strptime(date_str, "%Y-%m-%d")
             date_cleaned = date_obj.strftime("%Y%m%d")  # "YYYYMMDD" format
             
-            # Ensure it's not in existing tiles and meets the date threshold
-            if date_cleaned not in existing_tiles and int(date_cleaned) >= date_cutoff:
+            # Ensure some baseline is missing it and it meets the date threshold
+            if (any(date_cleaned not in existing_tiles[name] for name in anomaly_baselines)
+                    and int(date_cleaned) >= date_cutoff):
                 raw_files_to_process.append(filename)
 
 # Output filtered file list
@@ -101,836 +129,214 @@ for filename in raw_files_to_process:
         date_obj = datetime.strptime(date_str, "%Y-%m-%d")
         date_cleaned = date_obj.strftime("%Y%m%d")  # "YYYYMMDD" format
         date_int = int(date_cleaned)
-        files.append((date_int, filename))
+        # Only the baselines that don't have this date yet
+        baselines = [name for name in anomaly_baselines if date_cleaned not in existing_tiles[name]]
+        files.append((date_int, filename, baselines))
 
 # Sort files by date (earliest first)
 files.sort(key=lambda x: x[0])
 
-# Define region of interest (North Atlantic, similar to SSS bounds)
-bounds = {
-    'min_lon': -85,
-    'max_lon': -40,
-    'min_lat': 20,
-    'max_lat': 50
+# Regions tiled from each file in one pass: the North Atlantic view at zoom
+# 0-7 and the refined Cape Cod view at zoom 8-10 share one read and one
+# reprojection, each with its own symmetric color range and range JSON
+regions = [
+    {
+        'bounds': {'min_lon': -85, 'max_lon': -40, 'min_lat': 20, 'max_lat': 50},
+        'zooms': range(0, 8),
+        'json_name': "ssta_range_global.json",
+    },
+    {
+        'bounds': {'min_lon': -74, 'max_lon': -66, 'min_lat': 38.8, 'max_lat': 43.5},
+        'zooms': range(8, 11),
+        'json_name': "ssta_range_local.json",
+    },
+]
+
+# Region of interest covering every region
+bounds = tile_engine.union_bounds([region['bounds'] for region in regions])
+
+# Memory-mapped baselines, opened before the workers fork so they share their pages
+ostia_clims = {
+    name: climatology_cache.load_or_build(climatology_cache.ostia_baseline_file(name), bounds, clim_cache_dir)
+    for name in anomaly_baselines
 }
 
-# Data dictionaries to store information
-ssta_data = {}
-ssta = {}
-ssta_subset = {}
-ssta_subset_masked = {}
-ssta_stats = {}
 
-#Create anomaly datasets and convert into geotiffs
-for date_int, filename in files:
+def process_ssta_date(date_int, filename, bounds, regions, baselines):
+    """Read one OSTIA day once, then reproject and tile its anomaly against each baseline for every region.
+
+    Returns (dict_key, {baseline: {json_name: stats}}).
+    """
     file_path = os.path.join(raw_data_dir, filename)
     dict_key = f"{date_int}"
-    date_str = filename.split('.')[0]
     
     print(f"\n==================== Processing {filename} ====================")
     
-    # Open dataset and get current day's SST
-    ssta_data[dict_key] = xr.open_dataset(file_path)
-    ssta[dict_key] = ssta_data[dict_key]['analysed_sst'].squeeze()
+    # Open dataset and get current day's SST (read once for every baseline)
+    with xr.open_dataset(file_path) as sst_data:
+        sst = sst_data['analysed_sst'].squeeze()
     
-    # Get the day of year for this file
-    doy = ssta_data[dict_key].time.dt.dayofyear.values
+        # Get the day of year for this file
+        doy = int(sst_data.time.dt.dayofyear.values[0])
     
-    # Calculate the anomaly using the climatology
-    ssta[dict_key] = ssta[dict_key] - ostia_clim_2010_2019.where(ostia_clim_2010_2019.dayofyear==doy, drop=True)
+         # Assign CRS if missing
+        if 'crs' not in sst_data.attrs:
+            sst_data = sst_data.rio.write_crs("EPSG:4326")
     
-     # Assign CRS if missing
-    if 'crs' not in ssta_data[dict_key].attrs:
-        ssta_data[dict_key] = ssta_data[dict_key].rio.write_crs("EPSG:4326")
+        # Extract latitude and longitude values
+        lat_values = sst_data['latitude'].values
+        lon_values = sst_data['longitude'].values
     
-    # Extract latitude and longitude values
-    lat_values = ssta_data[dict_key]['latitude'].values
-    lon_values = ssta_data[dict_key]['longitude'].values
-    
-    # Check if longitude is in -180 to 180 range and convert to 0 to 360 range if needed
-    if np.any(lon_values < 0):
-        print(f"Converting longitudes from -180/180 to 0/360 range for {filename}")
-        ssta_data[dict_key] = ssta_data[dict_key].assign_coords(
-            longitude=(((ssta_data[dict_key]['longitude'] + 180) % 360) - 180)
-        )
-    
-    # Ensure bounds are in the same format as the data
-    region_bounds = {
-        'min_lon': bounds['min_lon'],
-        'max_lon': bounds['max_lon'],
-        'min_lat': bounds['min_lat'],
-        'max_lat': bounds['max_lat']
-    }
-    
-    # If negative bounds, ensure data has negative longitudes
-    if region_bounds['min_lon'] < 0:
-        if np.all(lon_values >= 0): 
-            print(f"Converting longitudes from 0/360 to -180/180 range for {filename}")
-            ssta_data[dict_key] = ssta_data[dict_key].assign_coords(
-                longitude=((ssta_data[dict_key]['longitude'] + 180) % 360) - 180
+        # Check if longitude is in -180 to 180 range and convert to 0 to 360 range if needed
+        if np.any(lon_values < 0):
+            print(f"Converting longitudes from -180/180 to 0/360 range for {filename}")
+            sst_data = sst_data.assign_coords(
+                longitude=(((sst_data['longitude'] + 180) % 360) - 180)
             )
     
-    # Check if latitude is inverted and fix it
-    if lat_values[0] < lat_values[-1]:  # If lat[0] is lower than lat[-1], flip it
-        print(f"Flipping latitude for {filename}")
-        ssta[dict_key] = ssta[dict_key].isel(latitude=slice(None, None, -1))
-        ssta_data[dict_key] = ssta_data[dict_key].assign_coords(
-            latitude=ssta_data[dict_key]['latitude'][::-1]
-        )
+        # If negative bounds, ensure data has negative longitudes
+        if bounds['min_lon'] < 0:
+            if np.all(lon_values >= 0): 
+                print(f"Converting longitudes from 0/360 to -180/180 range for {filename}")
+                sst_data = sst_data.assign_coords(
+                    longitude=((sst_data['longitude'] + 180) % 360) - 180
+                )
+    
+        # Check if latitude is inverted and fix it
+        if lat_values[0] < lat_values[-1]:  # If lat[0] is lower than lat[-1], flip it
+            print(f"Flipping latitude for {filename}")
+            sst = sst.isel(latitude=slice(None, None, -1))
+            sst_data = sst_data.assign_coords(
+                latitude=sst_data['latitude'][::-1]
+            )
     
-    # When subsetting, use ssta instead of sst
-    ssta_subset[dict_key] = ssta[dict_key].sel(
-        latitude=slice(bounds['max_lat'], bounds['min_lat']),
-        longitude=slice(bounds['min_lon'], bounds['max_lon'])
-    )
+        # Subset the day's SST to the region of interest
+        sst_subset = sst.sel(
+            latitude=slice(bounds['max_lat'], bounds['min_lat']),
+            longitude=slice(bounds['min_lon'], bounds['max_lon'])
+        ).load()
+    
+    date_obj = datetime.strptime(dict_key, "%Y%m%d")
+    tile_folder = f"{date_obj.year}_{date_obj.timetuple().tm_yday:03d}"
+    baseline_stats = {}
+    for name in baselines:
+        # Calculate the anomaly using that day's slice of this baseline
+        ssta_subset = sst_subset - climatology_cache.day(ostia_clims[name], doy)
         
-    # Mask NaN values
-    ssta_subset_masked[dict_key] = np.ma.masked_invalid(ssta_subset[dict_key].values)
-
-    if len(ssta_subset_masked[dict_key].shape) > 2:
-        ssta_subset_masked[dict_key] = np.squeeze(ssta_subset_masked[dict_key])
-    
-    # Compute min and max values after masking and calculate symmetric range
-    ssta_min = np.ma.min(ssta_subset_masked[dict_key])
-    ssta_max = np.ma.max(ssta_subset_masked[dict_key])
-    max_abs = max(abs(float(ssta_min)), abs(float(ssta_max)))
-    min_val = -max_abs
-    max_val = max_abs
-    
-    # Store statistics with symmetric range
-    ssta_stats[dict_key] = {'min': min_val, 'max': max_val}
-    print(f"{filename}: symmetric range [{min_val}°C, {max_val}°C]")
-
-    # Extract coordinate bounds
-    lon_min, lon_max = float(ssta_subset[dict_key]['longitude'].min()), float(ssta_subset[dict_key]['longitude'].max())
-    lat_min, lat_max = float(ssta_subset[dict_key]['latitude'].min()), float(ssta_subset[dict_key]['latitude'].max())
-    
-    # Define correct transform (EPSG:4326)
-    transform = from_bounds(
-        lon_min, lat_min,  # Lower left
-        lon_max, lat_max,  # Upper right
-        ssta_subset[dict_key].shape[1],  # Width (columns)
-        ssta_subset[dict_key].shape[0]   # Height (rows)
-    )
-    
-    # Save as GeoTIFF (EPSG:4326)
-    output_file = os.path.join(temp_files_dir, f"ssta_data_{dict_key}.tif")
-    with rasterio.open(
-        output_file,
-        'w',
-        driver='GTiff',
-        height=ssta_subset_masked[dict_key].shape[0],
-        width=ssta_subset_masked[dict_key].shape[1],
-        count=1,
-        dtype=str(ssta_subset_masked[dict_key].dtype),
-        crs="EPSG:4326",
-        transform=transform
-    ) as dst:
-        dst.write(ssta_subset_masked[dict_key].filled(np.nan), 1)
-    
-    print(f"Saved GeoTIFF: {output_file}")
-
-
-# In[7]:
-
-
-# # Read and plot the GeoTIFF
-# with rasterio.open(output_file) as src:
-#     data = src.read(1)  # Read the first band
+        # Mask NaN values
+        ssta_subset_masked = np.ma.masked_invalid(ssta_subset.values)
     
-#     plt.figure(figsize=(10, 6))
-#     plt.imshow(data, cmap='RdBu_r')  # Red-Blue colormap
-#     plt.colorbar(label='SST Anomaly (°C)')
-#     plt.title(f'SST Anomaly - {date_str}')
-#     plt.show()
-
-
-# In[8]:
-
-
-# Reproject SST GeoTIFFs to EPSG:3857
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('.tif') or "3857" in filename:
-        continue  # Skip already reprojected files
-    
-    # Define file paths
-    input_tiff = os.path.join(temp_files_dir, filename)
-    date_str = filename.split('_')[2].split('.')[0]
-    output_tiff = os.path.join(temp_files_dir, f"ssta_data_{date_str}_3857.tif")
-    
-    print(f"\n==================== Reprojecting {filename} ====================")
-    
-    with rasterio.open(input_tiff) as src:
-        # Get the original latitude range
-        lat_min, lat_max = src.bounds.bottom, src.bounds.top
+        # Extract coordinate bounds
+        lon_min, lon_max = float(ssta_subset['longitude'].min()), float(ssta_subset['longitude'].max())
+        lat_min, lat_max = float(ssta_subset['latitude'].min()), float(ssta_subset['latitude'].max())
         
-        # Check if latitude axis is inverted (flipped)
-        if lat_min > lat_max:
-            print(f"Flipping latitude for {filename} before reprojection")
-            img_data = src.read(1)
-            img_data = np.flipud(img_data)  # Flip image vertically
-        else:
-            img_data = src.read(1)
-        
-        # Calculate new transformation for EPSG:3857 reprojection
-        transform, width, height = calculate_default_transform(
-            src.crs, "EPSG:3857", src.width, src.height, *src.bounds
+        # Define correct transform (EPSG:4326)
+        transform = from_bounds(
+            lon_min, lat_min,  # Lower left
+            lon_max, lat_max,  # Upper right
+            ssta_subset.shape[1],  # Width (columns)
+            ssta_subset.shape[0]   # Height (rows)
         )
         
-        # Update metadata for reprojected GeoTIFF
-        kwargs = src.meta.copy()
-        kwargs.update({
-            "crs": "EPSG:3857",
-            "transform": transform,
-            "width": width,
-            "height": height
-        })
-        
-        # Create a destination array for the reprojected data
-        dst_array = np.zeros((height, width), dtype=kwargs['dtype'])
+        # Reproject to EPSG:3857 in memory (once for all regions)
+        ssta_3857, transform_3857 = tile_engine.reproject_to_mercator(
+            ssta_subset_masked.filled(np.nan), transform, cache_dir=warp_cache_dir
+        )
         
-        # Write reprojected GeoTIFF
-        with rasterio.open(output_tiff, "w", **kwargs) as dst:
-            reproject(
-                source=img_data,
-                destination=rasterio.band(dst, 1),
-                src_transform=src.transform,
-                src_crs=src.crs,
-                dst_transform=transform,
-                dst_crs="EPSG:3857",
-                resampling=Resampling.bilinear
+        # Generate each region's XYZ tiles with its symmetric range centered on 0
+        tiles_directory = os.path.join(tiles_dirs[name], tile_folder)
+        region_stats = {}
+        for region in regions:
+            region_bounds = region['bounds']
+            
+            # Compute min and max values over this region after masking and calculate symmetric range
+            region_masked = np.ma.masked_invalid(ssta_subset.sel(
+                latitude=slice(region_bounds['max_lat'], region_bounds['min_lat']),
+                longitude=slice(region_bounds['min_lon'], region_bounds['max_lon'])
+            ).values)
+            ssta_min = np.ma.min(region_masked)
+            ssta_max = np.ma.max(region_masked)
+            max_abs = max(abs(float(ssta_min)), abs(float(ssta_max)))
+            min_val = -max_abs
+            max_val = max_abs
+            print(f"{filename} ({name}, {region['json_name']}): symmetric range [{min_val}°C, {max_val}°C]")
+            
+            n_tiles = tile_engine.render_tiles(
+                ssta_3857, transform_3857, tiles_directory,
+                zooms=region['zooms'],
+                lut=ssta_lut,
+                vmin=min_val, vmax=max_val,
+                clip_bounds=tile_engine.mercator_bounds(region_bounds)
             )
+            print(f"Generated {n_tiles} tiles for {dict_key} in {tiles_directory}")
+            # Store statistics with symmetric range
+            region_stats[region['json_name']] = {'min': min_val, 'max': max_val}
+        baseline_stats[name] = region_stats
     
-    print(f"Saved reprojected GeoTIFF: {output_tiff}")
-
-
-# In[10]:
-
-
-# # Path to your GeoTIFF file
-# tiff_path = "/home/finn.wimberly/Documents/CCCFA_app_dev/data/processed_data/OSTIA_anomaly/temp_files/ssta_data_20250414_3857.tif"
-
-# # Open the GeoTIFF
-# with rasterio.open(tiff_path) as src:
-#     data = src.read(1)  # Read first band
-#     extent = [src.bounds.left, src.bounds.right, src.bounds.bottom, src.bounds.top]  # Get geographic bounds
-
-# # Plot the data
-# plt.figure(figsize=(10, 6))
-# plt.imshow(data, cmap = 'RdBu_r', extent=extent, origin="upper")
-# plt.colorbar(label="Sea Surface Temperature (°C)")
-# plt.title("SSTA GeoTIFF Preview - 2024-08-01")
-# plt.xlabel("Longitude")
-# plt.ylabel("Latitude")
-# plt.grid(False)
-# plt.show()
-
-
-# In[11]:
-
-
-# Generate VRT files with enforced bounds
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('_3857.tif'):
-        continue  # Process only reprojected files
-    
-    date_str = filename.split('_')[2].split('.')[0]
-    tiff_3857 = os.path.join(temp_files_dir, filename)
-    vrt_file = os.path.join(temp_files_dir, f"ssta_data_{date_str}.vrt")
-    
-    print(f"\n==================== Creating VRT for {filename} ====================")
-    
-    # Open the raster to extract its bounds (already in EPSG:3857)
-    with rasterio.open(tiff_3857) as src:
-        bounds = src.bounds  # (left, bottom, right, top)
-        data = src.read(1)
-        
-        # Calculate symmetric range based on maximum absolute value
-        max_abs = max(abs(np.nanmin(data)), abs(np.nanmax(data)))
-        min_val = -max_abs
-        max_val = max_abs
-    
-    # Extract corner coordinates (directly in EPSG:3857)
-    upper_left_x, lower_right_y, lower_right_x, upper_left_y = bounds
-    
-    # Generate VRT with symmetric range centered on 0
-    subprocess.run([
-        'gdal_translate', '-of', 'VRT', '-ot', 'Byte', '-scale', 
-        str(min_val), str(max_val), '1', '255',  # Symmetric range centered on 0
-        '-a_srs', 'EPSG:3857',
-        '-a_ullr',
-        str(upper_left_x), str(upper_left_y),
-        str(lower_right_x), str(lower_right_y),
-        tiff_3857, vrt_file
-    ])
-    
-    print(f"Created VRT with symmetric range [{min_val}, {max_val}]°C: {vrt_file}")
-
-
-# In[12]:
-
-
-# Create colormap file for gdaldem color-relief
-color_filename = os.path.join(base_dir, 'processed_data', 'OSTIA_anomaly', 'thermal_colormap.txt')
-colors = cm.RdBu_r(np.linspace(0, 1, 255))  # Use 255 colors for thermal colormap
-
-with open(color_filename, 'w') as f:
-    f.write("0 0 0 0 0\n")  # Transparent for masked values
-    for i, color in enumerate(colors, start=1):
-        f.write(f"{i} {int(color[0]*255)} {int(color[1]*255)} {int(color[2]*255)} 255\n")
-
-# Generate colorized VRTs
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('.vrt'):
-        continue
-    
-    date_str = filename.split('_')[2].split('.')[0]
-    vrt_file = os.path.join(temp_files_dir, filename)
-    colored_vrt_file = os.path.join(temp_files_dir, f"colored_{date_str}.vrt")
-    
-    subprocess.run([
-        'gdaldem', 'color-relief', vrt_file, color_filename, colored_vrt_file, '-of', 'VRT', '-alpha'
-    ])
-    
-    print(f"Created colorized VRT: {colored_vrt_file}")
-
+    return dict_key, baseline_stats
 
-# In[13]:
 
-
-# Generate XYZ Tiles with gdal2tiles.py
-for filename in os.listdir(temp_files_dir):
-    if not filename.startswith('color'):
-        continue
-    
-    raw_date_str = filename.split('_')[1].split('.')[0]
-    year = raw_date_str[:4]
-    month = raw_date_str[4:6]
-    day = raw_date_str[6:8]
-    
-    # Convert MMDD to DDD (Julian Day)
-    date_obj = datetime(int(year), int(month), int(day))
-    day_of_year = date_obj.timetuple().tm_yday
-    
-    # Format YYYY_DDD
-    date_str = f"{year}_{day_of_year:03d}"
-    
-    # Define paths
-    colored_vrt_file = os.path.join(temp_files_dir, f"colored_{raw_date_str}.vrt")
-    tiles_directory = os.path.join(tiles_dir, date_str)
-    
-    print(f"\n==================== Generating tiles for {date_str} ====================")
-    
-    subprocess.run([
-        'gdal2tiles.py', 
-        '--config', 'GDAL_PAM_ENABLED', 'NO',
-        '-p', 'mercator', 
-        '-z', '0-7',  # Adjust zoom levels as needed
-        '-r', 'bilinear', 
-        '-w', 'none',
-        '--xyz',
-        '--processes=8',  # Let gdal2tiles handle multiprocessing
-        colored_vrt_file, 
-        tiles_directory
-    ])
-    
-    print(f"Generated tiles for {date_str} in {tiles_directory}")
-
-
-# In[14]:
-
-
-# Iterate over the stored statistics for SST data
-for dict_key in ssta_stats.keys():
+def write_ssta_range(dict_key, stats, json_name, tiles_dir):
+    """Write one date's symmetric SSTA range JSON into its YYYY_DDD folder under tiles_dir."""
     # Convert dict_key (YYYYMMDD) → (YYYY_DDD)
-    year = dict_key[:4]  # Extract year (YYYY)
-    month = dict_key[4:6]  # Extract month (MM)
-    day = dict_key[6:8]  # Extract day (DD)
-    
-    # Convert to day-of-year (DDD)
-    date_obj = datetime.strptime(f"{year}{month}{day}", "%Y%m%d")
+    date_obj = datetime.strptime(dict_key, "%Y%m%d")
     doy = date_obj.timetuple().tm_yday  # Get day-of-year (1-365)
     
     # Construct new directory name in YYYY_DDD format
-    out_dir = os.path.join(tiles_dir, f"{year}_{doy:03d}")  # Ensure DDD is 3-digit
+    out_dir = os.path.join(tiles_dir, f"{date_obj.year}_{doy:03d}")  # Ensure DDD is 3-digit
     
     # Ensure the directory exists
     os.makedirs(out_dir, exist_ok=True)
     
     # Calculate symmetric range based on maximum absolute value
-    max_abs = max(abs(ssta_stats[dict_key]['min']), abs(ssta_stats[dict_key]['max']))
-    min_val = -max_abs
-    max_val = max_abs
+    max_abs = max(abs(stats['min']), abs(stats['max']))
     
     # Set symmetric SST range in Celsius
     ssta_range = {
-        "min_SSTA": min_val,
-        "max_SSTA": max_val
+        "min_SSTA": -max_abs,
+        "max_SSTA": max_abs
     }
     
     # Save JSON file in the correct tiles folder
-    json_file_path = os.path.join(out_dir, "ssta_range_global.json")
+    json_file_path = os.path.join(out_dir, json_name)
     with open(json_file_path, "w") as f:
         json.dump(ssta_range, f, indent=4)
     
-    print(f"Saved symmetric range stats for {dict_key} ({year}_{doy:03d}) to {json_file_path}")
-
-
-# In[15]:
-
-
-# Clean up files
-shutil.rmtree(temp_files_dir)
-
-# Recreate temp_files directory for future runs
-temp_files_dir = os.path.join(base_dir, 'processed_data', 'OSTIA_anomaly', 'temp_files')
-os.makedirs(temp_files_dir, exist_ok=True)
-
-
-# In[16]:
-
-
-# Get all folder names in the tiles directory and sort them
-dates = sorted([
-    folder for folder in os.listdir(tiles_dir) 
-    if os.path.isdir(os.path.join(tiles_dir, folder)) and folder.startswith('20')
-])
-
-print("Found SSTA dates:", dates)
-
-# Output the list of dates to a txt file
-output_path = os.path.join(base_dir, 'processed_data', 'OSTIA_anomaly', 'ssta_dates.txt')
-
-# Open the file in write mode
-with open(output_path, 'w') as f:
-    for date in dates:
-        formatted_date = date.replace('_', '')  # Replace underscores with no separator
-        f.write(f"{formatted_date}\n")  # Write the formatted date to the file
-
-print(f"Saved list of SSTA dates to {output_path}") 
-
-
-# ### Refined Cape View:
-
-# In[17]:
-
-
-# Sort files by date
-files = []
-for filename in raw_files_to_process:
-    match = date_pattern.search(filename)
-    if match:
-        date_str = match.group(1)
-        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-        date_cleaned = date_obj.strftime("%Y%m%d")  # "YYYYMMDD" format
-        date_int = int(date_cleaned)
-        files.append((date_int, filename))
-
-# Sort files by date (earliest first)
-files.sort(key=lambda x: x[0])
-
-# Define region of interest (North Atlantic, similar to SSS bounds)
-bounds = {
-    'min_lon': -74,
-    'max_lon': -66,
-    'min_lat': 38.8,
-    'max_lat': 43.5
-}
-
-# Data dictionaries to store information
-ssta_data = {}
-ssta = {}
-ssta_subset = {}
-ssta_subset_masked = {}
-ssta_stats = {}
-
-#Create anomaly datasets and convert into geotiffs
-for date_int, filename in files:
-    file_path = os.path.join(raw_data_dir, filename)
-    dict_key = f"{date_int}"
-    date_str = filename.split('.')[0]
-    
-    print(f"\n==================== Processing {filename} ====================")
-    
-    # Open dataset and get current day's SST
-    ssta_data[dict_key] = xr.open_dataset(file_path)
-    ssta[dict_key] = ssta_data[dict_key]['analysed_sst'].squeeze()
-    
-    # Get the day of year for this file
-    doy = ssta_data[dict_key].time.dt.dayofyear.values
-    
-    # Calculate the anomaly using the climatology
-    ssta[dict_key] = ssta[dict_key] - ostia_clim_2010_2019.where(ostia_clim_2010_2019.dayofyear==doy, drop=True)
-    
-     # Assign CRS if missing
-    if 'crs' not in ssta_data[dict_key].attrs:
-        ssta_data[dict_key] = ssta_data[dict_key].rio.write_crs("EPSG:4326")
-    
-    # Extract latitude and longitude values
-    lat_values = ssta_data[dict_key]['latitude'].values
-    lon_values = ssta_data[dict_key]['longitude'].values
-    
-    # Check if longitude is in -180 to 180 range and convert to 0 to 360 range if needed
-    if np.any(lon_values < 0):
-        print(f"Converting longitudes from -180/180 to 0/360 range for {filename}")
-        ssta_data[dict_key] = ssta_data[dict_key].assign_coords(
-            longitude=(((ssta_data[dict_key]['longitude'] + 180) % 360) - 180)
-        )
-    
-    # Ensure bounds are in the same format as the data
-    region_bounds = {
-        'min_lon': bounds['min_lon'],
-        'max_lon': bounds['max_lon'],
-        'min_lat': bounds['min_lat'],
-        'max_lat': bounds['max_lat']
-    }
-    
-    # If negative bounds, ensure data has negative longitudes
-    if region_bounds['min_lon'] < 0:
-        if np.all(lon_values >= 0): 
-            print(f"Converting longitudes from 0/360 to -180/180 range for {filename}")
-            ssta_data[dict_key] = ssta_data[dict_key].assign_coords(
-                longitude=((ssta_data[dict_key]['longitude'] + 180) % 360) - 180
-            )
-    
-    # Check if latitude is inverted and fix it
-    if lat_values[0] < lat_values[-1]:  # If lat[0] is lower than lat[-1], flip it
-        print(f"Flipping latitude for {filename}")
-        ssta[dict_key] = ssta[dict_key].isel(latitude=slice(None, None, -1))
-        ssta_data[dict_key] = ssta_data[dict_key].assign_coords(
-            latitude=ssta_data[dict_key]['latitude'][::-1]
-        )
-    
-    # When subsetting, use ssta instead of sst
-    ssta_subset[dict_key] = ssta[dict_key].sel(
-        latitude=slice(bounds['max_lat'], bounds['min_lat']),
-        longitude=slice(bounds['min_lon'], bounds['max_lon'])
-    )
-        
-    # Mask NaN values
-    ssta_subset_masked[dict_key] = np.ma.masked_invalid(ssta_subset[dict_key].values)
-
-    if len(ssta_subset_masked[dict_key].shape) > 2:
-        ssta_subset_masked[dict_key] = np.squeeze(ssta_subset_masked[dict_key])
-    
-    # Compute min and max values after masking and calculate symmetric range
-    ssta_min = np.ma.min(ssta_subset_masked[dict_key])
-    ssta_max = np.ma.max(ssta_subset_masked[dict_key])
-    max_abs = max(abs(float(ssta_min)), abs(float(ssta_max)))
-    min_val = -max_abs
-    max_val = max_abs
-    
-    # Store statistics with symmetric range
-    ssta_stats[dict_key] = {'min': min_val, 'max': max_val}
-    print(f"{filename}: symmetric range [{min_val}°C, {max_val}°C]")
-
-    # Extract coordinate bounds
-    lon_min, lon_max = float(ssta_subset[dict_key]['longitude'].min()), float(ssta_subset[dict_key]['longitude'].max())
-    lat_min, lat_max = float(ssta_subset[dict_key]['latitude'].min()), float(ssta_subset[dict_key]['latitude'].max())
-    
-    # Define correct transform (EPSG:4326)
-    transform = from_bounds(
-        lon_min, lat_min,  # Lower left
-        lon_max, lat_max,  # Upper right
-        ssta_subset[dict_key].shape[1],  # Width (columns)
-        ssta_subset[dict_key].shape[0]   # Height (rows)
-    )
-    
-    # Save as GeoTIFF (EPSG:4326)
-    output_file = os.path.join(temp_files_dir, f"ssta_data_{dict_key}.tif")
-    with rasterio.open(
-        output_file,
-        'w',
-        driver='GTiff',
-        height=ssta_subset_masked[dict_key].shape[0],
-        width=ssta_subset_masked[dict_key].shape[1],
-        count=1,
-        dtype=str(ssta_subset_masked[dict_key].dtype),
-        crs="EPSG:4326",
-        transform=transform
-    ) as dst:
-        dst.write(ssta_subset_masked[dict_key].filled(np.nan), 1)
-    
-    print(f"Saved GeoTIFF: {output_file}")
-
-
-# In[19]:
-
-
-# # Read and plot the GeoTIFF
-# with rasterio.open(output_file) as src:
-#     data = src.read(1)  # Read the first band
-    
-#     plt.figure(figsize=(10, 6))
-#     plt.imshow(data, cmap='RdBu_r')  # Red-Blue colormap
-#     plt.colorbar(label='SST Anomaly (°C)')
-#     plt.title(f'SSTA Anomaly - {date_str}')
-#     plt.show()
-
-
-# In[20]:
-
-
-# Reproject SST GeoTIFFs to EPSG:3857
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('.tif') or "3857" in filename:
-        continue  # Skip already reprojected files
-    
-    # Define file paths
-    input_tiff = os.path.join(temp_files_dir, filename)
-    date_str = filename.split('_')[2].split('.')[0]
-    output_tiff = os.path.join(temp_files_dir, f"ssta_data_{date_str}_3857.tif")
-    
-    print(f"\n==================== Reprojecting {filename} ====================")
-    
-    with rasterio.open(input_tiff) as src:
-        # Get the original latitude range
-        lat_min, lat_max = src.bounds.bottom, src.bounds.top
-        
-        # Check if latitude axis is inverted (flipped)
-        if lat_min > lat_max:
-            print(f"Flipping latitude for {filename} before reprojection")
-            img_data = src.read(1)
-            img_data = np.flipud(img_data)  # Flip image vertically
-        else:
-            img_data = src.read(1)
-        
-        # Calculate new transformation for EPSG:3857 reprojection
-        transform, width, height = calculate_default_transform(
-            src.crs, "EPSG:3857", src.width, src.height, *src.bounds
-        )
-        
-        # Update metadata for reprojected GeoTIFF
-        kwargs = src.meta.copy()
-        kwargs.update({
-            "crs": "EPSG:3857",
-            "transform": transform,
-            "width": width,
-            "height": height
-        })
-        
-        # Create a destination array for the reprojected data
-        dst_array = np.zeros((height, width), dtype=kwargs['dtype'])
-        
-        # Write reprojected GeoTIFF
-        with rasterio.open(output_tiff, "w", **kwargs) as dst:
-            reproject(
-                source=img_data,
-                destination=rasterio.band(dst, 1),
-                src_transform=src.transform,
-                src_crs=src.crs,
-                dst_transform=transform,
-                dst_crs="EPSG:3857",
-                resampling=Resampling.bilinear
-            )
-    
-    print(f"Saved reprojected GeoTIFF: {output_tiff}")
-
-
-# In[21]:
-
-
-# # Path to your GeoTIFF file
-# tiff_path = "/home/finn.wimberly/Documents/CCCFA_app_dev/data/processed_data/OSTIA_anomaly/temp_files/ssta_data_20240801_3857.tif"
-
-# # Open the GeoTIFF
-# with rasterio.open(tiff_path) as src:
-#     data = src.read(1)  # Read first band
-#     extent = [src.bounds.left, src.bounds.right, src.bounds.bottom, src.bounds.top]  # Get geographic bounds
-
-# # Plot the data
-# plt.figure(figsize=(10, 6))
-# plt.imshow(data, cmap = 'RdBu_r', extent=extent, origin="upper")
-# plt.colorbar(label="Sea Surface Temperature (°C)")
-# plt.title("SSTA GeoTIFF Preview - 2024-08-01")
-# plt.xlabel("Longitude")
-# plt.ylabel("Latitude")
-# plt.grid(False)
-# plt.show()
-
-
-# In[22]:
-
-
-# Generate VRT files with enforced bounds
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('_3857.tif'):
-        continue  # Process only reprojected files
-    
-    date_str = filename.split('_')[2].split('.')[0]
-    tiff_3857 = os.path.join(temp_files_dir, filename)
-    vrt_file = os.path.join(temp_files_dir, f"ssta_data_{date_str}.vrt")
-    
-    print(f"\n==================== Creating VRT for {filename} ====================")
-    
-    # Open the raster to extract its bounds (already in EPSG:3857)
-    with rasterio.open(tiff_3857) as src:
-        bounds = src.bounds  # (left, bottom, right, top)
-        data = src.read(1)
-        
-        # Calculate symmetric range based on maximum absolute value
-        max_abs = max(abs(np.nanmin(data)), abs(np.nanmax(data)))
-        min_val = -max_abs
-        max_val = max_abs
-    
-    # Extract corner coordinates (directly in EPSG:3857)
-    upper_left_x, lower_right_y, lower_right_x, upper_left_y = bounds
-    
-    # Generate VRT with symmetric range centered on 0
-    subprocess.run([
-        'gdal_translate', '-of', 'VRT', '-ot', 'Byte', '-scale', 
-        str(min_val), str(max_val), '1', '255',  # Symmetric range centered on 0
-        '-a_srs', 'EPSG:3857',
-        '-a_ullr',
-        str(upper_left_x), str(upper_left_y),
-        str(lower_right_x), str(lower_right_y),
-        tiff_3857, vrt_file
-    ])
-    
-    print(f"Created VRT with symmetric range [{min_val}, {max_val}]°C: {vrt_file}")
+    print(f"Saved symmetric range stats for {dict_key} ({date_obj.year}_{doy:03d}) to {json_file_path}")
 
 
-# In[23]:
+# Stream anomaly dates (all baselines and regions) through a pool of date
+# workers; each date's range JSONs are written as soon as its stats come back
+for dict_key, baseline_stats in parallel.map_jobs(
+    process_ssta_date, ((date_int, filename, bounds, regions, baselines) for date_int, filename, baselines in files)
+):
+    for name, region_stats in baseline_stats.items():
+        for json_name, stats in region_stats.items():
+            write_ssta_range(dict_key, stats, json_name, tiles_dirs[name])
 
 
-# Create colormap file for gdaldem color-relief
-color_filename = os.path.join(base_dir, 'processed_data', 'OSTIA_anomaly', 'thermal_colormap.txt')
-colors = cm.RdBu_r(np.linspace(0, 1, 255))  # Use 255 colors for thermal colormap
+# In[27]:
 
-with open(color_filename, 'w') as f:
-    f.write("0 0 0 0 0\n")  # Transparent for masked values
-    for i, color in enumerate(colors, start=1):
-        f.write(f"{i} {int(color[0]*255)} {int(color[1]*255)} {int(color[2]*255)} 255\n")
 
-# Generate colorized VRTs
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('.vrt'):
-        continue
-    
-    date_str = filename.split('_')[2].split('.')[0]
-    vrt_file = os.path.join(temp_files_dir, filename)
-    colored_vrt_file = os.path.join(temp_files_dir, f"colored_{date_str}.vrt")
-    
-    subprocess.run([
-        'gdaldem', 'color-relief', vrt_file, color_filename, colored_vrt_file, '-of', 'VRT', '-alpha'
+for name, tiles_dir in tiles_dirs.items():
+    # Get all folder names in the tiles directory and sort them
+    dates = sorted([
+        folder for folder in os.listdir(tiles_dir) 
+        if os.path.isdir(os.path.join(tiles_dir, folder)) and folder.startswith('20')
     ])
     
-    print(f"Created colorized VRT: {colored_vrt_file}")
-
-
-# In[24]:
-
-
-# Generate XYZ Tiles with gdal2tiles.py
-for filename in os.listdir(temp_files_dir):
-    if not filename.startswith('color'):
-        continue
+    print(f"Found SSTA dates ({name}):", dates)
     
-    raw_date_str = filename.split('_')[1].split('.')[0]
-    year = raw_date_str[:4]
-    month = raw_date_str[4:6]
-    day = raw_date_str[6:8]
+    # Output the list of dates to a txt file
+    output_path = os.path.join(base_dir, 'processed_data', anomaly_product(name), 'ssta_dates.txt')
     
-    # Convert MMDD to DDD (Julian Day)
-    date_obj = datetime(int(year), int(month), int(day))
-    day_of_year = date_obj.timetuple().tm_yday
+    # Open the file in write mode
+    with open(output_path, 'w') as f:
+        for date in dates:
+            formatted_date = date.replace('_', '')  # Replace underscores with no separator
+            f.write(f"{formatted_date}\n")  # Write the formatted date to the file
     
-    # Format YYYY_DDD
-    date_str = f"{year}_{day_of_year:03d}"
-    
-    # Define paths
-    colored_vrt_file = os.path.join(temp_files_dir, f"colored_{raw_date_str}.vrt")
-    tiles_directory = os.path.join(tiles_dir, date_str)
-    
-    print(f"\n==================== Generating tiles for {date_str} ====================")
-    
-    subprocess.run([
-        'gdal2tiles.py', 
-        '--config', 'GDAL_PAM_ENABLED', 'NO',
-        '-p', 'mercator', 
-        '-z', '8-10',  # Adjust zoom levels as needed
-        '-r', 'bilinear', 
-        '-w', 'none',
-        '--xyz',
-        '--processes=8',  # Let gdal2tiles handle multiprocessing
-        colored_vrt_file, 
-        tiles_directory
-    ])
-    
-    print(f"Generated tiles for {date_str} in {tiles_directory}")
-
-
-# In[25]:
-
-
-# Iterate over the stored statistics for SST data
-for dict_key in ssta_stats.keys():
-    # Convert dict_key (YYYYMMDD) → (YYYY_DDD)
-    year = dict_key[:4]  # Extract year (YYYY)
-    month = dict_key[4:6]  # Extract month (MM)
-    day = dict_key[6:8]  # Extract day (DD)
-    
-    # Convert to day-of-year (DDD)
-    date_obj = datetime.strptime(f"{year}{month}{day}", "%Y%m%d")
-    doy = date_obj.timetuple().tm_yday  # Get day-of-year (1-365)
-    
-    # Construct new directory name in YYYY_DDD format
-    out_dir = os.path.join(tiles_dir, f"{year}_{doy:03d}")  # Ensure DDD is 3-digit
-    
-    # Ensure the directory exists
-    os.makedirs(out_dir, exist_ok=True)
-    
-    # Calculate symmetric range based on maximum absolute value
-    max_abs = max(abs(ssta_stats[dict_key]['min']), abs(ssta_stats[dict_key]['max']))
-    min_val = -max_abs
-    max_val = max_abs
-    
-    # Set symmetric SST range in Celsius
-    ssta_range = {
-        "min_SSTA": min_val,
-        "max_SSTA": max_val
-    }
-    
-    # Save JSON file in the correct tiles folder
-    json_file_path = os.path.join(out_dir, "ssta_range_local.json")
-    with open(json_file_path, "w") as f:
-        json.dump(ssta_range, f, indent=4)
-    
-    print(f"Saved symmetric range stats for {dict_key} ({year}_{doy:03d}) to {json_file_path}")
-
-
-# In[26]:
-
-
-# Clean up files
-shutil.rmtree(temp_files_dir)
-
-# Recreate temp_files directory for future runs
-temp_files_dir = os.path.join(base_dir, 'processed_data', 'OSTIA_anomaly', 'temp_files')
-os.makedirs(temp_files_dir, exist_ok=True)
-
-
-# In[27]:
-
-
-# Get all folder names in the tiles directory and sort them
-dates = sorted([
-    folder for folder in os.listdir(tiles_dir) 
-    if os.path.isdir(os.path.join(tiles_dir, folder)) and folder.startswith('20')
-])
-
-print("Found SSTA dates:", dates)
-
-# Output the list of dates to a txt file
-output_path = os.path.join(base_dir, 'processed_data', 'OSTIA_anomaly', 'ssta_dates.txt')
-
-# Open the file in write mode
-with open(output_path, 'w') as f:
-    for date in dates:
-        formatted_date = date.replace('_', '')  # Replace underscores with no separator
-        f.write(f"{formatted_date}\n")  # Write the formatted date to the file
-
-print(f"Saved list of SSTA dates to {output_path}") 
+    print(f"Saved list of SSTA dates to {output_path}") 
 
 
 # In[ ]:
@@ -17,6 +17,19 @@ TILES_DIR="/home/finn.wimberly/Documents/CCCFA_app_dev/data/processed_data/OSTIA
 # Log start and take snapshot
 log_changes "start" "$TILES_DIR"
 
+# Date-level worker pool (see ../tools/parallel.py); override from cron if needed
+export TILE_WORKERS="${TILE_WORKERS:-4}"
+export TILE_WORKER_MEM_GB="${TILE_WORKER_MEM_GB:-8}"
+
+# Tile output: "directory" ({z}/{x}/{y}.png tree) or "mbtiles" (one archive per date)
+export TILE_OUTPUT="${TILE_OUTPUT:-directory}"
+# Tile encoding: "png" (paletted) or "webp"; must match TILE_FORMAT in scripts/config.js
+export TILE_FORMAT="${TILE_FORMAT:-png}"
+
+# Anomaly baselines to tile (comma-separated keys of ../tools/climatology_cache.py);
+# 2010_2019 is the published OSTIA_anomaly layer, others go to OSTIA_anomaly_<name>
+export ANOMALY_BASELINES="${ANOMALY_BASELINES:-2010_2019}"
+
 # Activate environment and run
 source ~/mambaforge/etc/profile.d/conda.sh
 conda activate CCCFA
@@ -28,5 +41,5 @@ conda deactivate
 log_changes "end" "$TILES_DIR"
 
 # Filter out verbose lines and write to actual log
-grep -v -E "(Input file size|Generating Base Tiles:|Generating Overview Tiles:|^[0-9]+\.\.\.|^100|Saved GeoTIFF:|Flipping latitude|Creating VRT for|Creating colorized VRT for|Created colorized VRT:|Creating tiles in:|Found SSTA dates:)" "$TEMP_LOG" >> "$LOGDIR/OSTIA_anomaly_tiles.log"
+grep -v -E "(Input file size|Generating Base Tiles:|Generating Overview Tiles:|^[0-9]+\.\.\.|^100|Saved GeoTIFF:|Flipping latitude|Creating VRT for|Creating colorized VRT for|Created colorized VRT:|Creating tiles in:|Found SSTA dates)" "$TEMP_LOG" >> "$LOGDIR/OSTIA_anomaly_tiles.log"
 rm -f "$TEMP_LOG"
@@ -7,19 +7,22 @@
 import xarray as xr
 import numpy as np
 import rasterio
-import subprocess
 from rasterio.transform import from_origin
 from rasterio.transform import from_bounds
 import matplotlib.pyplot as plt
 import cmocean
 import pyproj
 import os
+import sys
 from pyproj import Transformer
-import shutil
 import json
 from datetime import datetime
 from pathlib import Path
-from rasterio.warp import calculate_default_transform, reproject, Resampling
+
+# Shared processing helpers live in ../tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import tile_engine
+import parallel
 
 
 # In[31]:
@@ -33,9 +36,14 @@ raw_data_dir = '/vast/clidex/data/obs/SSS/SMAP/SMAP_RSS_v6.0/data/8daily'
 tiles_dir = os.path.join(base_dir, 'processed_data', 'SSS', 'tiles_mirrored')
 os.makedirs(tiles_dir, exist_ok=True)
 
-# Path for the temp_files directory
-temp_files_dir = os.path.join(base_dir, 'processed_data', 'SSS', 'temp_files')
-os.makedirs(temp_files_dir, exist_ok=True)
+# Cached EPSG:4326 -> EPSG:3857 warp maps (built on first use per source grid)
+warp_cache_dir = os.path.join(base_dir, 'processed_data', 'warp_cache')
+
+# Colormap lookup table (index 0 transparent, 1-255 Spectral_r) and the
+# matching color-relief file kept alongside the tiles
+sss_lut = tile_engine.colormap_lut(plt.cm.Spectral_r)
+color_filename = os.path.join(base_dir, 'processed_data', 'SSS', 'thermal_colormap.txt')
+tile_engine.write_colormap_file(color_filename, sss_lut)
 
 # Get list of existing tile dates
 existing_tiles = set()
@@ -74,9 +82,6 @@ print(raw_files_to_process)
 
 
 files = []
-sss_data = {}
-sss = {}
-sss_stats = {}
 
 # Get list of files and sort by date
 for filename in os.listdir(raw_data_dir):
@@ -96,13 +101,26 @@ for filename in os.listdir(raw_data_dir):
 # Sort files by date (earliest first)
 files.sort(key=lambda x: x[0])
 
-# Define Atlantic region bounds
-bounds = {
-    'min_lon': 274.93,
-    'max_lon': 300.06,
-    'min_lat': 22.10,
-    'max_lat': 46.06
-}
+# **Regions tiled from each file in one pass:** the Atlantic view at zoom 0-7
+# and the refined Cape Cod view at zoom 8-10 share one read and one
+# reprojection; each has its own fixed salinity stretch (PSU) and range JSON
+regions = [
+    {
+        'bounds': {'min_lon': 274.93, 'max_lon': 300.06, 'min_lat': 22.10, 'max_lat': 46.06},
+        'zooms': range(0, 8),
+        'vmin': 31.0, 'vmax': 36.5,
+        'json_name': "sss_range_global.json",
+    },
+    {
+        'bounds': {'min_lon': 360-74, 'max_lon': 360-66, 'min_lat': 38.8, 'max_lat': 43.5},
+        'zooms': range(8, 11),
+        'vmin': 29.5, 'vmax': 34,
+        'json_name': "sss_range_local.json",
+    },
+]
+
+# Region bounds covering every region
+bounds = tile_engine.union_bounds([region['bounds'] for region in regions])
 
 # Define Great Lakes approximate bounding box (to mask)
 great_lakes_bounds = {
@@ -112,737 +130,137 @@ great_lakes_bounds = {
     'max_lat': 46.5
 }
 
-# Data dictionaries
-sss_data = {}
-sss = {}
-sss_subset = {}
-sss_subset_masked = {}
-sss_stats = {}
 
-# Process SSS files
-for date_int, filename in files:  # Process sorted files
+def process_sss_date(date_int, filename, bounds, regions):
+    """Open, subset, mask, reproject and tile one SMAP file for every region; returns (dict_key, {json_name: stats})."""
     file_path = os.path.join(raw_data_dir, filename)
     dict_key = f"{date_int}"
 
     # Open dataset
-    sss_data[dict_key] = xr.open_dataset(file_path)
-
-    # Extract SSS variable
-    sss[dict_key] = sss_data[dict_key]['sss_smap_40km'].squeeze()
-
-    # Assign CRS if missing
-    if 'crs' not in sss_data[dict_key].attrs:
-        sss_data[dict_key] = sss_data[dict_key].rio.write_crs("EPSG:4326")
-
-    # Extract latitude and longitude values
-    lat_values = sss_data[dict_key]['lat'].values
-    lon_values = sss_data[dict_key]['lon'].values
-
-    # Check if latitude is inverted and fix it
-    if lat_values[0] < lat_values[-1]:  # If lat[0] is lower than lat[-1], flip it
-        print(f"Flipping latitude for {filename}")
-
-        # Flip **inside the xarray DataArray** instead of converting to NumPy
-        sss[dict_key] = sss[dict_key].isel(lat=slice(None, None, -1))  
-
-        # Update the latitude coordinates in xarray
-        sss_data[dict_key] = sss_data[dict_key].assign_coords(
-            lat=sss_data[dict_key]['lat'][::-1]
-        )
-
-
-
-    # **Subset using Atlantic bounds**
-    sss_subset[dict_key] = sss[dict_key].sel(
-        lat=slice(bounds['max_lat'], bounds['min_lat']),  # Ensures correct lat slicing order
-        lon=slice(bounds['min_lon'], bounds['max_lon'])
-    )
-
-    # **Mask NaN values**
-    sss_subset_masked[dict_key] = np.ma.masked_invalid(sss_subset[dict_key].values)
-
-    # **Apply Great Lakes mask**
-    lat, lon = np.meshgrid(
-        sss_subset[dict_key]['lat'].values,
-        sss_subset[dict_key]['lon'].values,
-        indexing='ij'
-    )
-    great_lakes_mask = ((lon >= great_lakes_bounds['min_lon']) & (lon <= great_lakes_bounds['max_lon']) &
-                        (lat >= great_lakes_bounds['min_lat']) & (lat <= great_lakes_bounds['max_lat']))
+    with xr.open_dataset(file_path) as sss_data:
 
-    sss_subset_masked[dict_key] = np.ma.masked_where(great_lakes_mask, sss_subset_masked[dict_key])
+        # Extract SSS variable
+        sss = sss_data['sss_smap_40km'].squeeze()
 
-    # **Compute min and max values after masking**
-    sss_min = sss_subset_masked[dict_key].min()
-    sss_max = sss_subset_masked[dict_key].max()
+        # Assign CRS if missing
+        if 'crs' not in sss_data.attrs:
+            sss_data = sss_data.rio.write_crs("EPSG:4326")
 
-    # **Store statistics**
-    sss_stats[dict_key] = {'min': float(sss_min), 'max': float(sss_max)}
-    print(f"{filename}: min={sss_min}, max={sss_max}")
+        # Extract latitude values
+        lat_values = sss_data['lat'].values
 
-    # **Extract coordinate bounds**
-    lon_min, lon_max = sss_subset[dict_key]['lon'].values.min(), sss_subset[dict_key]['lon'].values.max()
-    lat_min, lat_max = sss_subset[dict_key]['lat'].values.min(), sss_subset[dict_key]['lat'].values.max()
-
-    # **Define correct transform (EPSG:4326)**
-    transform = from_bounds(
-        lon_min, lat_max,  # Top-left (max latitude)
-        lon_max, lat_min,  # Bottom-right (min latitude)
-        sss_subset[dict_key].shape[1],  # Raster width (columns)
-        sss_subset[dict_key].shape[0]   # Raster height (rows)
-    )
+        # Check if latitude is inverted and fix it
+        if lat_values[0] < lat_values[-1]:  # If lat[0] is lower than lat[-1], flip it
+            print(f"Flipping latitude for {filename}")
 
-    # **Save as GeoTIFF (EPSG:4326)**
-    output_file = os.path.join(temp_files_dir, f"sss_data_{dict_key}.tif")
-    with rasterio.open(
-        output_file,
-        'w',
-        driver='GTiff',
-        height=sss_subset_masked[dict_key].shape[0],
-        width=sss_subset_masked[dict_key].shape[1],
-        count=1,
-        dtype=str(sss_subset_masked[dict_key].dtype),
-        crs="EPSG:4326",
-        transform=transform
-    ) as dst:
-        dst.write(sss_subset_masked[dict_key].filled(np.nan), 1)
-
-    print(f"Saved GeoTIFF: {output_file}")
-
-
-# In[33]:
-
-
-# # Path to your GeoTIFF
-# tif_path = "/home/finn.wimberly/Documents/CCCFA_app_dev/data/processed_data/SSS/temp_files/sss_data_20250401.tif"
-
-# # Open and read the raster
-# with rasterio.open(tif_path) as src:
-#     data = src.read(1)
-#     bounds = src.bounds
-#     transform = src.transform
-
-# # Mask no-data values for plotting
-# masked_data = np.ma.masked_equal(data, src.nodata if src.nodata is not None else np.nan)
-
-# # Plot
-# plt.figure(figsize=(10, 6))
-# plt.imshow(masked_data, cmap='viridis', origin='upper')
-# plt.colorbar(label='SSS')
-# plt.title("SSS – 2025-04-16")
-# plt.xlabel("X (pixel)")
-# plt.ylabel("Y (pixel)")
-# plt.show()
-
-
-# In[34]:
-
-
-# Reproject SSS GeoTIFFs to EPSG:3857
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('.tif') or "3857" in filename:
-        continue  # Skip already reprojected files
-
-    # Define file paths
-    input_tiff = os.path.join(temp_files_dir, filename)
-    date_str = filename.split('_')[2].split('.')[0]
-    output_tiff = os.path.join(temp_files_dir, f"sss_data_{date_str}_3857.tif")
-
-    with rasterio.open(input_tiff) as src:
-        # Get the original latitude range
-        lat_min, lat_max = src.bounds.bottom, src.bounds.top
-
-        # Check if latitude axis is inverted (flipped)
-        if lat_min > lat_max:
-            print(f"Flipping latitude for {filename} before reprojection")
-            img_data = src.read(1)
-            img_data = np.flipud(img_data)  # Flip image vertically
-        else:
-            img_data = src.read(1)
-
-        # Calculate new transformation for EPSG:3857 reprojection
-        transform, width, height = calculate_default_transform(
-            src.crs, "EPSG:3857", src.width, src.height, *src.bounds
-        )
+            # Flip **inside the xarray DataArray** instead of converting to NumPy
+            sss = sss.isel(lat=slice(None, None, -1))  
 
-        # Update metadata for reprojected GeoTIFF
-        kwargs = src.meta.copy()
-        kwargs.update({
-            "crs": "EPSG:3857",
-            "transform": transform,
-            "width": width,
-            "height": height
-        })
-
-        # Write reprojected GeoTIFF
-        with rasterio.open(output_tiff, "w", **kwargs) as dst:
-            reproject(
-                source=img_data,
-                destination=rasterio.band(dst, 1),
-                src_transform=src.transform,  # Keep original transform
-                src_crs=src.crs,
-                dst_transform=transform,
-                dst_crs="EPSG:3857",
-                resampling=Resampling.bilinear
+            # Update the latitude coordinates in xarray
+            sss_data = sss_data.assign_coords(
+                lat=sss_data['lat'][::-1]
             )
 
-    print(f"Saved reprojected GeoTIFF: {output_tiff}")
-
-
-# In[35]:
-
-
-# # Path to your GeoTIFF
-# tif_path = "/home/finn.wimberly/Documents/CCCFA_app_dev/data/processed_data/SSS/temp_files/sss_data_20250419_3857.tif"
-
-# # Open and read the raster
-# with rasterio.open(tif_path) as src:
-#     data = src.read(1)
-#     bounds = src.bounds
-#     transform = src.transform
-
-# # Mask no-data values for plotting
-# masked_data = np.ma.masked_equal(data, src.nodata if src.nodata is not None else np.nan)
-
-# # Plot
-# plt.figure(figsize=(10, 6))
-# plt.imshow(masked_data, cmap='viridis', origin='upper')
-# plt.colorbar(label='SSS')
-# plt.title("SSS – 2025-04-16")
-# plt.xlabel("X (pixel)")
-# plt.ylabel("Y (pixel)")
-# plt.show()
-
-
-# In[36]:
-
-
-# Generate VRT files with enforced bounds
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('_3857.tif'):
-        continue  # Process only reprojected files
-
-    date_str = filename.split('_')[2].split('.')[0]
-    tiff_3857 = os.path.join(temp_files_dir, filename)
-    vrt_file = os.path.join(temp_files_dir, f"sss_data_{date_str}.vrt")
-
-    print(f"Creating VRT for {filename}...")
-
-    # Open the raster to extract its bounds (already in EPSG:3857)
-    with rasterio.open(tiff_3857) as src:
-        bounds = src.bounds  # (left, bottom, right, top)
-
-    # Extract corner coordinates (directly in EPSG:3857)
-    upper_left_x, lower_right_y, lower_right_x, upper_left_y = bounds
-
-    # **Generate VRT with enforced salinity range and correct bounds**
-    subprocess.run([
-        'gdal_translate', '-of', 'VRT', '-ot', 'Byte',
-        '-scale', '31', '36.5', '1', '255',  # Enforce salinity range
-        '-a_srs', 'EPSG:3857',
-        '-a_ullr',
-        str(upper_left_x), str(upper_left_y),
-        str(lower_right_x), str(lower_right_y),
-        tiff_3857, vrt_file
-    ])
-
-    print(f"Created VRT: {vrt_file}")
-
-
-# In[37]:
-
-
-# Create colormap file for gdaldem color-relief
-color_filename = os.path.join(base_dir, 'processed_data', 'SSS', 'thermal_colormap.txt')
-
-#colors = cmocean.cm.haline(np.linspace(0, 1, 255))  # Use 255 colors
-colors = plt.cm.Spectral_r(np.linspace(0, 1, 255))  # Use 255 colors
-
-with open(color_filename, 'w') as f:
-    f.write("0 0 0 0 0\n")  # Transparent for masked values
-    for i, color in enumerate(colors, start=1):
-        f.write(f"{i} {int(color[0]*255)} {int(color[1]*255)} {int(color[2]*255)} 255\n")
-
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('.vrt'):
-        continue
-
-    date_str = filename.split('_')[2].split('.')[0]
-    vrt_file = os.path.join(temp_files_dir, filename)
-    colored_vrt_file = os.path.join(temp_files_dir, f"colored_{date_str}.vrt")
-
-    #print(f"Creating colorized VRT for {filename}...")
-
-    subprocess.run([
-        'gdaldem', 'color-relief', vrt_file, color_filename, colored_vrt_file, '-of', 'VRT', '-alpha'
-    ])
-
-    print(f"Created colorized VRT: {colored_vrt_file}")
-
-
-# In[38]:
-
-
-# Generate XYZ Tiles with gdal2tiles.py
-for filename in os.listdir(temp_files_dir):
-    if not filename.startswith('color'):
-        continue
-
-    raw_date_str = filename.split('_')[1].split('.')[0]
-    #print(raw_date_str)
-    year = raw_date_str[:4]
-    month = raw_date_str[4:6]
-    day = raw_date_str[6:8]
-
-    # Convert MMDD to DDD (Julian Day)
-    date_obj = datetime(int(year), int(month), int(day))
-    day_of_year = date_obj.timetuple().tm_yday
-
-    # Format YYYY_DDD
-    date_str = f"{year}_{day_of_year:03d}"
-    #print(date_str)
-
-    # Define paths
-    colored_vrt_file = os.path.join(temp_files_dir, f"colored_{raw_date_str}.vrt")
-    tiles_directory = os.path.join(tiles_dir, date_str)
-    #print(tiles_directory)
-
-    #print(f"Creating tiles in: {tiles_directory}")
-
-    subprocess.run([
-        'gdal2tiles.py', 
-        '--config', 'GDAL_PAM_ENABLED', 'NO',
-        '-p', 'mercator', 
-        '-z', '0-7', 
-        '-r', 'bilinear', 
-        '-w', 'none',
-        '--xyz',
-        colored_vrt_file, 
-        tiles_directory
-    ])
-
-    print(f"Generated tiles for {date_str} in {tiles_directory}")
-
-
-# In[39]:
-
-
-# Iterate over the stored statistics for SSS data
-for dict_key in sss_stats.keys():  # We no longer need to compute min/max
-    # Convert dict_key (YYYYMMDD) → (YYYY_DDD)
-    year = dict_key[:4]  # Extract year (YYYY)
-    month = dict_key[4:6]  # Extract month (MM)
-    day = dict_key[6:8]  # Extract day (DD)
-
-    # Convert to day-of-year (DDD)
-    date_obj = datetime.strptime(f"{year}{month}{day}", "%Y%m%d")
-    doy = date_obj.timetuple().tm_yday  # Get day-of-year (1-365)
-
-    # Construct new directory name in YYYY_DDD format
-    out_dir = os.path.join(tiles_dir, f"{year}_{doy:03d}")  # Ensure DDD is 3-digit
-
-    # Ensure the directory exists
-    os.makedirs(out_dir, exist_ok=True)
-
-    # **Set fixed salinity bounds**
-    sss_range = {
-        "min_SSS": 31.0,
-        "max_SSS": 36.5
-    }
-
-    # Save JSON file in the correct tiles folder
-    json_file_path = os.path.join(out_dir, "sss_range_global.json")
-    with open(json_file_path, "w") as f:
-        json.dump(sss_range, f, indent=4)
-
-    print(f"Saved fixed range stats for {dict_key} ({year}_{doy:03d}) to {json_file_path}")
-
-
-# In[40]:
-
 
-#Clean up files
-shutil.rmtree(temp_files_dir)
 
-# Path for the temp_files directory
-temp_files_dir = os.path.join(base_dir, 'processed_data', 'SSS', 'temp_files')
-os.makedirs(temp_files_dir, exist_ok=True)
-
-
-# Higher zoom levels:
-
-# In[41]:
-
-
-# Cape cod tiles:
-
-files = []
-sss_data = {}
-sss = {}
-sss_stats = {}
-
-# Get list of files and sort by date
-for filename in os.listdir(raw_data_dir):
-    if filename.endswith('.nc'):
-        parts = filename.split('_')
-        if len(parts) >= 7:  # Ensure filename has the expected structure
-            year, doy = parts[6], parts[7]  # Extract YYYY and DDD
-
-            # Convert YYYY_DDD to YYYYMMDD format
-            date_obj = datetime.strptime(f"{year} {doy}", "%Y %j")
-            date_cleaned = date_obj.strftime("%Y%m%d")  # "YYYYMMDD" format
-            date_int = int(date_cleaned)
-
-            if filename in raw_files_to_process:
-                files.append((date_int, filename))
-
-# Sort files by date (earliest first)
-files.sort(key=lambda x: x[0])
-
-
-# In[42]:
-
-
-# Define the bounds in lat/lon
-bounds = {
-    'min_lon': 360-74,
-    'max_lon': 360-66,
-    'min_lat': 38.8,
-    'max_lat': 43.5
-}
-
-
-# Data dictionaries
-sss_data = {}
-sss = {}
-sss_subset = {}
-sss_subset_masked = {}
-sss_stats = {}
-
-# Process SSS files
-for date_int, filename in files:  # Process sorted files
-    file_path = os.path.join(raw_data_dir, filename)
-    dict_key = f"{date_int}"
-
-    # Open dataset
-    sss_data[dict_key] = xr.open_dataset(file_path)
-
-    # Extract SSS variable
-    sss[dict_key] = sss_data[dict_key]['sss_smap_40km'].squeeze()
-
-    # Assign CRS if missing
-    if 'crs' not in sss_data[dict_key].attrs:
-        sss_data[dict_key] = sss_data[dict_key].rio.write_crs("EPSG:4326")
-
-    # Extract latitude and longitude values
-    lat_values = sss_data[dict_key]['lat'].values
-    lon_values = sss_data[dict_key]['lon'].values
-
-    # Check if latitude is inverted and fix it
-    if lat_values[0] < lat_values[-1]:  # If lat[0] is lower than lat[-1], flip it
-        print(f"Flipping latitude for {filename}")
-
-        # Flip **inside the xarray DataArray** instead of converting to NumPy
-        sss[dict_key] = sss[dict_key].isel(lat=slice(None, None, -1))  
-
-        # Update the latitude coordinates in xarray
-        sss_data[dict_key] = sss_data[dict_key].assign_coords(
-            lat=sss_data[dict_key]['lat'][::-1]
+        # **Subset using region bounds**
+        sss_subset = sss.sel(
+            lat=slice(bounds['max_lat'], bounds['min_lat']),  # Ensures correct lat slicing order
+            lon=slice(bounds['min_lon'], bounds['max_lon'])
         )
 
-
-
-    # **Subset using Atlantic bounds**
-    sss_subset[dict_key] = sss[dict_key].sel(
-        lat=slice(bounds['max_lat'], bounds['min_lat']),  # Ensures correct lat slicing order
-        lon=slice(bounds['min_lon'], bounds['max_lon'])
-    )
-
-    # **Mask NaN values**
-    sss_subset_masked[dict_key] = np.ma.masked_invalid(sss_subset[dict_key].values)
+        # **Mask NaN values**
+        sss_subset_masked = np.ma.masked_invalid(sss_subset.values)
 
     # **Apply Great Lakes mask**
     lat, lon = np.meshgrid(
-        sss_subset[dict_key]['lat'].values,
-        sss_subset[dict_key]['lon'].values,
+        sss_subset['lat'].values,
+        sss_subset['lon'].values,
         indexing='ij'
     )
     great_lakes_mask = ((lon >= great_lakes_bounds['min_lon']) & (lon <= great_lakes_bounds['max_lon']) &
                         (lat >= great_lakes_bounds['min_lat']) & (lat <= great_lakes_bounds['max_lat']))
 
-    sss_subset_masked[dict_key] = np.ma.masked_where(great_lakes_mask, sss_subset_masked[dict_key])
-
-    # **Compute min and max values after masking**
-    sss_min = sss_subset_masked[dict_key].min()
-    sss_max = sss_subset_masked[dict_key].max()
-
-    # **Store statistics**
-    sss_stats[dict_key] = {'min': float(sss_min), 'max': float(sss_max)}
-    print(f"{filename}: min={sss_min}, max={sss_max}")
+    sss_subset_masked = np.ma.masked_where(great_lakes_mask, sss_subset_masked)
 
     # **Extract coordinate bounds**
-    lon_min, lon_max = sss_subset[dict_key]['lon'].values.min(), sss_subset[dict_key]['lon'].values.max()
-    lat_min, lat_max = sss_subset[dict_key]['lat'].values.min(), sss_subset[dict_key]['lat'].values.max()
+    lon_min, lon_max = sss_subset['lon'].values.min(), sss_subset['lon'].values.max()
+    lat_min, lat_max = sss_subset['lat'].values.min(), sss_subset['lat'].values.max()
 
-    # **Define correct transform (EPSG:4326)**
+    # **Define correct transform (EPSG:4326, north-up: rows run max -> min latitude)**
     transform = from_bounds(
-        lon_min, lat_max,  # Top-left (max latitude)
-        lon_max, lat_min,  # Bottom-right (min latitude)
-        sss_subset[dict_key].shape[1],  # Raster width (columns)
-        sss_subset[dict_key].shape[0]   # Raster height (rows)
+        lon_min, lat_min,  # Lower left
+        lon_max, lat_max,  # Upper right
+        sss_subset.shape[1],  # Raster width (columns)
+        sss_subset.shape[0]   # Raster height (rows)
     )
 
-    # **Save as GeoTIFF (EPSG:4326)**
-    output_file = os.path.join(temp_files_dir, f"sss_data_{dict_key}.tif")
-    with rasterio.open(
-        output_file,
-        'w',
-        driver='GTiff',
-        height=sss_subset_masked[dict_key].shape[0],
-        width=sss_subset_masked[dict_key].shape[1],
-        count=1,
-        dtype=str(sss_subset_masked[dict_key].dtype),
-        crs="EPSG:4326",
-        transform=transform
-    ) as dst:
-        dst.write(sss_subset_masked[dict_key].filled(np.nan), 1)
-
-    print(f"Saved GeoTIFF: {output_file}")
-
-
-# In[43]:
-
-
-# # Path to your GeoTIFF
-# tif_path = "/home/finn.wimberly/Documents/CCCFA_app_dev/data/processed_data/SSS/temp_files/sss_data_20250416.tif"
-
-# # Open and read the raster
-# with rasterio.open(tif_path) as src:
-#     data = src.read(1)
-#     bounds = src.bounds
-#     transform = src.transform
-
-# # Mask no-data values for plotting
-# masked_data = np.ma.masked_equal(data, src.nodata if src.nodata is not None else np.nan)
-
-# # Plot
-# plt.figure(figsize=(10, 6))
-# plt.imshow(masked_data, cmap='viridis', origin='upper')
-# plt.colorbar(label='SSS')
-# plt.title("SSS – 2025-04-16")
-# plt.xlabel("X (pixel)")
-# plt.ylabel("Y (pixel)")
-# plt.show()
-
-
-# In[44]:
-
-
-# Reproject SSS GeoTIFFs to EPSG:3857
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('.tif') or "3857" in filename:
-        continue  # Skip already reprojected files
-
-    # Define file paths
-    input_tiff = os.path.join(temp_files_dir, filename)
-    date_str = filename.split('_')[2].split('.')[0]
-    output_tiff = os.path.join(temp_files_dir, f"sss_data_{date_str}_3857.tif")
-
-    with rasterio.open(input_tiff) as src:
-        # Get the original latitude range
-        lat_min, lat_max = src.bounds.bottom, src.bounds.top
-
-        # Check if latitude axis is inverted (flipped)
-        if lat_min > lat_max:
-            print(f"Flipping latitude for {filename} before reprojection")
-            img_data = src.read(1)
-            img_data = np.flipud(img_data)  # Flip image vertically
-        else:
-            img_data = src.read(1)
-
-        # Calculate new transformation for EPSG:3857 reprojection
-        transform, width, height = calculate_default_transform(
-            src.crs, "EPSG:3857", src.width, src.height, *src.bounds
-        )
-
-        # Update metadata for reprojected GeoTIFF
-        kwargs = src.meta.copy()
-        kwargs.update({
-            "crs": "EPSG:3857",
-            "transform": transform,
-            "width": width,
-            "height": height
-        })
-
-        # Write reprojected GeoTIFF
-        with rasterio.open(output_tiff, "w", **kwargs) as dst:
-            reproject(
-                source=img_data,
-                destination=rasterio.band(dst, 1),
-                src_transform=src.transform,  # Keep original transform
-                src_crs=src.crs,
-                dst_transform=transform,
-                dst_crs="EPSG:3857",
-                resampling=Resampling.bilinear
-            )
-
-    print(f"Saved reprojected GeoTIFF: {output_tiff}")
-
-
-# In[45]:
-
-
-# Generate VRT files with enforced bounds
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('_3857.tif'):
-        continue  # Process only reprojected files
-
-    date_str = filename.split('_')[2].split('.')[0]
-    tiff_3857 = os.path.join(temp_files_dir, filename)
-    vrt_file = os.path.join(temp_files_dir, f"sss_data_{date_str}.vrt")
-
-    print(f"Creating VRT for {filename}...")
-
-    # Open the raster to extract its bounds (already in EPSG:3857)
-    with rasterio.open(tiff_3857) as src:
-        bounds = src.bounds  # (left, bottom, right, top)
-
-    # Extract corner coordinates (directly in EPSG:3857)
-    upper_left_x, lower_right_y, lower_right_x, upper_left_y = bounds
-
-    # **Generate VRT with enforced salinity range and correct bounds**
-    subprocess.run([
-        'gdal_translate', '-of', 'VRT', '-ot', 'Byte',
-        '-scale', '29.5', '34', '1', '255',  # Enforce salinity range
-        '-a_srs', 'EPSG:3857',
-        '-a_ullr',
-        str(upper_left_x), str(upper_left_y),
-        str(lower_right_x), str(lower_right_y),
-        tiff_3857, vrt_file
-    ])
-
-    print(f"Created VRT: {vrt_file}")
-
-
-# In[46]:
-
-
-# Step 3: Generate colorized VRTs
-# Create colormap file for gdaldem color-relief
-color_filename = os.path.join(base_dir, 'processed_data', 'SSS', 'thermal_colormap.txt')
-
-#colors = cmocean.cm.haline(np.linspace(0, 1, 255))  # Use 255 colors
-colors = plt.cm.Spectral_r(np.linspace(0, 1, 255))  # Use 255 colors
-
-with open(color_filename, 'w') as f:
-    f.write("0 0 0 0 0\n")  # Transparent for masked values
-    for i, color in enumerate(colors, start=1):
-        f.write(f"{i} {int(color[0]*255)} {int(color[1]*255)} {int(color[2]*255)} 255\n")
-
-for filename in os.listdir(temp_files_dir):
-    if not filename.endswith('.vrt'):
-        continue
-
-    date_str = filename.split('_')[2].split('.')[0]
-    vrt_file = os.path.join(temp_files_dir, filename)
-    colored_vrt_file = os.path.join(temp_files_dir, f"colored_{date_str}.vrt")
-
-    #print(f"Creating colorized VRT for {filename}...")
-
-    subprocess.run([
-        'gdaldem', 'color-relief', vrt_file, color_filename, colored_vrt_file, '-of', 'VRT', '-alpha'
-    ])
-
-    print(f"Created colorized VRT: {colored_vrt_file}")
-
-
-# In[47]:
-
-
-# Generate XYZ Tiles with gdal2tiles.py
-for filename in os.listdir(temp_files_dir):
-    if not filename.startswith('color'):
-        continue
-
-    raw_date_str = filename.split('_')[1].split('.')[0]
-    #print(raw_date_str)
-    year = raw_date_str[:4]
-    month = raw_date_str[4:6]
-    day = raw_date_str[6:8]
-
-    # Convert MMDD to DDD (Julian Day)
-    date_obj = datetime(int(year), int(month), int(day))
-    day_of_year = date_obj.timetuple().tm_yday
-
-    # Format YYYY_DDD
-    date_str = f"{year}_{day_of_year:03d}"
-    #print(date_str)
-
-    # Define paths
-    colored_vrt_file = os.path.join(temp_files_dir, f"colored_{raw_date_str}.vrt")
-    tiles_directory = os.path.join(tiles_dir, date_str)
-    #print(tiles_directory)
-
-    #print(f"Creating tiles in: {tiles_directory}")
-
-    subprocess.run([
-        'gdal2tiles.py', 
-        '--config', 'GDAL_PAM_ENABLED', 'NO',
-        '-p', 'mercator', 
-        '-z', '8-10', 
-        '-r', 'bilinear', 
-        '-w', 'none',
-        '--xyz',
-        colored_vrt_file, 
-        tiles_directory
-    ])
-
-    print(f"Generated tiles for {date_str} in {tiles_directory}")
+    # **Reproject to EPSG:3857 in memory (once for all regions)**
+    sss_3857, transform_3857 = tile_engine.reproject_to_mercator(
+        sss_subset_masked.astype(np.float32).filled(np.nan), transform, cache_dir=warp_cache_dir
+    )
 
+    # **Generate each region's XYZ tiles in the YYYY_DDD folder**
+    date_obj = datetime.strptime(dict_key, "%Y%m%d")
+    tiles_directory = os.path.join(tiles_dir, f"{date_obj.year}_{date_obj.timetuple().tm_yday:03d}")
+    region_stats = {}
+    for region in regions:
+        region_bounds = region['bounds']
+
+        # **Compute min and max values over this region after masking**
+        region_mask = ((lon >= region_bounds['min_lon']) & (lon <= region_bounds['max_lon']) &
+                       (lat >= region_bounds['min_lat']) & (lat <= region_bounds['max_lat']))
+        region_values = sss_subset_masked[region_mask]
+        sss_min = region_values.min()
+        sss_max = region_values.max()
+        print(f"{filename} ({region['json_name']}): min={sss_min}, max={sss_max}")
+
+        n_tiles = tile_engine.render_tiles(
+            sss_3857, transform_3857, tiles_directory,
+            zooms=region['zooms'],
+            lut=sss_lut,
+            vmin=region['vmin'], vmax=region['vmax'],  # Fixed salinity stretch (PSU)
+            clip_bounds=tile_engine.mercator_bounds(region_bounds)
+        )
+        print(f"Generated {n_tiles} tiles for {dict_key} in {tiles_directory}")
+        region_stats[region['json_name']] = {'min': float(sss_min), 'max': float(sss_max)}
 
-# In[48]:
+    return dict_key, region_stats
 
 
-# Iterate over the stored statistics for SSS data
-for dict_key in sss_stats.keys():  # We no longer need to compute min/max
+def write_sss_range(dict_key, min_sss, max_sss, json_name):
+    """Write one date's (fixed) salinity range JSON into its YYYY_DDD tiles folder."""
     # Convert dict_key (YYYYMMDD) → (YYYY_DDD)
-    year = dict_key[:4]  # Extract year (YYYY)
-    month = dict_key[4:6]  # Extract month (MM)
-    day = dict_key[6:8]  # Extract day (DD)
-
-    # Convert to day-of-year (DDD)
-    date_obj = datetime.strptime(f"{year}{month}{day}", "%Y%m%d")
+    date_obj = datetime.strptime(dict_key, "%Y%m%d")
     doy = date_obj.timetuple().tm_yday  # Get day-of-year (1-365)
 
     # Construct new directory name in YYYY_DDD format
-    out_dir = os.path.join(tiles_dir, f"{year}_{doy:03d}")  # Ensure DDD is 3-digit
+    out_dir = os.path.join(tiles_dir, f"{date_obj.year}_{doy:03d}")  # Ensure DDD is 3-digit
 
     # Ensure the directory exists
     os.makedirs(out_dir, exist_ok=True)
 
     # **Set fixed salinity bounds**
     sss_range = {
-        "min_SSS": 29.5,
-        "max_SSS": 34
+        "min_SSS": min_sss,
+        "max_SSS": max_sss
     }
 
     # Save JSON file in the correct tiles folder
-    json_file_path = os.path.join(out_dir, "sss_range_local.json")
+    json_file_path = os.path.join(out_dir, json_name)
     with open(json_file_path, "w") as f:
         json.dump(sss_range, f, indent=4)
 
-    print(f"Saved fixed range stats for {dict_key} ({year}_{doy:03d}) to {json_file_path}")
-
-
-# In[49]:
-
+    print(f"Saved fixed range stats for {dict_key} ({date_obj.year}_{doy:03d}) to {json_file_path}")
 
-#Clean up files
-shutil.rmtree(temp_files_dir)
 
-# Path for the temp_files directory
-temp_files_dir = os.path.join(base_dir, 'processed_data', 'SSS', 'temp_files')
-os.makedirs(temp_files_dir, exist_ok=True)
+# Stream SSS files (all regions) through a pool of date workers; each date's
+# range JSONs (the fixed stretches) are written as soon as the worker reports back
+for dict_key, region_stats in parallel.map_jobs(
+    process_sss_date, ((date_int, filename, bounds, regions) for date_int, filename in files)
+):
+    for region in regions:
+        write_sss_range(dict_key, region['vmin'], region['vmax'], region['json_name'])
 
 
 # In[50]:
@@ -7,7 +7,6 @@
 import xarray as xr
 import numpy as np
 import rasterio
-import subprocess
 from rasterio.transform import from_origin
 from rasterio.transform import from_bounds
 import matplotlib.pyplot as plt
@@ -20,10 +19,15 @@ from datetime import datetime
 import re
 from pathlib import Path
 from matplotlib import cm 
-from scipy.interpolate import griddata
-from rasterio.features import rasterize
-import cartopy.io.shapereader as shpreader
 import datetime as dt
+import sys
+
+# Shared processing helpers live in ../tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import tile_engine
+import parallel
+import interp_cache
+import land_mask
 
 
 # In[36]:
@@ -37,10 +41,11 @@ raw_data_dir = '/vast/clidex/data/obs/CCCFA/raw_data/doppio/'
 tiles_dir = os.path.join(base_dir, 'processed_data', 'doppio', 'tiles')
 shutil.rmtree(tiles_dir, ignore_errors=True)
 os.makedirs(tiles_dir, exist_ok=True)
+# drop deduplicated tiles that only the deleted forecasts linked to
+tile_engine.prune_tile_store(os.path.join(base_dir, 'processed_data', 'doppio', 'tile_store'))
 
-# Path for the temp_files directory
-temp_files_dir = os.path.join(base_dir, 'processed_data', 'doppio', 'temp_files')
-os.makedirs(temp_files_dir, exist_ok=True)
+# Cached triangulation / nearest-neighbour weights for the ROMS grid
+interp_cache_dir = os.path.join(base_dir, 'processed_data', 'interp_cache')
 
 # which file are we processing
 date_pattern = re.compile(r"doppio_bottom_temps_(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})\.nc")
@@ -77,17 +82,12 @@ lat_min, lat_max = bounds['min_lat'], bounds['max_lat']
 # Transform for the target grid (top-left origin = (lon_min, lat_max))
 transform = from_origin(lon_min, lat_max, dlon, dlat)
 
-# Load Natural Earth land polygons (10m = detailed; use 50m for speed)
-land_shp = shpreader.natural_earth(resolution='10m', category='physical', name='land')
-land_geoms = list(shpreader.Reader(land_shp).geometries())
-
-# Rasterize land=1, ocean=0 on our target grid
-land_mask_georef = rasterize(
-    ((geom, 1) for geom in land_geoms),
-    out_shape=(height, width),
-    transform=transform,
-    fill=0,
-    dtype='uint8'
+# Natural Earth land (10m = detailed) rasterized onto our target grid, land=True;
+# cached bit-packed per grid + shapefile version so cron runs skip the shapefile
+land_mask_georef = land_mask.land_mask(
+    (height, width), transform,
+    cache_dir=os.path.join(base_dir, 'processed_data', 'land_mask_cache'),
+    resolution='10m'
 )
 
 # our in-memory arrays are indexed south to north (lat increases with row index),
@@ -109,53 +109,32 @@ def daily_bottom_mean(ds):
     return daily.dropna(dim="time", how="all")
 
 def curvi_to_regular(lon2d_src, lat2d_src, values2d, lon2d_tgt, lat2d_tgt, method="linear"):
-    pts = np.column_stack((lon2d_src.ravel(), lat2d_src.ravel()))
-    vals = values2d.ravel()
-    good = np.isfinite(vals) & np.isfinite(pts[:,0]) & np.isfinite(pts[:,1])
-    pts, vals = pts[good], vals[good]
-    interp = griddata(pts, vals, (lon2d_tgt, lat2d_tgt), method=method)
+    # same result as griddata, but the triangulation / KD-tree for this grid and
+    # valid-point mask is built once and reused as a sparse matrix product
+    good = np.isfinite(values2d) & np.isfinite(lon2d_src) & np.isfinite(lat2d_src)
+    weights = interp_cache.load_or_build(
+        lon2d_src, lat2d_src, good, lon2d_tgt, lat2d_tgt, interp_cache_dir
+    )
+    interp = interp_cache.interpolate(weights, values2d, method=method)
     if np.isnan(interp).any():
-        nn = griddata(pts, vals, (lon2d_tgt, lat2d_tgt), method="nearest")
+        nn = interp_cache.interpolate(weights, values2d, method="nearest")
         interp = np.where(np.isnan(interp), nn, interp)
     return interp
 
-def write_geotiff(path, arr, lons2d, lats2d, nodata=np.nan):
-    # flip north to south for GeoTIFF row order
+def regular_to_mercator(arr, lons2d, lats2d):
+    # flip north to south for raster row order, then warp to EPSG:3857 in memory
     arr_out = np.flipud(arr.astype("float32"))
     min_lon, max_lon = float(np.nanmin(lons2d)), float(np.nanmax(lons2d))
     min_lat, max_lat = float(np.nanmin(lats2d)), float(np.nanmax(lats2d))
     height, width = arr.shape
     transform = from_bounds(min_lon, min_lat, max_lon, max_lat, width, height)
-    with rasterio.open(
-        path, "w",
-        driver="GTiff",
-        dtype="float32",
-        count=1,
-        height=height,
-        width=width,
-        crs="EPSG:4326",
-        transform=transform,
-        nodata=nodata,
-        tiled=True,
-        blockxsize=512,
-        blockysize=512,
-        compress="DEFLATE"
-    ) as dst:
-        dst.write(arr_out, 1)
-
-def build_vrt_from_tif(tif_path, vrt_path):
-    subprocess.run(["gdal_translate", "-of", "VRT", tif_path, vrt_path], check=True)
+    return tile_engine.reproject_to_mercator(arr_out, transform)
 
 
 # In[40]:
 
 
-#main processing loop - create tif and vrt files
-
-#set bounds
-# global_min = np.inf
-# global_max = -np.inf
-daily_outputs = []
+#load the latest forecast and reduce to daily bottom means
 
 fname = latest_path.name
 file_path = os.path.join(raw_data_dir, fname)
@@ -174,43 +153,15 @@ src_mask = (
 lon_src = lon2d.copy(); lat_src = lat2d.copy()
 lon_src[~src_mask] = np.nan; lat_src[~src_mask] = np.nan
 
-daily = daily_bottom_mean(ds)  # (time, eta_rho, xi_rho)
-
-for t in daily["time"].values:
-    day = np.datetime_as_string(t, unit="D")   # 'YYYY-MM-DD'
-    day_compact = day.replace("-", "")         # 'YYYYMMDD'
-
-    # 2-D source slice
-    da = daily.sel(time=t).values
-
-    # interpolate to target grid (linear)
-    interp_lin = curvi_to_regular(lon_src, lat_src, da, Lon2D, Lat2D, method="linear")
-
-    # optional nearest fill ONLY over ocean pixels to patch small NaN holes
-    nan_ocean = np.isnan(interp_lin) & ocean_mask_tgt
-    if nan_ocean.any():
-        interp_nn = curvi_to_regular(lon_src, lat_src, da, Lon2D, Lat2D, method="nearest")
-        interp_lin[nan_ocean] = interp_nn[nan_ocean]
-
-    # finally, mask land by lat/lon (Natural Earth)
-    interp_lin[land_mask_tgt] = np.nan
-
-    # track global range over ocean only
-    # dmin = float(np.nanmin(interp_lin)); dmax = float(np.nanmax(interp_lin))
-    # if np.isfinite(dmin): global_min = min(global_min, dmin)
-    # if np.isfinite(dmax): global_max = max(global_max, dmax)
-
-    # write GeoTIFF and VRT file
-    tif_path = os.path.join(temp_files_dir, f"doppio_bottom_temp_daily_{day_compact}.tif")
-    vrt_path = os.path.join(temp_files_dir, f"doppio_bottom_temp_daily_{day_compact}.vrt")
-    write_geotiff(tif_path, interp_lin, Lon2D, Lat2D, nodata=np.nan)
-    build_vrt_from_tif(tif_path, vrt_path)
-
-    print(f"Saved GeoTIFF & VRT for {day}:\n  {tif_path}\n  {vrt_path}")
-    daily_outputs.append((day_compact, tif_path, vrt_path))
+# loaded up front so the forked day workers share it instead of re-reading
+daily = daily_bottom_mean(ds).load()  # (time, eta_rho, xi_rho)
 
 ds.close()
 
+# build (or load) the interpolation weights once so the forked workers inherit them;
+# the bottom-temperature land mask is the same every day
+curvi_to_regular(lon_src, lat_src, daily.isel(time=0).values, Lon2D, Lat2D)
+
 
 # #Check out tif 
 # from rasterio.plot import show
@@ -283,6 +234,10 @@ def write_colormap_txt(path: str, vmin: float, vmax: float, n: int = 255):
             r, g, b = (int(c[0]*255), int(c[1]*255), int(c[2]*255))
             f.write(f"{v:.6f} {r} {g} {b} 255\n")
 
+# colormap lookup table shared by all seasons (each season stretches it over
+# its own vmin/vmax)
+doppio_lut = tile_engine.colormap_lut(cmocean.cm.thermal)
+
 # generate one colormap file per season (cached)
 colormap_by_season = {}
 for season, (vmin, vmax) in SEASON_LIMITS.items():
@@ -318,69 +273,56 @@ for season, (vmin, vmax) in SEASON_LIMITS.items():
 
 #     print(f"Created colored VRT: {colored_vrt_file}")
 
-# iterate files (YYYYMMDD) and create colored VRT with season-specific colormap
-
-#CREATE FILES WITH SEASONAL BOUNDS
-for filename in os.listdir(temp_files_dir):
-    if not filename.startswith('doppio_bottom_temp_daily_') or not filename.endswith('.vrt'):
-        continue
-
-    date_str = filename.replace('doppio_bottom_temp_daily_', '').replace('.vrt', '')
-
-    # parse YYYYMMDD
-    try:
-        parsed_date = dt.datetime.strptime(date_str, "%Y%m%d").date()
-    except ValueError:
-        print(f"Skipping {filename}: date parse failed for '{date_str}' (expected YYYYMMDD)")
-        continue
+# In[43]:
 
-    season = season_from_date(parsed_date)
-    cmap_for_season = colormap_by_season[season]
 
-    in_vrt = os.path.join(temp_files_dir, filename)
-    out_dir = os.path.join(base_dir, 'processed_data', 'doppio', 'temp_files')
-    colored_vrt_file = os.path.join(out_dir, f"colored_{date_str}.vrt")
+def process_doppio_day(t):
+    """Interpolate, reproject and tile one forecast day; returns its YYYYMMDD key."""
+    day = np.datetime_as_string(t, unit="D")   # 'YYYY-MM-DD'
+    day_compact = day.replace("-", "")         # 'YYYYMMDD'
 
-    subprocess.run([
-        'gdaldem', 'color-relief',
-        in_vrt, cmap_for_season, colored_vrt_file,
-        '-of', 'VRT', '-alpha'
-    ], check=True)
+    # 2-D source slice
+    da = daily.sel(time=t).values
 
-    print(f"{date_str}: season={season}, vmin={SEASON_LIMITS[season][0]}, vmax={SEASON_LIMITS[season][1]}")
-    print(f"  -> Created colored VRT: {colored_vrt_file}")
+    # interpolate to target grid (linear)
+    interp_lin = curvi_to_regular(lon_src, lat_src, da, Lon2D, Lat2D, method="linear")
 
+    # optional nearest fill ONLY over ocean pixels to patch small NaN holes
+    nan_ocean = np.isnan(interp_lin) & ocean_mask_tgt
+    if nan_ocean.any():
+        interp_nn = curvi_to_regular(lon_src, lat_src, da, Lon2D, Lat2D, method="nearest")
+        interp_lin[nan_ocean] = interp_nn[nan_ocean]
 
-# In[43]:
+    # finally, mask land by lat/lon (Natural Earth)
+    interp_lin[land_mask_tgt] = np.nan
 
+    # reproject to EPSG:3857 in memory
+    temp_3857, transform_3857 = regular_to_mercator(interp_lin, Lon2D, Lat2D)
+    print(f"Interpolated and reprojected {day}")
 
-# gdal2tiles.py to bake XYZ tiles (YYYY_DDD folder names)
-for day_compact, _, _ in daily_outputs:
-    year = int(day_compact[:4])
-    month = int(day_compact[4:6])
-    day = int(day_compact[6:8])
-    date_obj = datetime(year, month, day)
-    day_of_year = date_obj.timetuple().tm_yday
-    date_str = f"{year}_{day_of_year:03d}"
+    # bake XYZ tiles (YYYY_DDD folder names) with the season-specific color stretch
+    date_obj = datetime.strptime(day_compact, "%Y%m%d")
+    date_str = f"{date_obj.year}_{date_obj.timetuple().tm_yday:03d}"
 
-    colored_vrt_file = os.path.join(temp_files_dir, f"colored_{day_compact}.vrt")
+    season = season_from_date(date_obj.date())
+    vmin, vmax = SEASON_LIMITS[season]
     tiles_directory = os.path.join(tiles_dir, date_str)
     os.makedirs(tiles_directory, exist_ok=True)
 
     print(f"\n==================== Generating tiles for {date_str} ====================")
-    subprocess.run([
-        "gdal2tiles.py",
-        "--config", "GDAL_PAM_ENABLED", "NO",
-        "-p", "mercator",
-        "-z", "0-10",           
-        "-r", "bilinear",
-        "-w", "none",
-        "--xyz",
-        "--processes=8",
-        colored_vrt_file,
-        tiles_directory
-    ], check=True)
-    print(f"Generated tiles: {tiles_directory}")
+    print(f"{day_compact}: season={season}, vmin={vmin}, vmax={vmax}")
+    n_tiles = tile_engine.render_tiles(
+        temp_3857, transform_3857, tiles_directory,
+        zooms=range(0, 11),
+        lut=doppio_lut,
+        vmin=vmin, vmax=vmax
+    )
+    print(f"Generated {n_tiles} tiles: {tiles_directory}")
+    return day_compact
+
+
+# run every forecast day across a pool of workers
+daily_outputs = list(parallel.map_jobs(process_doppio_day, [(t,) for t in daily["time"].values]))
 
 
 # In[44]:
@@ -407,13 +349,3 @@ with open(output_path, 'w') as f:
 print(f"Saved list of dates to {output_path}")
 
 
-# In[45]:
-
-
-# clean up temp directory
-shutil.rmtree(temp_files_dir, ignore_errors=True)
-os.makedirs(temp_files_dir, exist_ok=True)
-
-
-
-
@@ -17,6 +17,15 @@ TILES_DIR="/home/finn.wimberly/Documents/CCCFA_app_dev/data/processed_data/doppi
 # Log start and take snapshot
 log_changes "start" "$TILES_DIR"
 
+# Date-level worker pool (see ../tools/parallel.py); override from cron if needed
+export TILE_WORKERS="${TILE_WORKERS:-4}"
+export TILE_WORKER_MEM_GB="${TILE_WORKER_MEM_GB:-8}"
+
+# Tile output: "directory" ({z}/{x}/{y}.png tree) or "mbtiles" (one archive per date)
+export TILE_OUTPUT="${TILE_OUTPUT:-directory}"
+# Tile encoding: "png" (paletted) or "webp"; must match TILE_FORMAT in scripts/config.js
+export TILE_FORMAT="${TILE_FORMAT:-png}"
+
 # Activate environment and run
 source ~/mambaforge/etc/profile.d/conda.sh
 conda activate CCCFA
@@ -28,7 +37,7 @@ conda deactivate
 log_changes "end" "$TILES_DIR"
 
 # Filter out verbose lines and write to actual log
-grep -Ev "(Input file size|Generating Base Tiles:|Generating Overview Tiles:|^[0-9]+\.\.\.|^100 - done|Saved GeoTIFF & VRT|Created colored VRT|=======|temp_files/doppio_bottom_temp_daily|Generated tiles:)" "$TEMP_LOG" \
+grep -Ev "(Interpolated and reprojected|=======|Generated [0-9]+ tiles:)" "$TEMP_LOG" \
 | sed -E '/^[[:space:]]*$/d' \
 >> "$LOGDIR/doppio_tiles.log"
 rm -f "$TEMP_LOG"
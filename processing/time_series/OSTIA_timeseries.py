@@ -87,92 +87,246 @@
 # with open(output_path, 'w') as f:
 #     json.dump(time_series, f)
 # #print(f"Dashboard-ready SST anomaly time series written to: {output_path}")
-
 import xarray as xr
 import numpy as np
 import json
 import os
-import glob
 import re
+import sys
+import glob
+from datetime import datetime
 
-# Grab all daily files from 2025 onwards
-all_files = glob.glob('/vast/clidex/data/obs/SST/OSTIA/data/daily/*.nc')
-daily_files = sorted([
-    f for f in all_files
-    if (match := re.search(r'(\d{4})', os.path.basename(f))) and int(match.group(1)) >= 2025
-])
+# Shared processing helpers live in ../tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import region_weights
+import series_store
+import timeseries_codec
 
-# Load base (2007-2024) and daily (2025+) data
+# Daily files (2025 onwards) and the multi-year base file (2007-2024)
+daily_dir = '/vast/clidex/data/obs/SST/OSTIA/data/daily'
 base_path = '/vast/clidex/data/obs/SST/OSTIA/data/METOFFICE-GLO-SST-L4-NRT-OBS-SST-V2_multi-vars_84.97W-40.03W_20.02N-49.97N_2007-01-01-2024-12-31.nc'
-base_sst = xr.open_dataset(base_path)['analysed_sst']
-daily_sst = xr.open_mfdataset(daily_files, combine='by_coords')['analysed_sst']
-
-# Subset daily to match base bounds
-lat_range = slice(20, 50)
-lon_range = slice(-85, -40)
-daily_sst = daily_sst.sel(latitude=lat_range, longitude=lon_range)
-
-# Combine time series
-combined_sst = xr.concat([base_sst, daily_sst], dim='time')
-
-# Define regions
-regions = {
-    'OC': {'lon': (-70, -69.5), 'lat': (41.5, 42.3), 'name': 'Outer Cape'},
-    'IC': {'lon': (-70.5, -70), 'lat': (41.7, 42.3), 'name': 'Inner Cape'},
-    'GoM': {'lon': (-71, -68), 'lat': (42, 44), 'name': 'Gulf of Maine'},
-    'RI': {'lon': (-72, -70.75), 'lat': (40.5, 41.5), 'name': 'Rhode Island'},
-    'NJ': {'lon': (-74.5, -73), 'lat': (39.25, 40.25), 'name': 'New Jersey'}
-}
-
-time_series = {}
-
-for region, coords in regions.items():
-    # Regional mean
-    sst_region = combined_sst.sel(
-        longitude=slice(coords['lon'][0], coords['lon'][1]),
-        latitude=slice(coords['lat'][0], coords['lat'][1])
-    ).mean(dim=('latitude', 'longitude')).compute()
-
-    # Subset to 2007–2024 for climatology
-    sst_base = sst_region.sel(time=slice("2007-01-01", "2024-12-31"))
-
-    # Compute baseline climatology (mean for each day-of-year)
-    clim_doy = sst_base.groupby("time.dayofyear").mean("time")
-
-    # Compute anomalies for full time series (broadcast baseline)
-    ssta = sst_region.groupby("time.dayofyear") - clim_doy
-
-    # Align baseline to each timestamp (same as before)
-    clim_aligned = sst_region - ssta
-    
-    # Convert Kelvin to Celsius
-    sst_c = sst_region - 273.15
-    clim_aligned_c = clim_aligned - 273.15
-    
-    # Format for JSON (SSTA already in °C as difference)
-    sst_dict = {
-        str(np.datetime_as_string(t, unit='D')): float(v) if np.isfinite(v) else None
-        for t, v in zip(sst_c.time.values, sst_c.values)
-    }
-    ssta_dict = {
-        str(np.datetime_as_string(t, unit='D')): float(v) if np.isfinite(v) else None
-        for t, v in zip(ssta.time.values, ssta.values)
-    }
-    clim_dict = {
-        str(np.datetime_as_string(t, unit='D')): float(v) if np.isfinite(v) else None
-        for t, v in zip(clim_aligned_c.time.values, clim_aligned_c.values)
-    }
-    
-    time_series[region] = {
-        'name': coords['name'],
-        'sst': sst_dict,     # absolute SST [°C]
-        'ssta': ssta_dict,   # anomaly [°C]
-        'clim': clim_dict    # per-date baseline [°C]
-    }
-
-# Write to JSON
+
+# Dashboard JSON, and the frozen 2007-2024 day-of-year climatology of each
+# region [K] saved next to it so incremental runs never reopen the base file
 output_path = '/vast/clidex/data/obs/CCCFA/processed_data/OSTIA_SST/time_series/sst_timeseries.json'
-with open(output_path, 'w') as f:
-    json.dump(time_series, f)
+clim_path = os.path.join(os.path.dirname(output_path), 'sst_timeseries_clim.json')
+
+# Time-chunked copy of the base file plus daily files (kept by ingest/zarr_ingest.py);
+# a full recompute reads each region's cells from it in a few chunk reads
+series_path = series_store.series_path('OSTIA')
+
+# Cached (region x grid cell) weight matrices, one per source grid
+weights_cache_dir = '/vast/clidex/data/obs/CCCFA/processed_data/region_weights'
+
+# Define regions (OC, IC, GoM, RI, NJ; see tools/region_weights.py)
+regions = region_weights.REGIONS
+
+date_pattern = re.compile(r'(\d{4}-\d{2}-\d{2})\.nc$')
+
+
+def daily_files_after(last_date):
+    """Daily files dated after last_date ('YYYY-MM-DD'; None = 2025 onwards), as sorted (date, path)."""
+    start = last_date or '2024-12-31'
+    files = []
+    for path in glob.glob(os.path.join(daily_dir, '*.nc')):
+        match = date_pattern.search(os.path.basename(path))
+        if match and match.group(1) > start:
+            files.append((match.group(1), path))
+    return sorted(files)
+
+
+def json_value(v):
+    """Float for JSON, None for NaN."""
+    return float(v) if np.isfinite(v) else None
+
+
+def load_combined_sst():
+    """2007 onwards SST [K]: the time-chunked series store if present, else the base file plus all daily files."""
+    if os.path.exists(series_path):
+        print(f"Reading {series_path}")
+        return series_store.open_series('OSTIA')
+
+    daily_files = [path for _, path in daily_files_after(None)]
+
+    # Load base (2007-2024) and daily (2025+) data
+    base_sst = xr.open_dataset(base_path)['analysed_sst']
+    daily_sst = xr.open_mfdataset(daily_files, combine='by_coords')['analysed_sst']
+
+    # Subset daily to match base bounds
+    lat_range = slice(20, 50)
+    lon_range = slice(-85, -40)
+    daily_sst = daily_sst.sel(latitude=lat_range, longitude=lon_range)
+
+    # Combine time series
+    return xr.concat([base_sst, daily_sst], dim='time')
+
+
+def full_recompute():
+    """Recompute every region's series and climatology from the 2007 onwards archive."""
+    combined_sst = load_combined_sst()
+
+    # Area-weighted mean of every region, one sparse product per time chunk
+    combined_sst = combined_sst.transpose('time', 'latitude', 'longitude')
+    weights = region_weights.load_or_build(
+        combined_sst['latitude'].values, combined_sst['longitude'].values, regions, weights_cache_dir
+    )
+    # (whole time chunks of the series store per read)
+    time_chunk = series_store.chunks('OSTIA')[0] if os.path.exists(series_path) else region_weights.DEFAULT_TIME_CHUNK
+    means = region_weights.regional_means(weights, combined_sst, time_chunk=time_chunk)
+
+    time_series = {}
+    clim = {}
+
+    for row, (region, coords) in enumerate(regions.items()):
+        # Regional mean
+        sst_region = xr.DataArray(means[row], coords={'time': combined_sst['time'].values}, dims='time')
+
+        # Subset to 2007–2024 for climatology
+        sst_base = sst_region.sel(time=slice("2007-01-01", "2024-12-31"))
+
+        # Compute baseline climatology (mean for each day-of-year)
+        clim_doy = sst_base.groupby("time.dayofyear").mean("time")
+
+        # Compute anomalies for full time series (broadcast baseline)
+        ssta = sst_region.groupby("time.dayofyear") - clim_doy
+
+        # Align baseline to each timestamp (same as before)
+        clim_aligned = sst_region - ssta
+        
+        # Convert Kelvin to Celsius
+        sst_c = sst_region - 273.15
+        clim_aligned_c = clim_aligned - 273.15
+        
+        # Format for JSON (SSTA already in °C as difference)
+        sst_dict = {
+            str(np.datetime_as_string(t, unit='D')): json_value(v)
+            for t, v in zip(sst_c.time.values, sst_c.values)
+        }
+        ssta_dict = {
+            str(np.datetime_as_string(t, unit='D')): json_value(v)
+            for t, v in zip(ssta.time.values, ssta.values)
+        }
+        clim_dict = {
+            str(np.datetime_as_string(t, unit='D')): json_value(v)
+            for t, v in zip(clim_aligned_c.time.values, clim_aligned_c.values)
+        }
+        
+        time_series[region] = {
+            'name': coords['name'],
+            'sst': sst_dict,     # absolute SST [°C]
+            'ssta': ssta_dict,   # anomaly [°C]
+            'clim': clim_dict    # per-date baseline [°C]
+        }
+        # Frozen climatology [K] by day of year, for incremental runs
+        clim[region] = {
+            str(int(doy)): json_value(v)
+            for doy, v in zip(clim_doy.dayofyear.values, clim_doy.values)
+        }
+
+    return time_series, clim
+
+
+def incremental_update(time_series, clim):
+    """Append the days newer than the last stored date, one daily file each; returns the number of days added."""
+    last_date = max(max(series['sst']) for series in time_series.values() if series['sst'])
+    new_files = daily_files_after(last_date)
+
+    for date_str, path in new_files:
+        doy = str(datetime.strptime(date_str, '%Y-%m-%d').timetuple().tm_yday)
+        with xr.open_dataset(path) as ds:
+            sst = ds['analysed_sst'].transpose('time', 'latitude', 'longitude')
+
+            # Regional means [K] (only the regions' bounding box is read)
+            weights = region_weights.load_or_build(
+                sst['latitude'].values, sst['longitude'].values, regions, weights_cache_dir
+            )
+            means = region_weights.regional_means(weights, sst)[:, 0]
+
+            for row, region in enumerate(regions):
+                sst_k = float(means[row])
+
+                # Anomaly against the frozen day-of-year baseline (NaN if either is missing)
+                base_k = clim[region].get(doy)
+                base_k = np.nan if base_k is None else base_k
+                ssta = sst_k - base_k
+                clim_aligned = sst_k - ssta
+
+                series = time_series[region]
+                series['sst'][date_str] = json_value(sst_k - 273.15)
+                series['ssta'][date_str] = json_value(ssta)
+                series['clim'][date_str] = json_value(clim_aligned - 273.15)
+        print(f"Appended {date_str} from {os.path.basename(path)}")
+
+    return len(new_files)
+
+
+def write_json(obj, path):
+    """Write JSON then rename, so the dashboard never reads a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+def load_state():
+    """Stored series and climatology, or (None, None) if either is missing or lacks a region."""
+    if not (os.path.exists(output_path) and os.path.exists(clim_path)):
+        return None, None
+    with open(output_path) as f:
+        time_series = json.load(f)
+    with open(clim_path) as f:
+        clim = json.load(f)
+    if any(region not in time_series or region not in clim for region in regions):
+        return None, None
+    return time_series, clim
+
+
+def parse_args(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Update the regional OSTIA SST time series JSON (incrementally by default)."
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        default=os.environ.get("OSTIA_TS_FULL", "0") == "1",
+        help="Recompute every region and the 2007-2024 climatology from the full archive.",
+    )
+    parser.add_argument(
+        "--format",
+        default=os.environ.get("TS_FORMAT", "binary"),
+        choices=["binary", "json", "legacy"],
+        help="Compact copy for the dashboard: float32 .bin sidecar, inline JSON arrays, or none. Default: binary",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+
+    time_series, clim = (None, None) if args.full else load_state()
+    if time_series is None:
+        print("Full recompute from the 2007-2024 base file and all daily files")
+        time_series, clim = full_recompute()
+        write_json(clim, clim_path)
+        # Daily files newer than the series store (none when read from the files)
+        incremental_update(time_series, clim)
+    else:
+        n_new = incremental_update(time_series, clim)
+        if n_new == 0:
+            print("No new daily files; time series unchanged")
+
+    # Write to JSON
+    write_json(time_series, output_path)
+
+    # Compact columnar copy (plus .gz/.br) that the dashboard loads first
+    if args.format != 'legacy':
+        timeseries_codec.write_compact(time_series, output_path, ['sst', 'ssta', 'clim'], mode=args.format)
+
+    print(f"Dashboard-ready SST time series written to: {output_path}")
+    return 0
+
 
-print(f"Dashboard-ready SST time series written to: {output_path}")
\ No newline at end of file
+if __name__ == "__main__":
+    raise SystemExit(main())
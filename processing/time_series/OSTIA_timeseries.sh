@@ -14,6 +14,12 @@ TIMESERIES_DIR="/vast/clidex/data/obs/CCCFA/processed_data/OSTIA_SST/time_series
 # Log start and take snapshot
 log_changes "start" "$TIMESERIES_DIR"
 
+# Appends only new daily files; set OSTIA_TS_FULL=1 to recompute from the whole archive
+export OSTIA_TS_FULL="${OSTIA_TS_FULL:-0}"
+
+# Compact copy for the dashboard: binary (.bin sidecar), json (inline arrays) or legacy (none)
+export TS_FORMAT="${TS_FORMAT:-binary}"
+
 # Activate environment and run
 source ~/mambaforge/etc/profile.d/conda.sh
 conda activate CCCFA
@@ -13,8 +13,14 @@ import os
 import glob
 import subprocess
 import re
+import sys
 import cftime
 
+# Shared processing helpers live in ../tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import region_weights
+import timeseries_codec
+
 # Grab all monthly files
 base_dir = '/vast/clidex/data/obs/SSS/SMAP/SMAP_RSS_v6.0/data'
 all_files = glob.glob(os.path.join(base_dir, 'monthly/*.nc'))
@@ -48,20 +54,27 @@ regions = {
     'NJ': {'lon': (286.5, 287), 'lat': (39.25, 40.25), 'name': 'New Jersey'}
 }
 
+# Cached (region x grid cell) weight matrices, one per source grid
+weights_cache_dir = '/vast/clidex/data/obs/CCCFA/processed_data/region_weights'
+
+# Area-weighted means of every region: one sparse product per time chunk
+# for the monthly files and one for the climatology
+monthly_sss = monthly_sss.transpose('time', 'lat', 'lon')
+sss_weights = region_weights.load_or_build(monthly_sss['lat'].values, monthly_sss['lon'].values, regions, weights_cache_dir)
+sss_means = region_weights.regional_means(sss_weights, monthly_sss)
+
+clim_da = clim_da.transpose('time', 'lat', 'lon')
+clim_weights = region_weights.load_or_build(clim_da['lat'].values, clim_da['lon'].values, regions, weights_cache_dir)
+clim_means = region_weights.regional_means(clim_weights, clim_da)
+
 time_series = {}
 
-for region, coords in regions.items():
-    # slice region
-    sss_region = monthly_sss.sel(
-        lon=slice(coords['lon'][0], coords['lon'][1]),
-        lat=slice(coords['lat'][0], coords['lat'][1])
-    ).mean(dim=('lat', 'lon')).compute()
+for row, (region, coords) in enumerate(regions.items()):
+    # region's monthly series
+    sss_region = xr.DataArray(sss_means[row], coords={'time': monthly_sss['time'].values}, dims='time')
 
-    # slice climatology
-    clim_region = clim_da.sel(
-        lon=slice(coords['lon'][0], coords['lon'][1]),
-        lat=slice(coords['lat'][0], coords['lat'][1])
-    ).mean(dim=('lat', 'lon')).compute()
+    # region's climatology
+    clim_region = xr.DataArray(clim_means[row], coords={'time': clim_da['time'].values}, dims='time')
 
     # convert climatology to month-based indexing
     clim_monthly = clim_region.assign_coords(month=clim_region['time'].dt.month)
@@ -101,6 +114,12 @@ output_path = '/vast/clidex/data/obs/CCCFA/processed_data/SSS/time_series/sss_ti
 with open(output_path, 'w') as f:
     json.dump(time_series, f)
 
+# Compact columnar copy (plus .gz/.br) that the dashboard loads first;
+# TS_FORMAT = binary (float32 .bin sidecar), json (inline arrays) or legacy (none)
+ts_format = os.environ.get('TS_FORMAT', 'binary')
+if ts_format != 'legacy':
+    timeseries_codec.write_compact(time_series, output_path, ['sss', 'sssa', 'clim'], mode=ts_format)
+
 
 
 
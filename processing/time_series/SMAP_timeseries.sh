@@ -14,6 +14,9 @@ TIMESERIES_DIR="/vast/clidex/data/obs/CCCFA/processed_data/SSS/time_series"
 # Log start and take snapshot
 log_changes "start" "$TIMESERIES_DIR"
 
+# Compact copy for the dashboard: binary (.bin sidecar), json (inline arrays) or legacy (none)
+export TS_FORMAT="${TS_FORMAT:-binary}"
+
 # Activate environment and run
 source ~/mambaforge/etc/profile.d/conda.sh
 conda activate CCCFA
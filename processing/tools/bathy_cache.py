@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/bathy_cache.py
+# Cropped bathymetry and precomputed depth contours per plot region.
+#
+# The figure scripts opened the global ETOPO1 grid on every run, converted
+# all of it to fathoms, masked land and then contoured a small window of it
+# in every panel.  For each (region, contour levels) pair the cropped fathom
+# grid and the contour lines (vertex arrays from contourpy, the engine
+# behind matplotlib's contour) are stored once as a small .npz, so a figure
+# draws the isobaths as a LineCollection and never touches ETOPO1 again.
+# Labels are placed along the cached lines (label_contours), standing in
+# for clabel, which needs a ContourSet.
+
+import os
+import hashlib
+
+import numpy as np
+
+
+ETOPO_FILE = '/vast/clidex/data/bathymetry/ETOPO1/ETOPO1_Bed_g_gmt4.grd'
+DEFAULT_CACHE_DIR = '/vast/clidex/data/obs/CCCFA/processed_data/bathy_cache'
+
+# 1 fathom = 1.8288 meters
+METERS_PER_FATHOM = 1.8288
+
+# Lines shorter than this (vertices) get no automatic label
+MIN_LABEL_VERTICES = 40
+
+# Regions already loaded by this process, keyed like the files on disk
+_loaded = {}
+
+
+def bathy_key(region, levels, source_file):
+    """Short hash of the source file's path, size and mtime, the region and the contour levels."""
+    st = os.stat(source_file)
+    parts = [
+        os.path.abspath(source_file),
+        str(st.st_size),
+        str(int(st.st_mtime)),
+        ",".join(f"{v:.6g}" for v in region),
+        ",".join(f"{v:.6g}" for v in levels),
+    ]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+
+def build_bathy(region, levels, source_file=ETOPO_FILE):
+    """
+    Crop ETOPO1 to region, convert to fathoms (land masked) and contour it.
+
+    Parameters:
+    -----------
+    region : list
+        [lon_min, lon_max, lat_min, lat_max]
+    levels : list
+        Contour levels [fathoms, negative below sea level]
+    source_file : str
+        ETOPO1 grid (GMT4 layout: 'z' on 'x'/'y')
+
+    Returns a dict of arrays: 'x', 'y', 'fathoms', 'levels', and the contour
+    lines as stacked 'vertices' with per-line 'offsets' and 'line_level'
+    (index into levels).
+    """
+    import xarray as xr
+    import contourpy
+
+    with xr.open_dataset(source_file) as ds:
+        z = ds['z'].sel(x=slice(region[0], region[1]), y=slice(region[2], region[3])).load()
+
+    # Convert depths from meters to fathoms, masking land (above sea level)
+    fathoms = (z / METERS_PER_FATHOM).where(z < 0).values.astype(np.float32)
+    x, y = z['x'].values, z['y'].values
+
+    generator = contourpy.contour_generator(x, y, np.ma.masked_invalid(fathoms))
+    vertices, offsets, line_level = [], [0], []
+    for k, level in enumerate(levels):
+        for line in generator.lines(level):
+            vertices.append(line)
+            offsets.append(offsets[-1] + len(line))
+            line_level.append(k)
+
+    return {
+        'x': x,
+        'y': y,
+        'fathoms': fathoms,
+        'levels': np.asarray(levels, dtype=np.float64),
+        'vertices': np.concatenate(vertices) if vertices else np.empty((0, 2)),
+        'offsets': np.asarray(offsets),
+        'line_level': np.asarray(line_level, dtype=np.int64),
+    }
+
+
+def load_or_build(region, levels, cache_dir=DEFAULT_CACHE_DIR, source_file=ETOPO_FILE):
+    """Cached bathymetry for a plot region (see build_bathy), building and saving it on first use."""
+    key = bathy_key(region, levels, source_file)
+    if key in _loaded:
+        return _loaded[key]
+
+    path = os.path.join(cache_dir, f"bathy_{key}.npz")
+    if os.path.exists(path):
+        with np.load(path) as f:
+            bathy = {name: f[name] for name in f.files}
+    else:
+        print(f"Building bathymetry cache {key} for region {list(region)}")
+        bathy = build_bathy(region, levels, source_file)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write then rename so concurrent jobs never read a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **bathy)
+        os.replace(tmp_path, path)
+
+    _loaded[key] = bathy
+    return bathy
+
+
+def contour_lines(bathy, level=None):
+    """Cached contour lines as a list of (n, 2) lon/lat arrays (all levels, or one)."""
+    offsets = bathy['offsets']
+    lines = []
+    for i in range(len(offsets) - 1):
+        if level is None or bathy['levels'][bathy['line_level'][i]] == level:
+            lines.append(bathy['vertices'][offsets[i]:offsets[i + 1]])
+    return lines
+
+
+def draw_contours(ax, bathy, **kwargs):
+    """
+    Draw the cached isobaths on ax as one LineCollection.
+
+    kwargs go to LineCollection (colors, linewidths, linestyles, alpha,
+    transform, ...).  Returns the collection.
+    """
+    from matplotlib.collections import LineCollection
+
+    lines = LineCollection(contour_lines(bathy), **kwargs)
+    ax.add_collection(lines, autolim=False)
+    return lines
+
+
+def label_contours(ax, bathy, fmt=lambda val: f"{int(abs(val))} fm", fontsize=6, manual=None, **kwargs):
+    """
+    Label the cached isobaths along the lines.
+
+    Every line of at least MIN_LABEL_VERTICES vertices is labelled at its
+    middle vertex, or, with manual=[(lon, lat), ...], one label per point is
+    placed at the nearest contour vertex.  kwargs go to ax.text (e.g.
+    transform).  Returns the text artists.
+    """
+    offsets = bathy['offsets']
+    anchors = []  # (line index, vertex index)
+    if manual is None:
+        for i in range(len(offsets) - 1):
+            if offsets[i + 1] - offsets[i] >= MIN_LABEL_VERTICES:
+                anchors.append((i, (offsets[i] + offsets[i + 1]) // 2))
+    elif len(bathy['vertices']):
+        line_of_vertex = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        for lon, lat in manual:
+            nearest = int(np.argmin(np.hypot(bathy['vertices'][:, 0] - lon, bathy['vertices'][:, 1] - lat)))
+            anchors.append((line_of_vertex[nearest], nearest))
+
+    texts = []
+    for i, v in anchors:
+        # Orientation from the neighbouring vertices, kept upright
+        lo, hi = max(v - 1, offsets[i]), min(v + 1, offsets[i + 1] - 1)
+        dx, dy = bathy['vertices'][hi] - bathy['vertices'][lo]
+        angle = np.degrees(np.arctan2(dy, dx))
+        if angle > 90:
+            angle -= 180
+        elif angle < -90:
+            angle += 180
+        x, y = bathy['vertices'][v]
+        texts.append(ax.text(
+            x, y, fmt(bathy['levels'][bathy['line_level'][i]]),
+            fontsize=fontsize, rotation=angle, rotation_mode='anchor',
+            transform_rotates_text=True, ha='center', va='center',
+            bbox=dict(facecolor='white', edgecolor='none', alpha=0.8, pad=0.5),
+            **kwargs
+        ))
+    return texts
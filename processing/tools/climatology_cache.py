@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/climatology_cache.py
+# Day-of-year climatology baselines as memory-mapped float32 cubes.
+#
+# The OSTIA baselines are 366-day NetCDF files; selecting one day with
+# `clim.where(clim.dayofyear == doy, drop=True)` scans the whole dayofyear
+# axis on every date.  A baseline is converted once per (source file,
+# bounds) into a C-ordered (dayofyear, lat, lon) float32 .npy, already
+# cropped to the tiling bounds, so each day is one contiguous block: a
+# daily anomaly is a single slice of the memory map plus a subtraction.
+# The coordinates live in a small .npz sidecar next to the cube.
+
+import os
+import hashlib
+
+import numpy as np
+
+
+# Configured OSTIA day-of-year baselines (85W-40W, 20N-50N), by name
+OSTIA_BASELINE_DIR = '/vast/clidex/data/obs/SST/OSTIA/baselines'
+OSTIA_BASELINES = {
+    '2007_2024': os.path.join(OSTIA_BASELINE_DIR, 'ostia_baseline_2007_2024_85W-40W_20N-50N.nc'),
+    '2010_2019': os.path.join(OSTIA_BASELINE_DIR, 'ostia_baseline_2010_2019_85W-40W_20N-50N.nc'),
+}
+
+# Baselines already opened by this process, keyed like the files on disk
+_loaded = {}
+
+
+def ostia_baseline_file(name):
+    """Path of a configured OSTIA baseline; raises ValueError for unknown names."""
+    if name not in OSTIA_BASELINES:
+        raise ValueError(f"Unknown baseline type: {name}")
+    return OSTIA_BASELINES[name]
+
+
+def clim_key(source_file, bounds, variable):
+    """Short hash of the source file's path, size and mtime, the crop bounds and the variable."""
+    st = os.stat(source_file)
+    parts = [
+        os.path.abspath(source_file),
+        str(st.st_size),
+        str(int(st.st_mtime)),
+        ",".join(f"{bounds[k]:.6g}" for k in ('min_lon', 'max_lon', 'min_lat', 'max_lat')),
+        variable,
+    ]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+
+def _crop(da, bounds):
+    """Crop a (dayofyear, latitude, longitude) DataArray to lat/lon bounds, whichever way latitude runs."""
+    lat = da['latitude'].values
+    lat_slice = (slice(bounds['min_lat'], bounds['max_lat']) if lat[0] < lat[-1]
+                 else slice(bounds['max_lat'], bounds['min_lat']))
+    return da.sel(latitude=lat_slice, longitude=slice(bounds['min_lon'], bounds['max_lon']))
+
+
+def build_climatology(source_file, bounds, path, coords_path, variable='analysed_sst'):
+    """Write the cropped float32 cube to `path` (one day at a time) and its coordinates to `coords_path`."""
+    import xarray as xr
+
+    with xr.open_dataset(source_file) as ds:
+        da = _crop(ds[variable].transpose('dayofyear', 'latitude', 'longitude'), bounds)
+        dayofyear = da['dayofyear'].values.astype(np.int16)
+
+        # Write then rename so concurrent jobs never read a partial file
+        tmp_coords = f"{coords_path}.{os.getpid()}.tmp"
+        with open(tmp_coords, 'wb') as f:
+            np.savez(f, dayofyear=dayofyear,
+                     latitude=da['latitude'].values, longitude=da['longitude'].values)
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        cube = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=da.shape)
+        for i in range(da.shape[0]):
+            cube[i] = da.isel(dayofyear=i).values
+        cube.flush()
+        del cube
+
+    os.replace(tmp_coords, coords_path)
+    os.replace(tmp_path, path)
+
+
+def load_or_build(source_file, bounds, cache_dir, variable='analysed_sst'):
+    """
+    Memory-mapped baseline for these bounds, converting the NetCDF on first use.
+
+    Parameters:
+    -----------
+    source_file : str
+        Day-of-year climatology NetCDF (dims dayofyear, latitude, longitude)
+    bounds : dict
+        min_lon/max_lon/min_lat/max_lat crop, in the file's longitude convention
+    cache_dir : str
+        Where the converted cubes live
+    variable : str
+        Variable to convert
+
+    Returns a dict with 'data' (read-only (dayofyear, lat, lon) memmap) and
+    the 'dayofyear', 'latitude' and 'longitude' coordinate arrays.
+    """
+    key = clim_key(source_file, bounds, variable)
+    if key in _loaded:
+        return _loaded[key]
+
+    path = os.path.join(cache_dir, f"clim_{key}.npy")
+    coords_path = os.path.join(cache_dir, f"clim_{key}_coords.npz")
+    if not os.path.exists(path):
+        print(f"Converting climatology {os.path.basename(source_file)} -> {key}")
+        os.makedirs(cache_dir, exist_ok=True)
+        build_climatology(source_file, bounds, path, coords_path, variable)
+
+    with np.load(coords_path) as f:
+        clim = {name: f[name] for name in f.files}
+    clim['data'] = np.load(path, mmap_mode='r')
+    _loaded[key] = clim
+    return clim
+
+
+def day(clim, doy):
+    """
+    One day-of-year of a baseline as an xarray DataArray (latitude, longitude).
+
+    Only that day's block of the memory map is read.  Raises KeyError if the
+    baseline has no such day.
+    """
+    import xarray as xr
+
+    index = np.flatnonzero(clim['dayofyear'] == int(doy))
+    if index.size == 0:
+        raise KeyError(f"Day of year {doy} not in climatology")
+    return xr.DataArray(
+        np.array(clim['data'][index[0]]),
+        coords={'latitude': clim['latitude'], 'longitude': clim['longitude']},
+        dims=('latitude', 'longitude'),
+    )
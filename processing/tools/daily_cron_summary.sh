@@ -8,6 +8,7 @@ MT_LOGS="$BASE/../make_tiles/logs"
 RS_LOGS="$BASE/../resample/logs"
 TS_LOGS="$BASE/../time_series/logs"
 UF_LOGS="$BASE/../update_figs/logs"
+IN_LOGS="$BASE/../ingest/logs"
 SINCE_HOURS=24
 
 now_iso=$(date -Iseconds)
@@ -136,6 +137,7 @@ echo "ccocean nightly summary"
 echo "Generated: $now_iso (window: last ${SINCE_HOURS}h)"
 
 summarize_downloads "$DL_LOGS"
+summarize_generic_processes "$IN_LOGS" "ZARR INGEST"
 summarize_generic_processes "$MT_LOGS" "TILE GENERATION"
 summarize_generic_processes "$RS_LOGS" "RESAMPLE"
 summarize_generic_processes "$TS_LOGS" "TIME SERIES"
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/fast_render.py
+# Raster drawing of gridded fields for the weekly and monthly figures.
+#
+# The figure scripts drew SST, anomaly and SSS maps with contourf at 150-200
+# levels, which is most of the time spent on each figure.  filled_field()
+# draws the same field as one rasterized pcolormesh instead, coloured through
+# a discrete colormap built from the contour levels (the colour contourf gives
+# each band, and its under/over colours for the extensions), so the map and
+# its colorbar look the same.  Coastlines, isobaths, contour lines and labels
+# are separate artists and stay vector.
+#
+# Each panel also has a resolution budget: a field with more grid cells per
+# side than the budget is block-averaged down to it before drawing, since
+# extra cells can't show at the panel's printed size.
+#
+# Configuration (environment):
+#   FIG_RENDER        "raster" (default) or "contour" for the old contourf path
+#   FIG_PANEL_CELLS   largest number of grid cells drawn per panel side
+#                     (0 = no limit)
+
+import os
+import warnings
+
+import numpy as np
+
+
+DEFAULT_MODE = 'raster'
+DEFAULT_PANEL_CELLS = 800
+
+
+def render_mode(default=DEFAULT_MODE):
+    """Render mode from FIG_RENDER: 'raster' or 'contour'."""
+    mode = os.environ.get('FIG_RENDER', default)
+    if mode not in ('raster', 'contour'):
+        raise ValueError(f"FIG_RENDER must be 'raster' or 'contour', got {mode!r}")
+    return mode
+
+
+def panel_cells(default=DEFAULT_PANEL_CELLS):
+    """Per-panel resolution budget from FIG_PANEL_CELLS (0 = unlimited)."""
+    return int(os.environ.get('FIG_PANEL_CELLS', default))
+
+
+def level_colormap(levels, cmap, extend='neither', vmin=None, vmax=None):
+    """
+    Discrete (colormap, norm) pair matching contourf's colours for these levels.
+
+    Parameters:
+    -----------
+    levels : array-like
+        Increasing contour levels
+    cmap : str or Colormap
+        Continuous colormap passed to contourf
+    extend : str
+        contourf's extend ('neither', 'min', 'max' or 'both'); values outside
+        the levels get the colormap's under/over colours and the colorbar
+        shows the matching triangles
+    vmin, vmax : float, optional
+        contourf's vmin/vmax, if given (default: first and last level)
+
+    contourf colours each band by the colormap at the band's midpoint,
+    normalised between the outer levels; the returned ListedColormap holds
+    exactly those colours.  Evenly spaced levels (all of the figures' levels)
+    get a plain Normalize over the outer levels, which picks the same band
+    and keeps the colorbar free of a minor tick per level; other levels get
+    a BoundaryNorm.
+    """
+    import matplotlib
+    from matplotlib.colors import BoundaryNorm, ListedColormap, Normalize
+
+    if isinstance(cmap, str):
+        cmap = matplotlib.colormaps[cmap]
+    levels = np.asarray(levels, dtype=np.float64)
+    norm = Normalize(vmin=levels[0] if vmin is None else vmin,
+                     vmax=levels[-1] if vmax is None else vmax)
+
+    bands = ListedColormap(cmap(norm(0.5 * (levels[:-1] + levels[1:]))))
+    # Out-of-range values are blank unless extended, as with contourf
+    bands.set_under(cmap.get_under() if extend in ('min', 'both') else 'none')
+    bands.set_over(cmap.get_over() if extend in ('max', 'both') else 'none')
+    bands.set_bad('none')
+    bands.colorbar_extend = extend
+
+    steps = np.diff(levels)
+    if np.allclose(steps, steps[0]):
+        return bands, Normalize(vmin=levels[0], vmax=levels[-1])
+    return bands, BoundaryNorm(levels, bands.N)
+
+
+def coarsen(lon, lat, values, max_cells):
+    """
+    Block-average a (lat, lon) grid to at most max_cells cells per side.
+
+    Cells are averaged over their finite members, so the coast isn't eaten
+    away; a block with no finite member stays NaN.  Returns (lon, lat, values),
+    unchanged if the grid is within the budget.
+    """
+    lon, lat = np.asarray(lon), np.asarray(lat)
+    values = np.asarray(values, dtype=np.float64)
+    if not max_cells or max(values.shape) <= max_cells:
+        return lon, lat, values
+
+    fy = int(np.ceil(values.shape[0] / max_cells))
+    fx = int(np.ceil(values.shape[1] / max_cells))
+    ny, nx = values.shape[0] // fy, values.shape[1] // fx
+
+    blocks = values[:ny * fy, :nx * fx].reshape(ny, fy, nx, fx)
+    finite = np.isfinite(blocks)
+    count = finite.sum(axis=(1, 3))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.where(finite, blocks, 0).sum(axis=(1, 3)) / count
+
+    return (lon[:nx * fx].reshape(nx, fx).mean(axis=1),
+            lat[:ny * fy].reshape(ny, fy).mean(axis=1),
+            mean)
+
+
+def filled_field(ax, lon, lat, values, levels, cmap, extend='neither', vmin=None, vmax=None,
+                 mode=None, max_cells=None, **kwargs):
+    """
+    Draw a gridded field the way contourf would, rasterized unless FIG_RENDER=contour.
+
+    Parameters:
+    -----------
+    ax : Axes or GeoAxes
+        Panel to draw on
+    lon, lat : array-like
+        1-D cell-centre coordinates
+    values : array-like
+        (lat, lon) field
+    levels, cmap, extend, vmin, vmax :
+        As for contourf
+    mode : str, optional
+        'raster' or 'contour'; defaults to FIG_RENDER
+    max_cells : int, optional
+        Resolution budget (cells per side); defaults to FIG_PANEL_CELLS
+
+    kwargs go to pcolormesh/contourf (e.g. transform).  Returns the artist,
+    usable as a colorbar mappable either way.
+    """
+    mode = render_mode() if mode is None else mode
+    if mode == 'contour':
+        return ax.contourf(lon, lat, values, levels=levels, cmap=cmap, extend=extend,
+                           vmin=vmin, vmax=vmax, **kwargs)
+
+    lon, lat, values = coarsen(lon, lat, values, panel_cells() if max_cells is None else max_cells)
+    bands, norm = level_colormap(levels, cmap, extend, vmin, vmax)
+    return ax.pcolormesh(lon, lat, np.ma.masked_invalid(values), cmap=bands, norm=norm,
+                         shading='nearest', rasterized=True, **kwargs)
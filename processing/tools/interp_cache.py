@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/interp_cache.py
+# Persistent curvilinear -> regular grid interpolation weights.
+#
+# scipy.interpolate.griddata rebuilds the Delaunay triangulation (linear) or
+# KD-tree (nearest) of the source points on every call.  For a model grid
+# such as doppio's lon_rho/lat_rho the points never change, so the
+# barycentric weights are computed once, stored as a sparse matrix, and each
+# day's field is interpolated with a single sparse matrix-vector product.
+# Entries are keyed by the source grid, the valid-point mask and the target
+# grid, and saved as .npz files so later runs skip the triangulation too.
+
+import os
+import hashlib
+
+import numpy as np
+from scipy.spatial import Delaunay, cKDTree
+from scipy.sparse import csr_matrix
+
+
+# Interpolators already loaded by this process, keyed like the files on disk
+_loaded = {}
+
+
+def interp_key(lon_src, lat_src, valid, lon_tgt, lat_tgt):
+    """Short hash identifying source grid + valid mask + target grid."""
+    h = hashlib.sha1()
+    for arr in (lon_src, lat_src, lon_tgt, lat_tgt):
+        arr = np.ascontiguousarray(arr, dtype=np.float64)
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    h.update(np.packbits(np.asarray(valid, dtype=bool).ravel()).tobytes())
+    return h.hexdigest()[:16]
+
+
+def build_interp(lon_src, lat_src, valid, lon_tgt, lat_tgt):
+    """
+    Triangulate the valid source points and compute target weights.
+
+    Parameters:
+    -----------
+    lon_src, lat_src : 2-D arrays
+        Source (curvilinear) coordinates
+    valid : 2-D bool array
+        Source points that carry data (finite coordinates and values)
+    lon_tgt, lat_tgt : 2-D arrays
+        Target (regular) coordinates
+
+    Returns a dict holding the CSR components of the (n_target, n_source)
+    linear-weight matrix, the mask of targets inside the triangulation, and
+    the flat source index of each target's nearest valid point.
+    """
+    valid = np.asarray(valid, dtype=bool).ravel()
+    src_index = np.flatnonzero(valid)
+    pts = np.column_stack((np.ravel(lon_src)[src_index], np.ravel(lat_src)[src_index]))
+    tgt = np.column_stack((np.ravel(lon_tgt), np.ravel(lat_tgt)))
+    n_tgt, n_src = len(tgt), valid.size
+
+    # Linear: barycentric weights of the enclosing triangle (same as griddata)
+    tri = Delaunay(pts)
+    simplex = tri.find_simplex(tgt)
+    inside = simplex >= 0
+    s = simplex[inside]
+    T = tri.transform[s]
+    b = np.einsum('nij,nj->ni', T[:, :2], tgt[inside] - T[:, 2])
+    weights = np.column_stack((b, 1 - b.sum(axis=1)))
+    vertices = src_index[tri.simplices[s]]
+
+    rows = np.repeat(np.flatnonzero(inside), 3)
+    matrix = csr_matrix(
+        (weights.ravel(), (rows, vertices.ravel())), shape=(n_tgt, n_src)
+    )
+
+    # Nearest: KD-tree lookup over the same valid points
+    _, nearest = cKDTree(pts).query(tgt)
+
+    return {
+        'data': matrix.data,
+        'indices': matrix.indices,
+        'indptr': matrix.indptr,
+        'shape': np.array(matrix.shape),
+        'inside': inside,
+        'nearest': src_index[nearest].astype(np.int64),
+        'tgt_shape': np.array(np.shape(lon_tgt)),
+    }
+
+
+def load_or_build(lon_src, lat_src, valid, lon_tgt, lat_tgt, cache_dir):
+    """Return the interpolator for this grid pair, building and saving it on first use."""
+    key = interp_key(lon_src, lat_src, valid, lon_tgt, lat_tgt)
+    if key in _loaded:
+        return _loaded[key]
+
+    path = os.path.join(cache_dir, f"interp_{key}.npz")
+    if os.path.exists(path):
+        with np.load(path) as f:
+            interp = {name: f[name] for name in f.files}
+    else:
+        print(f"Building interpolation weights {key} ({int(np.sum(valid))} source points)")
+        interp = build_interp(lon_src, lat_src, valid, lon_tgt, lat_tgt)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write then rename so concurrent workers never read a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **interp)
+        os.replace(tmp_path, path)
+
+    interp['matrix'] = csr_matrix(
+        (interp['data'], interp['indices'], interp['indptr']), shape=tuple(interp['shape'])
+    )
+    _loaded[key] = interp
+    return interp
+
+
+def interpolate(interp, values, method="linear"):
+    """
+    Interpolate one source field onto the target grid.
+
+    "linear" leaves targets outside the triangulation as NaN, like griddata;
+    "nearest" fills every target.
+    """
+    flat = np.ravel(values)
+    if method == "nearest":
+        out = flat[interp['nearest']].astype(np.float64)
+    else:
+        out = interp['matrix'] @ np.nan_to_num(flat.astype(np.float64))
+        out[~interp['inside']] = np.nan
+    return out.reshape(tuple(interp['tgt_shape']))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/land_mask.py
+# Cached Natural Earth land masks for fixed target grids.
+#
+# Reading the 10m land shapefile and rasterizing it costs several seconds on
+# every cron run even though the target grids never change.  A mask is built
+# once per (grid, shapefile version), stored bit-packed as .npy (1 bit per
+# pixel) and memory-mapped on load.
+
+import os
+import hashlib
+
+import numpy as np
+
+
+def natural_earth_land(resolution='10m'):
+    """Path of the Natural Earth physical/land shapefile (downloaded by cartopy if missing)."""
+    import cartopy.io.shapereader as shpreader
+    return shpreader.natural_earth(resolution=resolution, category='physical', name='land')
+
+
+def mask_key(shape, transform, shapefile):
+    """Short hash of the grid definition and the shapefile's path, size and mtime."""
+    st = os.stat(shapefile)
+    parts = [
+        "x".join(str(int(n)) for n in shape),
+        ",".join(f"{v:.10g}" for v in tuple(transform)[:6]),
+        os.path.abspath(shapefile),
+        str(st.st_size),
+        str(int(st.st_mtime)),
+    ]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+
+def rasterize_land(shape, transform, shapefile):
+    """Rasterize the shapefile onto the grid; True on land, rows north to south."""
+    import cartopy.io.shapereader as shpreader
+    from rasterio.features import rasterize
+
+    geoms = shpreader.Reader(shapefile).geometries()
+    mask = rasterize(
+        ((geom, 1) for geom in geoms),
+        out_shape=shape,
+        transform=transform,
+        fill=0,
+        dtype='uint8'
+    )
+    return mask.astype(bool)
+
+
+def land_mask(shape, transform, cache_dir, resolution='10m', shapefile=None):
+    """
+    Land mask (True on land) for a north-up grid, from cache when possible.
+
+    Parameters:
+    -----------
+    shape : (height, width)
+        Target grid size
+    transform : affine.Affine
+        Target grid geotransform (EPSG:4326)
+    cache_dir : str
+        Where the packed masks live
+    resolution : str
+        Natural Earth resolution ('10m', '50m', '110m')
+    shapefile : str, optional
+        Use this land shapefile instead of Natural Earth
+
+    Returns a bool array with rows in raster (north to south) order, as
+    rasterio.features.rasterize produces.
+    """
+    shapefile = shapefile or natural_earth_land(resolution)
+    height, width = shape
+    key = mask_key(shape, transform, shapefile)
+    path = os.path.join(cache_dir, f"land_{key}.npy")
+
+    if not os.path.exists(path):
+        print(f"Rasterizing land mask {key} from {shapefile}")
+        mask = rasterize_land(shape, transform, shapefile)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write then rename so concurrent jobs never read a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.packbits(mask.ravel()))
+        os.replace(tmp_path, path)
+
+    packed = np.load(path, mmap_mode='r')
+    return np.unpackbits(packed, count=height * width).reshape(height, width).astype(bool)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/manifest.py
+# Date index of a raw download directory.
+#
+# Readers that want "the last N days" used to list the whole directory (a
+# few thousand entries on /vast) and sort the names.  The downloaders keep
+# a small manifest.json next to the files instead: {"files": {"YYYY-MM-DD":
+# filename}}, updated once per run.  A directory without a manifest is
+# scanned once and the manifest written, so older archives need no
+# migration step.
+
+import os
+import re
+import json
+
+
+MANIFEST_NAME = 'manifest.json'
+
+# Date stamped at the end of the file names (OSTIA, GlobColour, ...)
+DEFAULT_DATE_REGEX = r'(\d{4}-\d{2}-\d{2})\.nc$'
+
+
+def manifest_path(directory):
+    """Location of a directory's manifest."""
+    return os.path.join(directory, MANIFEST_NAME)
+
+
+def scan(directory, date_regex=DEFAULT_DATE_REGEX):
+    """{date: filename} for every dated file in the directory."""
+    pattern = re.compile(date_regex)
+    files = {}
+    for filename in os.listdir(directory):
+        match = pattern.search(filename)
+        if match:
+            files[match.group(1)] = filename
+    return files
+
+
+def write(directory, files):
+    """Write the manifest (sorted by date) then rename, so readers never see a partial file."""
+    path = manifest_path(directory)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'files': dict(sorted(files.items()))}, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def load(directory, date_regex=DEFAULT_DATE_REGEX):
+    """{date: filename} from the manifest, scanning the directory (and writing the manifest) if there is none."""
+    path = manifest_path(directory)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)['files']
+    files = scan(directory, date_regex)
+    write(directory, files)
+    return files
+
+
+def latest(directory, n, date_regex=DEFAULT_DATE_REGEX):
+    """
+    The n most recent files as sorted (date, path) pairs.
+
+    Falls back to a directory scan if the manifest is empty or lists a file
+    that is no longer on disk.
+    """
+    files = load(directory, date_regex)
+    recent = [(date, os.path.join(directory, files[date])) for date in sorted(files)[-n:]]
+    if not recent or not all(os.path.exists(path) for _, path in recent):
+        print(f"Manifest in {directory} is stale; rescanning")
+        files = scan(directory, date_regex)
+        write(directory, files)
+        recent = [(date, os.path.join(directory, files[date])) for date in sorted(files)[-n:]]
+    return recent
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/parallel.py
+# Date-level process pool shared by the processing scripts.
+#
+# Each script wraps its per-date pipeline (open, subset, reproject, colorize,
+# tile) in a top-level function and hands the list of job tuples to
+# map_jobs().  Workers are forked, so they inherit the script's module-level
+# setup (paths, bounds, colormap tables) without pickling it.
+#
+# Results are streamed: at most a small window of dates is in flight at once
+# and each result is yielded as soon as it lands, so a long backfill runs in
+# roughly the memory of `workers` single dates.
+#
+# Configuration (environment):
+#   TILE_WORKERS        number of worker processes (1 = run in-process)
+#   TILE_WORKER_MEM_GB  address-space limit per worker in GB (0 = unlimited)
+
+import os
+import gc
+import resource
+import traceback
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+
+DEFAULT_WORKERS = 4
+DEFAULT_WORKER_MEM_GB = 8
+
+# Jobs queued per worker beyond the one it is running
+PENDING_PER_WORKER = 1
+
+# Reruns of a job that was on a pool when a worker died (OOM kill,
+# segfault); reruns go one at a time, so only the job that kills its
+# worker every time is skipped
+BROKEN_POOL_RETRIES = 1
+
+
+def worker_count(default=DEFAULT_WORKERS):
+    """Worker count from TILE_WORKERS, never less than 1."""
+    return max(1, int(os.environ.get("TILE_WORKERS", default)))
+
+
+def worker_memory_gb(default=DEFAULT_WORKER_MEM_GB):
+    """Per-worker memory limit in GB from TILE_WORKER_MEM_GB."""
+    return float(os.environ.get("TILE_WORKER_MEM_GB", default))
+
+
+def _limit_memory(max_memory_gb):
+    """Pool initializer: cap the worker's address space so one bad date can't take the node down."""
+    if max_memory_gb and max_memory_gb > 0:
+        limit = int(max_memory_gb * 1024 ** 3)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def map_jobs(func, jobs, workers=None, max_memory_gb=None):
+    """
+    Run func(*job) for every job tuple across a pool of forked workers.
+
+    Parameters:
+    -----------
+    func : callable
+        Top-level function of the calling script (looked up by name in the
+        forked worker, so it must not be a lambda or closure)
+    jobs : iterable of tuple
+        Positional arguments for each call, e.g. (date_int, filename)
+    workers : int, optional
+        Pool size; defaults to TILE_WORKERS.  With 1 worker the jobs run
+        in-process, which keeps tracebacks and pdb usable.
+    max_memory_gb : float, optional
+        RLIMIT_AS applied to each worker; defaults to TILE_WORKER_MEM_GB
+
+    Yields func's return value for each job as it completes.  Jobs are
+    pulled lazily and only workers * (1 + PENDING_PER_WORKER) are in flight,
+    so `jobs` may be a generator and results should be small records (e.g.
+    the per-date min/max) rather than arrays.  A job that raises is reported
+    and skipped so the remaining dates still finish.  If a worker dies
+    outright (OOM kill, segfault) the pool is restarted and the jobs that
+    were on it are rerun one at a time, up to BROKEN_POOL_RETRIES times.
+    """
+    jobs = iter(jobs)
+    workers = worker_count() if workers is None else max(1, int(workers))
+    max_memory_gb = worker_memory_gb() if max_memory_gb is None else max_memory_gb
+
+    if workers == 1:
+        for job in jobs:
+            try:
+                yield func(*job)
+            except Exception:
+                print(f"[ERROR] {func.__name__}{job} failed:\n{traceback.format_exc()}")
+            # Drop the previous date's arrays before opening the next file
+            gc.collect()
+        return
+
+    print(f"Running jobs on {workers} workers ({max_memory_gb:g} GB limit each)")
+    max_pending = workers * (1 + PENDING_PER_WORKER)
+    retry = deque()  # (job, attempts) to resubmit after a broken pool
+    pending = {}     # future -> (job, attempts)
+    pool = _start_pool(workers, max_memory_gb)
+    try:
+        while True:
+            broken = False
+            while len(pending) < max_pending:
+                if retry:
+                    # Reruns go one at a time, so a job that kills its worker
+                    # again only takes itself down
+                    if pending:
+                        break
+                    entry = retry.popleft()
+                else:
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    entry = (job, 0)
+                try:
+                    pending[pool.submit(func, *entry[0])] = entry
+                except BrokenProcessPool:
+                    retry.appendleft(entry)
+                    broken = True
+                    break
+                if entry[1]:
+                    break
+
+            if not pending and not broken:
+                return
+
+            lost = []
+            if pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    entry = pending.pop(future)
+                    try:
+                        yield future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        lost.append(entry)
+                    except Exception as e:
+                        print(f"[ERROR] {func.__name__}{entry[0]} failed: {e!r}")
+
+            if broken:
+                # A dead worker takes the pool down with every job still on it;
+                # rerun those on a fresh pool, dropping one that died on its rerun
+                lost.extend(pending.values())
+                pending.clear()
+                for job, attempts in lost:
+                    if attempts < BROKEN_POOL_RETRIES:
+                        print(f"[WARNING] {func.__name__}{job} lost with a worker; retrying")
+                        retry.append((job, attempts + 1))
+                    else:
+                        print(f"[ERROR] {func.__name__}{job} failed: worker died again; skipping")
+                pool.shutdown(wait=True)
+                pool = _start_pool(workers, max_memory_gb)
+    finally:
+        pool.shutdown(wait=True)
+
+
+def _start_pool(workers, max_memory_gb):
+    """Pool of forked workers, each with the address-space limit applied."""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp.get_context("fork"),
+        initializer=_limit_memory,
+        initargs=(max_memory_gb,)
+    )
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# tools/polygon_query.py
+# Area-weighted SST, SST anomaly and SSS series for an arbitrary polygon.
+#
+# The dashboard's time series exist only for the five fixed regions.  This
+# service answers arbitrary polygons instead (the dashboard does not query it
+# yet; a chart for area-select polygons is still to come): each polygon is
+# rasterized once per grid into a sparse cos(latitude) weight row
+# (region_weights.build_weights) and kept in an LRU cache, then reduced over
+# the time-chunked series stores (series_store.py), which only costs the
+# chunks under the polygon's bounding box.  SST anomalies are taken against
+# the polygon's mean of a configured day-of-year baseline
+# (climatology_cache.py).
+#
+#   GET  /series?polygon=lon,lat;lon,lat;...[&products=OSTIA,SMAP_8day][&baseline=2007_2024]
+#   POST /series   {"polygon": [[lon, lat], ...], "products": [...], "baseline": "..."}
+#
+# Responses are JSON: {product: {"dates": [...], <variable>: [value or null, ...]}}.
+# Polygons over MAX_VERTICES vertices or MAX_BOX_CELLS bounding-box cells
+# get a 400, and each is reduced QUERY_BLOCK_BYTES of data at a time.
+#
+#   python polygon_query.py --store-dir /vast/clidex/data/obs/CCCFA/zarr --port 8086
+
+import os
+import sys
+import json
+import threading
+from functools import lru_cache
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+import zarr_cube
+import series_store
+import region_weights
+import climatology_cache
+
+
+DEFAULT_PORT = 8086
+
+# Polygons kept rasterized (per product grid)
+MASK_CACHE_SIZE = 256
+
+# Vertices are rounded to this many decimals before caching (~10 m)
+VERTEX_DECIMALS = 4
+
+# Largest polygon accepted, in vertices
+MAX_VERTICES = 500
+
+# Largest polygon bounding box accepted, in grid cells (about a quarter of
+# the OSTIA domain)
+MAX_BOX_CELLS = 150_000
+
+# Bytes of the bounding box reduced at a time per product, as float64;
+# regional_means holds about three copies of each block
+QUERY_BLOCK_BYTES = 64 * 2 ** 20
+
+DEFAULT_BASELINE = '2007_2024'
+CLIM_CACHE_DIR = '/vast/clidex/data/obs/CCCFA/processed_data/clim_cache'
+
+# Store directory used by the handlers (set by main)
+_store_dir = None
+
+# Open series stores keyed by (product, store and tail metadata mtimes) so a
+# daily sync, which only touches the tail, is picked up
+_series = {}
+_series_lock = threading.Lock()
+
+
+def _metadata_mtime(path):
+    """Modification time of a store's consolidated metadata (zarr v3 or v2 layout)."""
+    for name in ('zarr.json', '.zmetadata'):
+        try:
+            return os.stat(os.path.join(path, name)).st_mtime
+        except FileNotFoundError:
+            continue
+    raise ValueError(f"No series store at {path}")
+
+
+def open_product(product):
+    """Shared lazy (time, lat, lon) DataArray of a product's series store and its tail."""
+    tail = series_store.tail_path(product, _store_dir)
+    key = (product, _metadata_mtime(series_store.series_path(product, _store_dir)),
+           _metadata_mtime(tail) if os.path.exists(tail) else None)
+    with _series_lock:
+        if key not in _series:
+            for old in [k for k in _series if k[0] == product]:
+                del _series[old]
+            _series[key] = series_store.open_series(product, _store_dir)
+        return _series[key]
+
+
+def _matrix(weights):
+    """CSR weight matrix for build_weights output."""
+    i0, i1, j0, j1 = (int(v) for v in weights['box'])
+    weights['matrix'] = csr_matrix(
+        (weights['data'], weights['indices'], weights['indptr']),
+        shape=(len(weights['names']), (i1 - i0) * (j1 - j0))
+    )
+    return weights
+
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def polygon_weights(product, ring):
+    """Weights of one polygon (tuple of (lon, lat) vertices) on a product's series grid."""
+    spec = series_store.SERIES[product]
+    da = open_product(product)
+    return _matrix(region_weights.build_weights(
+        da[spec['lat']].values, da[spec['lon']].values, {'polygon': {'polygon': ring}}
+    ))
+
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def polygon_climatology(baseline, ring):
+    """Polygon mean of a day-of-year baseline, as {dayofyear: K}."""
+    bounds = series_store.SERIES['OSTIA']['bounds']
+    clim = climatology_cache.load_or_build(
+        climatology_cache.ostia_baseline_file(baseline), bounds, CLIM_CACHE_DIR
+    )
+    weights = _matrix(region_weights.build_weights(
+        clim['latitude'], clim['longitude'], {'polygon': {'polygon': ring}}
+    ))
+    means = region_weights.regional_means(weights, clim['data'])[0]
+    return dict(zip(clim['dayofyear'].tolist(), means))
+
+
+def _time_chunk(product, weights):
+    """
+    Steps per regional_means block for a polygon: QUERY_BLOCK_BYTES over its
+    bounding box, rounded down to a power of two so blocks never straddle
+    the store's time chunks.  Rejects boxes over MAX_BOX_CELLS.
+    """
+    i0, i1, j0, j1 = (int(v) for v in weights['box'])
+    cells = (i1 - i0) * (j1 - j0)
+    if cells > MAX_BOX_CELLS:
+        raise ValueError(f"Polygon spans {cells} {product} grid cells; the limit is {MAX_BOX_CELLS}")
+    steps = max(1, QUERY_BLOCK_BYTES // (8 * max(cells, 1)))
+    return min(2 ** int(np.log2(steps)), series_store.chunks(product)[0])
+
+
+def _json_values(values):
+    """Floats rounded for JSON, None for NaN."""
+    return [round(float(v), 4) if np.isfinite(v) else None for v in values]
+
+
+def query(ring, products=('OSTIA', 'SMAP_8day'), baseline=DEFAULT_BASELINE):
+    """
+    Series of every requested product over one polygon.
+
+    Parameters:
+    -----------
+    ring : tuple of (lon, lat)
+        Polygon vertices (either longitude convention)
+    products : sequence of str
+        Keys of series_store.SERIES
+    baseline : str
+        OSTIA day-of-year baseline for 'ssta' (see climatology_cache.OSTIA_BASELINES)
+
+    Returns {product: {'dates': [...], variable: [...]}}: OSTIA gives 'sst'
+    and 'ssta' [°C], SMAP 'sss' [psu].  Raises ValueError for a polygon
+    whose bounding box exceeds MAX_BOX_CELLS.
+    """
+    result = {}
+    for product in products:
+        da = open_product(product)
+        weights = polygon_weights(product, ring)
+        means = region_weights.regional_means(weights, da, time_chunk=_time_chunk(product, weights))[0]
+        times = da['time'].values
+        series = {'dates': np.datetime_as_string(times, unit='D').tolist()}
+
+        if product == 'OSTIA':
+            clim = polygon_climatology(baseline, ring)
+            doy = times.astype('datetime64[D]') - times.astype('datetime64[Y]').astype('datetime64[D]') + 1
+            base = np.array([clim.get(int(d), np.nan) for d in doy.astype(int)])
+            series['sst'] = _json_values(means - 273.15)
+            series['ssta'] = _json_values(means - base)
+        else:
+            series['sss'] = _json_values(means)
+        result[product] = series
+    return result
+
+
+def parse_polygon(value):
+    """Rounded (lon, lat) vertex tuple from 'lon,lat;lon,lat;...' or a [[lon, lat], ...] list."""
+    if isinstance(value, str):
+        value = [pair.split(',') for pair in value.split(';') if pair]
+    ring = tuple((round(float(lon), VERTEX_DECIMALS), round(float(lat), VERTEX_DECIMALS)) for lon, lat in value)
+    if not 3 <= len(ring) <= MAX_VERTICES:
+        raise ValueError(f"Polygon needs 3-{MAX_VERTICES} vertices, got {len(ring)}")
+    return ring
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """JSON endpoint for polygon series."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self._answer(url.path, params)
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            params = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self.send_error(400, "Body must be JSON")
+            return
+        self._answer(urlparse(self.path).path, params)
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.end_headers()
+
+    def _answer(self, path, params):
+        if path.rstrip('/') != '/series':
+            self.send_error(404, "Unknown endpoint")
+            return
+        try:
+            ring = parse_polygon(params.get('polygon', ''))
+            products = params.get('products') or ['OSTIA', 'SMAP_8day']
+            if isinstance(products, str):
+                products = products.split(',')
+            unknown = [p for p in products if p not in series_store.SERIES]
+            if unknown:
+                raise ValueError(f"Unknown product(s): {', '.join(unknown)}")
+            body = json.dumps(query(ring, tuple(products), params.get('baseline', DEFAULT_BASELINE)))
+        except (ValueError, TypeError) as exc:
+            self.send_error(400, str(exc))
+            return
+
+        payload = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def end_headers(self):
+        # The dashboard is served from a different origin than the service
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        # Keep cron/nohup logs quiet; errors still go through log_error
+        pass
+
+    def log_error(self, format, *args):
+        sys.stderr.write("%s - %s\n" % (self.address_string(), format % args))
+
+
+def parse_args(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Serve area-weighted SST, SST anomaly and SSS series for arbitrary polygons."
+    )
+    parser.add_argument(
+        "--store-dir",
+        default=os.environ.get("ZARR_STORE_DIR", zarr_cube.DEFAULT_STORE_DIR),
+        help=f"Directory holding the <product>_series.zarr stores. Default: {zarr_cube.DEFAULT_STORE_DIR}",
+    )
+    parser.add_argument(
+        "--host",
+        default=os.environ.get("QUERY_SERVER_HOST", "127.0.0.1"),
+        help="Interface to bind. Default: 127.0.0.1",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=int(os.environ.get("QUERY_SERVER_PORT", DEFAULT_PORT)),
+        help=f"Port to listen on. Default: {DEFAULT_PORT}",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    global _store_dir
+
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    _store_dir = args.store_dir
+    server = ThreadingHTTPServer((args.host, args.port), QueryHandler)
+    print(f"Serving polygon series from {args.store_dir} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/profile_store.py
+# Consolidated CTD / eMOLT profile store.
+#
+# The profile downloaders write one {profile}_measurements.csv per cast plus a
+# metadata.csv, and every reader (weekly_update.py, the dashboard) used to
+# open those files one at a time.  Next to them they now also write every
+# cast into two consolidated files:
+#
+#   profiles.nc     CF contiguous ragged array: per-profile variables
+#                   (profile_id, latitude, longitude, time, group, regions)
+#                   on the 'profile' dimension, the measurements end to end
+#                   on 'obs', and row_size giving each profile's count
+#   profiles.json   the same as columns for the browser (plus .gz/.br):
+#                   {"profiles": {metadata column: [...]}, "offsets": [...],
+#                    "columns": {variable: [...]}}; profile i's measurements
+#                   are columns[v][offsets[i]:offsets[i + 1]]
+#
+# Readers load a store in one read (load), pick casts by ID, region and date
+# (select) and slice one cast's measurements by its offsets (measurements).
+# The per-profile CSVs are still written, so older readers keep working.
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+import timeseries_codec
+
+
+STORE_NAME = 'profiles.nc'
+JSON_NAME = 'profiles.json'
+
+FORMAT_NAME = 'cccfa-profiles'
+FORMAT_VERSION = 1
+
+# Store variable -> (measurements CSV column, units) for each profile source;
+# 'depth' is the vertical coordinate of the cast (sea pressure for the CTDs)
+PRODUCTS = {
+    'CTD': {
+        'depth': ('Sea Pressure (dbar)', 'dbar'),
+        'temperature': ('Temperature (°C)', 'degree_C'),
+        'salinity': ('Practical Salinity (PSU)', 'PSU'),
+        'density': ('Density (kg/m-3)', 'kg m-3'),
+    },
+    'EMOLT': {
+        'depth': ('Depth (m)', 'm'),
+        'temperature': ('Temperature (°C)', 'degree_C'),
+    },
+}
+
+# metadata.csv column -> per-profile store variable (Group/Regions are CTD only)
+METADATA_COLUMNS = {
+    'Profile ID': 'profile_id',
+    'Latitude': 'latitude',
+    'Longitude': 'longitude',
+    'Group': 'group',
+    'Regions': 'regions',
+}
+
+# JSON decimals kept per measurement (the CSVs carry about this many)
+JSON_DECIMALS = 4
+
+# Stores already loaded by this process, keyed by (path, mtime)
+_loaded = {}
+
+
+def store_path(directory):
+    """Location of a directory's consolidated profile store."""
+    return os.path.join(directory, STORE_NAME)
+
+
+def build(metadata_df, measurements, product):
+    """
+    Ragged-array Dataset of every profile in metadata_df.
+
+    Parameters:
+    -----------
+    metadata_df : DataFrame
+        One row per profile, with the metadata.csv columns ('Profile ID',
+        'Latitude', 'Longitude', 'Date', and 'Group'/'Regions' if present)
+    measurements : dict
+        {profile ID: measurements DataFrame indexed by the vertical column},
+        as written to {profile}_measurements.csv
+    product : str
+        Key of PRODUCTS (which columns the casts carry)
+    """
+    import xarray as xr
+
+    columns = PRODUCTS[product]
+    metadata_df = metadata_df.reset_index(drop=True)
+
+    row_size = []
+    obs = {name: [] for name in columns}
+    for profile_id in metadata_df['Profile ID']:
+        df = measurements[profile_id].reset_index()
+        row_size.append(len(df))
+        for name, (column, _) in columns.items():
+            obs[name].append(df[column].to_numpy(dtype=np.float64))
+
+    ds = xr.Dataset(attrs={
+        'featureType': 'profile',
+        'Conventions': 'CF-1.8',
+        'source_product': product,
+    })
+    for column, name in METADATA_COLUMNS.items():
+        if column in metadata_df:
+            values = metadata_df[column]
+            if name in ('latitude', 'longitude'):
+                values = values.astype(np.float64)
+            else:
+                values = values.fillna('').astype(str)
+            ds[name] = ('profile', values.to_numpy())
+    ds['profile_id'].attrs['cf_role'] = 'profile_id'
+    ds['time'] = ('profile', pd.to_datetime(metadata_df['Date']).to_numpy(dtype='datetime64[ns]'))
+
+    ds['row_size'] = ('profile', np.asarray(row_size, dtype=np.int32),
+                      {'long_name': 'number of observations in this profile', 'sample_dimension': 'obs'})
+    for name, (column, units) in columns.items():
+        values = np.concatenate(obs[name]) if obs[name] else np.empty(0, dtype=np.float64)
+        ds[name] = ('obs', values, {'units': units, 'long_name': column})
+    return ds
+
+
+def _json_column(values):
+    """Rounded floats for JSON, None for NaN."""
+    return [round(float(v), JSON_DECIMALS) if np.isfinite(v) else None for v in values]
+
+
+def to_json(ds):
+    """Columnar dict of a store for the browser (see the module comment)."""
+    names = {name: column for column, name in METADATA_COLUMNS.items()}
+    profiles = {names[name]: ds[name].values.tolist() for name in names if name in ds}
+    profiles['Date'] = np.datetime_as_string(ds['time'].values, unit='D').tolist()
+
+    variables = list(PRODUCTS[ds.attrs['source_product']])
+    return {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'product': ds.attrs['source_product'],
+        'variables': {name: ds[name].attrs['long_name'] for name in variables},
+        'profiles': profiles,
+        'offsets': offsets(ds).tolist(),
+        'columns': {name: _json_column(ds[name].values) for name in variables},
+    }
+
+
+def write(directory, metadata_df, measurements, product):
+    """
+    Write profiles.nc and profiles.json (with .gz/.br copies) for a directory.
+
+    Arguments as for build().  Both files are written then renamed, so a
+    reader never sees a partial store.
+    """
+    path = store_path(directory)
+    if metadata_df.empty:
+        print(f"No profiles to write to {path}")
+        return None
+    ds = build(metadata_df, measurements, product)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    encoding = {'time': {'units': 'days since 1970-01-01', 'dtype': 'float64'}}
+    ds.to_netcdf(tmp_path, encoding=encoding)
+    os.replace(tmp_path, path)
+
+    payload = json.dumps(to_json(ds), separators=(',', ':')).encode()
+    timeseries_codec._write_bytes(os.path.join(directory, JSON_NAME), payload)
+
+    print(f"Wrote {ds.sizes['profile']} profiles ({ds.sizes['obs']} measurements) to {path}")
+    return path
+
+
+def load(directory):
+    """The directory's store as an in-memory Dataset (one read, shared per process), or None without one."""
+    import xarray as xr
+
+    path = store_path(directory)
+    if not os.path.exists(path):
+        return None
+    key = (path, os.stat(path).st_mtime)
+    if key not in _loaded:
+        for old in [k for k in _loaded if k[0] == path]:
+            del _loaded[old]
+        with xr.open_dataset(path) as ds:
+            _loaded[key] = ds.load()
+    return _loaded[key]
+
+
+def offsets(ds):
+    """Start of every profile on 'obs', plus the end: profile i is obs[offsets[i]:offsets[i + 1]]."""
+    return np.concatenate([[0], np.cumsum(ds['row_size'].values, dtype=np.int64)])
+
+
+def select(ds, profile_ids=None, regions=None, bbox=None, start=None, end=None):
+    """
+    Metadata of the matching profiles, as the rows of metadata.csv.
+
+    Parameters:
+    -----------
+    ds : Dataset
+        Store from load()
+    profile_ids : list, optional
+        Keep only these profile IDs
+    regions : list, optional
+        Keep profiles tagged with any of these regions (CTD 'Regions')
+    bbox : list, optional
+        [lon_min, lon_max, lat_min, lat_max]
+    start, end : date-like, optional
+        Inclusive date range
+
+    Returns a DataFrame with 'Profile ID', 'Latitude', 'Longitude', 'Date'
+    (datetime), 'Group'/'Regions' where stored, and 'Row', the profile's
+    index in the store.
+    """
+    df = pd.DataFrame({column: ds[name].values for column, name in METADATA_COLUMNS.items() if name in ds})
+    df['Date'] = pd.to_datetime(ds['time'].values)
+    df['Row'] = np.arange(len(df))
+
+    keep = np.ones(len(df), dtype=bool)
+    if profile_ids is not None:
+        keep &= df['Profile ID'].isin([str(p) for p in profile_ids]).to_numpy()
+    if regions is not None:
+        if 'Regions' not in df:
+            raise ValueError(f"{ds.attrs['source_product']} profiles carry no regions")
+        keep &= df['Regions'].str.contains('|'.join(regions), na=False).to_numpy()
+    if bbox is not None:
+        keep &= ((df['Longitude'] >= bbox[0]) & (df['Longitude'] <= bbox[1])
+                 & (df['Latitude'] >= bbox[2]) & (df['Latitude'] <= bbox[3])).to_numpy()
+    if start is not None:
+        keep &= (df['Date'] >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        keep &= (df['Date'] <= pd.Timestamp(end)).to_numpy()
+    return df[keep].reset_index(drop=True)
+
+
+def measurements(ds, profile_id):
+    """One profile's measurements as {variable: array}, or None if the store doesn't have it."""
+    rows = np.flatnonzero(ds['profile_id'].values == str(profile_id))
+    if not rows.size:
+        return None
+    bounds = offsets(ds)
+    i0, i1 = bounds[rows[0]], bounds[rows[0] + 1]
+    return {name: ds[name].values[i0:i1] for name in PRODUCTS[ds.attrs['source_product']]}
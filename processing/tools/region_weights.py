@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/region_weights.py
+# Sparse (region x grid cell) weights for multi-region means.
+#
+# The time-series scripts did one `.sel(box).mean()` per region, i.e. one
+# pass over the data per region.  Instead every region is turned once per
+# product grid into a row of cos(latitude) area weights over its cells,
+# stored as a CSR matrix restricted to the bounding box of all regions and
+# cached as .npz.  Regional means for any number of regions are then one
+# sparse matrix product per time chunk, and a new box or polygon costs a
+# point-in-polygon test over its own bounding box.
+#
+# A region is a dict with either 'lon'/'lat' (lo, hi) box ranges, matched
+# inclusively like `.sel(slice(lo, hi))`, or 'polygon': [[lon, lat], ...]
+# (cell centres inside the ring).  Longitudes may be given in either
+# -180/180 or 0/360; they are wrapped to the grid's convention.
+
+import os
+import json
+import hashlib
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+# The dashboard's fixed regions (OSTIA definitions, -180/180 longitudes)
+REGIONS = {
+    'OC': {'lon': (-70, -69.5), 'lat': (41.5, 42.3), 'name': 'Outer Cape'},
+    'IC': {'lon': (-70.5, -70), 'lat': (41.7, 42.3), 'name': 'Inner Cape'},
+    'GoM': {'lon': (-71, -68), 'lat': (42, 44), 'name': 'Gulf of Maine'},
+    'RI': {'lon': (-72, -70.75), 'lat': (40.5, 41.5), 'name': 'Rhode Island'},
+    'NJ': {'lon': (-74.5, -73), 'lat': (39.25, 40.25), 'name': 'New Jersey'}
+}
+
+# Time steps reduced per matrix product
+DEFAULT_TIME_CHUNK = 366
+
+# Weights already loaded by this process, keyed like the files on disk
+_loaded = {}
+
+
+def _geometry(region):
+    """The part of a region definition that decides its cells."""
+    if 'polygon' in region:
+        return {'polygon': [[float(x), float(y)] for x, y in region['polygon']]}
+    return {'lon': [float(v) for v in region['lon']], 'lat': [float(v) for v in region['lat']]}
+
+
+def weights_key(lat, lon, regions):
+    """Short hash identifying grid + region geometries."""
+    h = hashlib.sha1()
+    for arr in (lat, lon):
+        arr = np.ascontiguousarray(arr, dtype=np.float64)
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    h.update(json.dumps({name: _geometry(r) for name, r in regions.items()}, sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+
+def _wrap_lon(values, grid_lon):
+    """Wrap region longitudes into the grid's 0/360 or -180/180 convention."""
+    values = np.asarray(values, dtype=np.float64)
+    if np.nanmax(grid_lon) > 180:
+        return np.mod(values, 360)
+    return ((values + 180) % 360) - 180
+
+
+def region_cells(lat, lon, region):
+    """Bool (lat, lon) mask of the cells belonging to one region."""
+    if 'polygon' in region:
+        from matplotlib.path import Path
+
+        ring = np.asarray(region['polygon'], dtype=np.float64)
+        ring = np.column_stack((_wrap_lon(ring[:, 0], lon), ring[:, 1]))
+        mask = np.zeros((len(lat), len(lon)), dtype=bool)
+
+        # Only test cell centres inside the polygon's bounding box
+        rows = np.flatnonzero((lat >= ring[:, 1].min()) & (lat <= ring[:, 1].max()))
+        cols = np.flatnonzero((lon >= ring[:, 0].min()) & (lon <= ring[:, 0].max()))
+        if rows.size and cols.size:
+            lon2d, lat2d = np.meshgrid(lon[cols], lat[rows])
+            inside = Path(ring).contains_points(np.column_stack((lon2d.ravel(), lat2d.ravel())))
+            mask[np.ix_(rows, cols)] = inside.reshape(rows.size, cols.size)
+        return mask
+
+    lon_lo, lon_hi = _wrap_lon(region['lon'], lon)
+    lat_lo, lat_hi = region['lat']
+    return np.outer((lat >= lat_lo) & (lat <= lat_hi), (lon >= lon_lo) & (lon <= lon_hi))
+
+
+def build_weights(lat, lon, regions):
+    """
+    cos(latitude) weights of every region's cells.
+
+    Parameters:
+    -----------
+    lat, lon : 1-D arrays
+        Grid coordinates (either order, either longitude convention)
+    regions : dict
+        name -> region definition (see module header)
+
+    Returns a dict holding the CSR components of the (n_regions, n_cells)
+    weight matrix over the bounding box of all regions, the box's row and
+    column index ranges and the region names in row order.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    names = list(regions)
+    masks = [region_cells(lat, lon, regions[name]) for name in names]
+
+    # Bounding box of every region's cells (empty regions keep a zero row)
+    any_cell = np.logical_or.reduce(masks) if masks else np.zeros((len(lat), len(lon)), bool)
+    rows, cols = np.flatnonzero(any_cell.any(axis=1)), np.flatnonzero(any_cell.any(axis=0))
+    if rows.size == 0:
+        rows = cols = np.array([0])
+    i0, i1, j0, j1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+    area = np.cos(np.deg2rad(lat[i0:i1]))[:, None] * np.ones(j1 - j0)
+    data, indices, indptr = [], [], [0]
+    for mask in masks:
+        cells = np.flatnonzero(mask[i0:i1, j0:j1])
+        data.append(area.ravel()[cells])
+        indices.append(cells)
+        indptr.append(indptr[-1] + cells.size)
+
+    return {
+        'data': np.concatenate(data) if data else np.array([]),
+        'indices': np.concatenate(indices) if indices else np.array([], dtype=np.int64),
+        'indptr': np.array(indptr),
+        'box': np.array([i0, i1, j0, j1]),
+        'names': np.array(names),
+    }
+
+
+def load_or_build(lat, lon, regions, cache_dir):
+    """Return the weights for this grid and region set, building and saving them on first use."""
+    key = weights_key(lat, lon, regions)
+    if key in _loaded:
+        return _loaded[key]
+
+    path = os.path.join(cache_dir, f"weights_{key}.npz")
+    if os.path.exists(path):
+        with np.load(path) as f:
+            weights = {name: f[name] for name in f.files}
+    else:
+        print(f"Building region weights {key} ({len(regions)} regions)")
+        weights = build_weights(lat, lon, regions)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write then rename so concurrent jobs never read a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **weights)
+        os.replace(tmp_path, path)
+
+    i0, i1, j0, j1 = (int(v) for v in weights['box'])
+    weights['matrix'] = csr_matrix(
+        (weights['data'], weights['indices'], weights['indptr']),
+        shape=(len(weights['names']), (i1 - i0) * (j1 - j0))
+    )
+    _loaded[key] = weights
+    return weights
+
+
+def regional_means(weights, data, time_chunk=DEFAULT_TIME_CHUNK):
+    """
+    Area-weighted mean of every region for every time step.
+
+    `data` is (time, lat, lon) on the grid the weights were built for: a
+    NumPy array, or a lazy xarray DataArray of which only the regions'
+    bounding box is read, `time_chunk` steps at a time.  NaN cells are left
+    out of each mean; a region with no valid cell gives NaN.
+
+    Returns a (n_regions, n_time) float64 array in weights['names'] order.
+    """
+    i0, i1, j0, j1 = (int(v) for v in weights['box'])
+    matrix = weights['matrix']
+    n_time = data.shape[0]
+    out = np.empty((matrix.shape[0], n_time))
+
+    for start in range(0, n_time, time_chunk):
+        stop = min(start + time_chunk, n_time)
+        block = np.asarray(data[start:stop, i0:i1, j0:j1], dtype=np.float64).reshape(stop - start, -1)
+        valid = np.isfinite(block)
+        total = matrix @ np.where(valid, block, 0).T
+        weight = matrix @ valid.T.astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[:, start:stop] = np.where(weight > 0, total / weight, np.nan)
+
+    return out
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/series_store.py
+# Time-chunked companion stores for long series over small areas.
+#
+# The Zarr cubes (zarr_cube.py) hold one time step per chunk, which suits
+# maps but means a multi-year series at one place touches one chunk per day.
+# Each product listed in SERIES gets a second store, <product>_series.zarr,
+# holding the same values chunked long in time and small in space (OSTIA:
+# 4096 days x 16 x 16 cells), so a series over a small polygon is a handful
+# of chunk reads and a point series over the whole 2007- record is one or
+# two (point_series / sample_points).
+#
+# A store is seeded from the product's multi-year file when it has one (the
+# 2007-2024 OSTIA download), then kept current by sync().  Appending a day
+# straight to the long chunks would rewrite the open time chunk of every
+# spatial chunk (GBs for OSTIA), so new cube steps go to a small tail store,
+# <product>_series_tail.zarr, chunked short in time and wide in space
+# (TAIL_CHUNKS), and are folded into the long chunks in one pass once
+# FOLD_STEPS of them have built up (fewer if that fills the open chunk).
+# open_series() returns the store and the tail together, so readers never
+# see the difference.  Cube steps are matched to the store's grid by nearest
+# coordinate.
+
+import os
+import shutil
+
+import numpy as np
+
+import zarr_cube
+
+
+# Default steps per time chunk and cells per side of a spatial chunk
+# (a product's 'chunks' entry overrides both)
+TIME_CHUNK = 1024
+SPACE_CHUNK = 32
+
+# Cube steps read and appended at a time
+DEFAULT_BLOCK = 256
+
+# (time, lat, lon) chunks of the tail store: a daily append rewrites only the
+# open 16-step chunk of each 64 x 64 tile, and a point series reads at most
+# FOLD_STEPS / 16 tail chunks
+TAIL_CHUNKS = (16, 64, 64)
+
+# Tail steps gathered before they are folded into the long chunks
+FOLD_STEPS = 256
+
+# Products with a series store: source cube, variable, coordinate names,
+# extent (in the cube's longitude convention) and optional multi-year seed
+SERIES = {
+    'OSTIA': {
+        'cube': 'OSTIA',
+        'variable': 'analysed_sst',
+        'lat': 'latitude', 'lon': 'longitude',
+        'bounds': {'min_lon': -85, 'max_lon': -40, 'min_lat': 20, 'max_lat': 50},
+        'chunks': (4096, 16, 16),
+        'seed': '/vast/clidex/data/obs/SST/OSTIA/data/METOFFICE-GLO-SST-L4-NRT-OBS-SST-V2_multi-vars_84.97W-40.03W_20.02N-49.97N_2007-01-01-2024-12-31.nc',
+    },
+    'SMAP_8day': {
+        'cube': 'SMAP_8day',
+        'variable': 'sss_smap_40km',
+        'lat': 'lat', 'lon': 'lon',
+        'bounds': {'min_lon': 275, 'max_lon': 320, 'min_lat': 20, 'max_lat': 50},
+        'seed': None,
+    },
+}
+
+
+def series_path(product, store_dir=None):
+    """Location of a product's time-chunked store."""
+    return os.path.join(store_dir or zarr_cube.DEFAULT_STORE_DIR, f"{product}_series.zarr")
+
+
+def tail_path(product, store_dir=None):
+    """Location of a product's tail of not yet folded steps."""
+    return os.path.join(store_dir or zarr_cube.DEFAULT_STORE_DIR, f"{product}_series_tail.zarr")
+
+
+def _crop(da, spec):
+    """Crop to spec['bounds'], latitude ascending."""
+    bounds = spec['bounds']
+    if da[spec['lat']].values[0] > da[spec['lat']].values[-1]:
+        da = da.isel({spec['lat']: slice(None, None, -1)})
+    return da.sel({spec['lat']: slice(bounds['min_lat'], bounds['max_lat']),
+                   spec['lon']: slice(bounds['min_lon'], bounds['max_lon'])})
+
+
+def chunks(product):
+    """(time, lat, lon) chunk shape of a product's series store."""
+    return tuple(SERIES[product].get('chunks', (TIME_CHUNK, SPACE_CHUNK, SPACE_CHUNK)))
+
+
+def _encoding(da, spec, chunk_shape=None):
+    """Time-major chunking for the first write (the product's, or chunk_shape); later appends inherit it."""
+    return {
+        'time': {'units': 'days since 1970-01-01', 'dtype': 'float64'},
+        spec['variable']: {'chunks': tuple(chunk_shape or spec.get('chunks', (TIME_CHUNK, SPACE_CHUNK, SPACE_CHUNK)))},
+    }
+
+
+def _write_block(da, path, spec, chunk_shape=None):
+    """Append one (time, lat, lon) block, creating the store on first write."""
+    block = da.astype(np.float32).to_dataset(name=spec['variable'])
+    for name in block.variables:
+        block[name].encoding = {}
+    if os.path.exists(path):
+        block.to_zarr(path, append_dim='time', consolidated=True)
+    else:
+        block.to_zarr(path, mode='w-', encoding=_encoding(block[spec['variable']], spec, chunk_shape),
+                      consolidated=True)
+
+
+def _seed(path, product):
+    """
+    Write the multi-year seed file into a new store; returns the steps written.
+
+    The store is laid out empty first and then filled one band of chunk rows
+    at a time (every step of those rows), so each chunk is written exactly
+    once instead of once per appended block.
+    """
+    import dask.array
+    import xarray as xr
+
+    spec = SERIES[product]
+    shape = chunks(product)
+    with xr.open_dataset(spec['seed']) as ds:
+        da = _crop(ds[spec['variable']], spec).transpose('time', spec['lat'], spec['lon'])
+        da = da.drop_vars([c for c in da.coords if c not in da.dims])
+
+        empty = xr.Dataset(
+            {spec['variable']: (da.dims, dask.array.zeros(da.shape, chunks=shape, dtype=np.float32))},
+            coords=da.coords,
+        )
+        empty.to_zarr(path, mode='w-', compute=False, encoding=_encoding(da, spec), consolidated=True)
+
+        n_lat = da.sizes[spec['lat']]
+        for start in range(0, n_lat, shape[1]):
+            band = da.isel({spec['lat']: slice(start, start + shape[1])}).astype(np.float32).load()
+            band = band.to_dataset(name=spec['variable']).drop_vars(['time', spec['lon']])
+            for name in band.variables:
+                band[name].encoding = {}
+            band.to_zarr(path, region={spec['lat']: slice(start, start + band.sizes[spec['lat']])})
+            print(f"{os.path.basename(path)}: seeded rows {start + band.sizes[spec['lat']]}/{n_lat}")
+        return da.sizes['time']
+
+
+def _fold(product, store_dir=None, force=False):
+    """
+    Move the tail's steps into the long chunks once enough have built up.
+
+    The tail is folded when it holds FOLD_STEPS steps, or as many as fill
+    the store's open time chunk if that is fewer (force folds whatever is
+    there).  Each fold rewrites the open chunk of every spatial chunk once.
+    Returns the number of steps moved.
+    """
+    import xarray as xr
+
+    spec = SERIES[product]
+    path, tail = series_path(product, store_dir), tail_path(product, store_dir)
+    if not os.path.exists(tail):
+        return 0
+
+    times = zarr_cube.stored_times(path)
+    tail_times = zarr_cube.stored_times(tail)
+    room = chunks(product)[0] - times.size % chunks(product)[0]
+    if not force and tail_times.size < min(room, FOLD_STEPS):
+        return 0
+
+    # Steps a fold interrupted before removing the tail are already in the store
+    keep = np.flatnonzero(tail_times > times.max()) if times.size else np.arange(tail_times.size)
+    with xr.open_zarr(tail, consolidated=True) as ds:
+        da = ds[spec['variable']].isel(time=keep)
+        for start in range(0, da.sizes['time'], FOLD_STEPS):
+            _write_block(da.isel(time=slice(start, start + FOLD_STEPS)).load(), path, spec)
+    shutil.rmtree(tail)
+    print(f"{product}: folded {keep.size} tail step(s) into {os.path.basename(path)}")
+    return keep.size
+
+
+def sync(product, store_dir=None, block=DEFAULT_BLOCK, fold=False):
+    """
+    Bring a product's series store up to date with its cube.
+
+    Parameters:
+    -----------
+    product : str
+        Key of SERIES
+    store_dir : str, optional
+        Directory holding the cubes and series stores (default zarr_cube.DEFAULT_STORE_DIR)
+    block : int
+        Steps read and appended at a time
+    fold : bool
+        Fold the tail into the long chunks now, however short it is
+
+    New steps are appended to the tail store and folded into the long
+    chunks by _fold(); a product without a seed is built straight into the
+    long chunks on its first sync.  Returns the number of time steps appended.
+    """
+    import xarray as xr
+
+    spec = SERIES[product]
+    path, tail = series_path(product, store_dir), tail_path(product, store_dir)
+    n = 0
+
+    with zarr_cube._store_lock(path):
+        if not os.path.exists(path):
+            # A tail without its store is left from a removed store
+            if os.path.exists(tail):
+                shutil.rmtree(tail)
+            if spec['seed']:
+                n += _seed(path, product)
+
+        if not os.path.exists(zarr_cube.store_path(spec['cube'], store_dir)):
+            return n
+
+        times = np.concatenate([zarr_cube.stored_times(path), zarr_cube.stored_times(tail)])
+        last = times.max() if times.size else None
+        if last is not None:
+            stored = _open(path, spec).encoding.get('chunks')
+            if stored is not None and tuple(stored) != chunks(product):
+                print(f"[WARNING] {product}: series store is chunked {tuple(stored)}, configured "
+                      f"{chunks(product)}; rerun zarr_ingest with --rebuild to rechunk")
+
+        cube = zarr_cube.open_cube(spec['cube'], store_dir)[spec['variable']]
+        cube = cube.transpose('time', spec['lat'], spec['lon'])
+        if last is not None:
+            # Newer steps only, on the store's own grid, into the tail
+            cube = cube.isel(time=np.flatnonzero(cube['time'].values > last))
+            with xr.open_zarr(path, consolidated=True) as ds:
+                grid = {spec['lat']: ds[spec['lat']].values, spec['lon']: ds[spec['lon']].values}
+            cube = cube.sel(grid, method='nearest').assign_coords(grid)
+            target, chunk_shape = tail, TAIL_CHUNKS
+        else:
+            cube = _crop(cube, spec)
+            target, chunk_shape = path, None
+
+        for start in range(0, cube.sizes['time'], block):
+            chunk = cube.isel(time=slice(start, start + block)).load()
+            _write_block(chunk, target, spec, chunk_shape)
+            print(f"{product}: appended {chunk.sizes['time']} step(s) through {str(chunk['time'].values[-1])[:10]}"
+                  f" to {os.path.basename(target)}")
+        n += cube.sizes['time']
+
+        _fold(product, store_dir, force=fold)
+
+    return n
+
+
+def _open(path, spec):
+    """Lazily open one store's variable."""
+    import xarray as xr
+
+    return xr.open_zarr(path, consolidated=True)[spec['variable']]
+
+
+def open_series(product, store_dir=None):
+    """
+    Lazily open a product's series as a (time, lat, lon) DataArray.
+
+    The long-chunked store is followed by any tail steps not yet folded
+    into it.
+    """
+    import xarray as xr
+
+    spec = SERIES[product]
+    da = _open(series_path(product, store_dir), spec)
+    tail = tail_path(product, store_dir)
+    if os.path.exists(tail):
+        tail_da = _open(tail, spec)
+        if da.sizes['time']:
+            # A fold in progress may already have copied some tail steps
+            tail_da = tail_da.isel(time=np.flatnonzero(tail_da['time'].values > da['time'].values[-1]))
+        if tail_da.sizes['time']:
+            da = xr.concat([da, tail_da], dim='time', join='override')
+    return da
+
+
+def _grid_lon(lon, grid_lon):
+    """Longitudes wrapped into the grid's 0/360 or -180/180 convention."""
+    lon = np.asarray(lon, dtype=np.float64)
+    if np.nanmax(grid_lon) > 180:
+        return np.mod(lon, 360)
+    return ((lon + 180) % 360) - 180
+
+
+def point_series(product, lon, lat, store_dir=None):
+    """
+    Whole record at the grid cell nearest (lon, lat), as a (time,) DataArray.
+
+    The cell's values sit in one spatial chunk, so this reads one chunk per
+    time chunk of the store (one or two for the OSTIA record).
+    """
+    spec = SERIES[product]
+    da = open_series(product, store_dir)
+    lon = float(_grid_lon(lon, da[spec['lon']].values))
+    return da.sel({spec['lat']: lat, spec['lon']: lon}, method='nearest').load()
+
+
+def sample_points(product, lons, lats, times, store_dir=None, max_days=1):
+    """
+    Values at many (lon, lat, time) points, e.g. profile casts.
+
+    Each point takes the nearest grid cell and the nearest stored step; points
+    with no step within max_days (e.g. newer than the store) get NaN.  Only
+    the chunks holding the points' cells are read.
+
+    Returns a float array in the order of the inputs.
+    """
+    import xarray as xr
+
+    spec = SERIES[product]
+    da = open_series(product, store_dir)
+    times = np.asarray(times, dtype='datetime64[ns]')
+    points = {
+        spec['lat']: xr.DataArray(np.asarray(lats, dtype=np.float64), dims='points'),
+        spec['lon']: xr.DataArray(_grid_lon(lons, da[spec['lon']].values), dims='points'),
+        'time': xr.DataArray(times, dims='points'),
+    }
+    sampled = da.sel(points, method='nearest').load()
+    values = sampled.values.astype(np.float64)
+    values[np.abs(sampled['time'].values - times) > np.timedelta64(max_days, 'D')] = np.nan
+    return values
@@ -0,0 +1,654 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/tile_engine.py
+# In-process XYZ tile builder shared by the make_tiles scripts.
+#
+# Replaces the gdal_translate -> gdaldem color-relief -> gdal2tiles.py chain:
+# a 2-D float array plus its geotransform goes in, a {z}/{x}/{y}.png pyramid
+# comes out, with colors taken from a NumPy lookup table.
+#
+# Tiles go either to a directory tree (the gdal2tiles layout) or to one
+# MBTiles archive per date (out_dir + ".mbtiles"), selected with the
+# TILE_OUTPUT environment variable; tools/tile_server.py serves both.
+# Tiles are encoded straight from the colormap indices as 8-bit paletted
+# PNGs (palette + tRNS chunk) or, with TILE_FORMAT=webp, lossless WebP.
+#
+# Fully transparent tiles are never written (the map treats a missing tile
+# as no-data).  Identical tiles are stored once: directory output hardlinks
+# each tile to a content-addressed copy in <product>/tile_store, and MBTiles
+# output uses the map/images schema so repeated tiles share one blob.
+
+import os
+import io
+import errno
+import hashlib
+import sqlite3
+
+import numpy as np
+from PIL import Image
+from rasterio.warp import calculate_default_transform, reproject, Resampling
+
+import warp_cache
+
+
+# Web Mercator (EPSG:3857) half-width in meters and tile edge in pixels
+ORIGIN_SHIFT = 20037508.342789244
+TILE_SIZE = 256
+
+# Default tile output: "directory" or "mbtiles"
+TILE_OUTPUT = os.environ.get("TILE_OUTPUT", "directory")
+
+# Hardlink identical directory tiles to one content-addressed copy (0 = off);
+# TILE_STORE_DIR overrides the per-product <product>/tile_store location
+TILE_DEDUP = os.environ.get("TILE_DEDUP", "1") != "0"
+TILE_STORE_DIR = os.environ.get("TILE_STORE_DIR") or None
+
+# Tile encoding: "png" (paletted) or "webp" (lossless); must match the
+# extension the frontend requests (TILE_FORMAT in scripts/config.js)
+TILE_FORMAT = os.environ.get("TILE_FORMAT", "png")
+
+# zlib level for paletted PNGs: 6 is ~3x faster to encode than 9 on our
+# tiles for ~5% more bytes, and still well under the RGBA tiles' size
+PNG_COMPRESS_LEVEL = 6
+
+# libwebp effort (0 fast .. 6 smallest)
+WEBP_METHOD = 4
+
+# Zoom levels rendered per block from the deepest zoom: each block is one
+# tile at (max zoom - BLOCK_LEVELS), i.e. 8x8 deepest tiles / 2048x2048 px
+BLOCK_LEVELS = 3
+
+
+# ---------------------------------------------------------------------------
+# Colormaps
+# ---------------------------------------------------------------------------
+
+def colormap_lut(cmap, n=255):
+    """
+    Build a 256-entry RGBA lookup table from a matplotlib/cmocean colormap.
+
+    Index 0 is fully transparent (nodata) and indices 1..n hold the colormap,
+    matching the "0 0 0 0 0" + 255-color files written for gdaldem.
+    """
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    colors = cmap(np.linspace(0, 1, n))
+    lut[1:n + 1, :3] = (colors[:, :3] * 255).astype(np.uint8)
+    lut[1:n + 1, 3] = 255
+    return lut
+
+
+def write_colormap_file(path, lut):
+    """Write a LUT in the gdaldem color-relief text format (index r g b a)."""
+    with open(path, 'w') as f:
+        f.write("0 0 0 0 0\n")  # Transparent for masked values
+        for i in range(1, 256):
+            r, g, b, a = (int(v) for v in lut[i])
+            if a == 0:
+                continue
+            f.write(f"{i} {r} {g} {b} {a}\n")
+
+
+def scale_to_index(data, vmin, vmax):
+    """
+    Map float values onto colormap indices 1..255 (0 = nodata).
+
+    Equivalent to `gdal_translate -ot Byte -scale vmin vmax 1 255`, except
+    that out-of-range values are clipped to the end colors instead of
+    wrapping into the transparent index.
+    """
+    data = np.asarray(data, dtype=np.float32)
+    index = np.zeros(data.shape, dtype=np.uint8)
+    valid = np.isfinite(data)
+    if vmax == vmin:
+        index[valid] = 128
+        return index
+    scaled = 1 + (data[valid] - vmin) * (254.0 / (vmax - vmin))
+    index[valid] = np.clip(np.rint(scaled), 1, 255).astype(np.uint8)
+    return index
+
+
+# ---------------------------------------------------------------------------
+# Reprojection
+# ---------------------------------------------------------------------------
+
+def reproject_to_mercator(data, src_transform, src_crs="EPSG:4326", cache_dir=None):
+    """
+    Reproject a north-up 2-D array to EPSG:3857 entirely in memory.
+
+    With `cache_dir`, the warp map for this source grid is built once and
+    stored there (see warp_cache.py), so fixed-grid products skip
+    calculate_default_transform/reproject on every later date.
+
+    Returns (dst_array, dst_transform); NaN marks nodata in both arrays.
+    """
+    data = np.asarray(data, dtype=np.float32)
+    if cache_dir is not None:
+        warp = warp_cache.load_or_build(data.shape, src_transform, cache_dir, src_crs)
+        return warp_cache.apply_warp(data, warp)
+
+    height, width = data.shape
+    left = src_transform.c
+    top = src_transform.f
+    right = left + src_transform.a * width
+    bottom = top + src_transform.e * height
+
+    dst_transform, dst_width, dst_height = calculate_default_transform(
+        src_crs, "EPSG:3857", width, height, left, bottom, right, top
+    )
+    dst = np.full((dst_height, dst_width), np.nan, dtype=np.float32)
+    reproject(
+        source=data,
+        destination=dst,
+        src_transform=src_transform,
+        src_crs=src_crs,
+        src_nodata=np.nan,
+        dst_transform=dst_transform,
+        dst_crs="EPSG:3857",
+        dst_nodata=np.nan,
+        resampling=Resampling.bilinear
+    )
+    return dst, dst_transform
+
+
+# ---------------------------------------------------------------------------
+# Tile geometry
+# ---------------------------------------------------------------------------
+
+def tile_span(z):
+    """Width of one tile at zoom z in EPSG:3857 meters."""
+    return 2 * ORIGIN_SHIFT / (2 ** z)
+
+
+def tile_bounds(z, x, y):
+    """(minx, miny, maxx, maxy) of an XYZ tile in EPSG:3857."""
+    span = tile_span(z)
+    minx = -ORIGIN_SHIFT + x * span
+    maxy = ORIGIN_SHIFT - y * span
+    return minx, maxy - span, minx + span, maxy
+
+
+def tile_range(bounds, z):
+    """Inclusive XYZ tile index ranges (x0, x1, y0, y1) covering bounds at zoom z."""
+    minx, miny, maxx, maxy = bounds
+    span = tile_span(z)
+    last = 2 ** z - 1
+    eps = 1e-6
+    x0 = int(np.floor((minx + ORIGIN_SHIFT) / span))
+    x1 = int(np.floor((maxx + ORIGIN_SHIFT) / span - eps))
+    y0 = int(np.floor((ORIGIN_SHIFT - maxy) / span))
+    y1 = int(np.floor((ORIGIN_SHIFT - miny) / span - eps))
+    return (max(x0, 0), min(x1, last), max(y0, 0), min(y1, last))
+
+
+def lonlat_to_mercator(lon, lat):
+    """EPSG:4326 degrees to EPSG:3857 meters; longitudes may use either -180/180 or 0/360."""
+    lon = (np.asarray(lon, dtype=np.float64) + 180) % 360 - 180
+    lat = np.asarray(lat, dtype=np.float64)
+    x = np.radians(lon) * ORIGIN_SHIFT / np.pi
+    y = np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) * ORIGIN_SHIFT / np.pi
+    return x, y
+
+
+def mercator_bounds(bounds):
+    """(minx, miny, maxx, maxy) in EPSG:3857 of a {'min_lon', 'max_lon', 'min_lat', 'max_lat'} dict."""
+    (minx, maxx), (miny, maxy) = lonlat_to_mercator(
+        [bounds['min_lon'], bounds['max_lon']], [bounds['min_lat'], bounds['max_lat']]
+    )
+    return float(minx), float(miny), float(maxx), float(maxy)
+
+
+def union_bounds(bounds_list):
+    """Smallest {'min_lon', 'max_lon', 'min_lat', 'max_lat'} box containing every box in bounds_list."""
+    return {
+        'min_lon': min(b['min_lon'] for b in bounds_list),
+        'max_lon': max(b['max_lon'] for b in bounds_list),
+        'min_lat': min(b['min_lat'] for b in bounds_list),
+        'max_lat': max(b['max_lat'] for b in bounds_list),
+    }
+
+
+def array_bounds(shape, transform):
+    """(minx, miny, maxx, maxy) of a north-up array with an affine transform."""
+    height, width = shape
+    left = transform.c
+    top = transform.f
+    right = left + transform.a * width
+    bottom = top + transform.e * height
+    return min(left, right), min(top, bottom), max(left, right), max(top, bottom)
+
+
+# ---------------------------------------------------------------------------
+# Resampling
+# ---------------------------------------------------------------------------
+
+def _sample(data, rows, cols, resampling="bilinear"):
+    """
+    Sample `data` at fractional pixel coordinates (rows x cols grid).
+
+    Pixel centres sit at integer + 0.5.  Bilinear sampling ignores NaN
+    neighbours and re-normalizes the remaining weights; a pixel is kept when
+    at least half of its interpolation weight comes from valid data.
+    """
+    height, width = data.shape
+    out = np.full((len(rows), len(cols)), np.nan, dtype=np.float32)
+
+    inside_r = (rows >= 0) & (rows <= height)
+    inside_c = (cols >= 0) & (cols <= width)
+    if not inside_r.any() or not inside_c.any():
+        return out
+
+    if resampling == "nearest":
+        r = np.clip(np.floor(rows).astype(np.int64), 0, height - 1)
+        c = np.clip(np.floor(cols).astype(np.int64), 0, width - 1)
+        vals = data[np.ix_(r, c)]
+        mask = np.outer(inside_r, inside_c)
+        out[mask] = vals[mask]
+        return out
+
+    # Shift to pixel-centre coordinates for interpolation
+    rows = rows - 0.5
+    cols = cols - 0.5
+    r0 = np.floor(rows).astype(np.int64)
+    c0 = np.floor(cols).astype(np.int64)
+    fr = (rows - r0).astype(np.float32)
+    fc = (cols - c0).astype(np.float32)
+
+    num = np.zeros(out.shape, dtype=np.float32)
+    den = np.zeros(out.shape, dtype=np.float32)
+    for dr, wr in ((0, 1 - fr), (1, fr)):
+        rr = r0 + dr
+        wr = np.where((rr >= 0) & (rr < height), wr, 0)
+        rr = np.clip(rr, 0, height - 1)
+        for dc, wc in ((0, 1 - fc), (1, fc)):
+            cc = c0 + dc
+            wc = np.where((cc >= 0) & (cc < width), wc, 0)
+            cc = np.clip(cc, 0, width - 1)
+            vals = data[np.ix_(rr, cc)]
+            weight = np.outer(wr, wc)
+            ok = np.isfinite(vals)
+            num += np.where(ok, vals, 0) * weight
+            den += np.where(ok, weight, 0)
+
+    keep = (den >= 0.5) & np.outer(inside_r, inside_c)
+    out[keep] = num[keep] / den[keep]
+    return out
+
+
+def sample_mosaic(data, transform, z, x0, y0, nx, ny, resampling="bilinear"):
+    """Resample a north-up EPSG:3857 array onto the nx x ny block of XYZ tiles from (x0, y0)."""
+    minx, _, _, maxy = tile_bounds(z, x0, y0)
+    res = tile_span(z) / TILE_SIZE
+    xs = minx + (np.arange(nx * TILE_SIZE) + 0.5) * res
+    ys = maxy - (np.arange(ny * TILE_SIZE) + 0.5) * res
+    cols = (xs - transform.c) / transform.a
+    rows = (ys - transform.f) / transform.e
+    # One tile row at a time, so _sample's temporaries stay a strip in size
+    out = np.empty((rows.size, cols.size), dtype=np.float32)
+    for r in range(0, rows.size, TILE_SIZE):
+        out[r:r + TILE_SIZE] = _sample(data, rows[r:r + TILE_SIZE], cols, resampling)
+    return out
+
+
+def sample_tile(data, transform, z, x, y, resampling="bilinear"):
+    """Resample a north-up EPSG:3857 array onto one 256x256 XYZ tile."""
+    return sample_mosaic(data, transform, z, x, y, 1, 1, resampling)
+
+
+def downsample(mosaic, resampling="bilinear"):
+    """
+    Halve a tile mosaic to the next zoom out.
+
+    Bilinear pyramids use a NaN-aware 2x2 mean, kept where at least two of
+    the four pixels are valid (the same half-coverage rule as _sample);
+    nearest pyramids take one pixel of each 2x2 block.
+    """
+    if resampling == "nearest":
+        return mosaic[::2, ::2].copy()
+    quads = (mosaic[0::2, 0::2], mosaic[0::2, 1::2], mosaic[1::2, 0::2], mosaic[1::2, 1::2])
+    count = np.zeros(quads[0].shape, dtype=np.uint8)
+    total = np.zeros(quads[0].shape, dtype=np.float32)
+    for quad in quads:
+        valid = np.isfinite(quad)
+        count += valid
+        total += np.where(valid, quad, 0)
+    out = np.full(count.shape, np.nan, dtype=np.float32)
+    np.divide(total, count, out=out, where=count >= 2)
+    return out
+
+
+def _emit_levels(mosaic, z_top, x_origin, y_origin, z_bottom, zooms, bounds, emit,
+                 resampling="bilinear"):
+    """
+    Emit the tiles of a mosaic from z_top down to z_bottom, halving between levels.
+
+    `mosaic` covers whole tiles at z_top starting at tile (x_origin,
+    y_origin), which must be aligned to 2 ** (z_top - z_bottom).  Only zooms
+    listed in `zooms` and tiles intersecting `bounds` are emitted.  Returns
+    the mosaic reduced to z_bottom.
+    """
+    for z in range(z_top, z_bottom - 1, -1):
+        if z < z_top:
+            mosaic = downsample(mosaic, resampling)
+            x_origin //= 2
+            y_origin //= 2
+        if z not in zooms:
+            continue
+        x0, x1, y0, y1 = tile_range(bounds, z)
+        nx = mosaic.shape[1] // TILE_SIZE
+        ny = mosaic.shape[0] // TILE_SIZE
+        for x in range(max(x0, x_origin), min(x1, x_origin + nx - 1) + 1):
+            c = (x - x_origin) * TILE_SIZE
+            for y in range(max(y0, y_origin), min(y1, y_origin + ny - 1) + 1):
+                r = (y - y_origin) * TILE_SIZE
+                emit(z, x, y, mosaic[r:r + TILE_SIZE, c:c + TILE_SIZE])
+    return mosaic
+
+
+# ---------------------------------------------------------------------------
+# Output
+# ---------------------------------------------------------------------------
+
+def encode_png(index, lut, compress_level=PNG_COMPRESS_LEVEL):
+    """
+    Encode colormap indices as an 8-bit paletted PNG.
+
+    The LUT becomes the PLTE chunk and its alpha column the tRNS chunk, so
+    each pixel costs one byte before compression instead of four.
+    """
+    img = Image.fromarray(np.ascontiguousarray(index, dtype=np.uint8), mode='P')
+    img.putpalette(lut[:, :3].ravel().tolist())
+    buf = io.BytesIO()
+    img.save(buf, format='PNG', transparency=lut[:, 3].tobytes(), compress_level=compress_level)
+    return buf.getvalue()
+
+
+def encode_webp(index, lut, method=WEBP_METHOD):
+    """Encode colormap indices as a lossless RGBA WebP."""
+    buf = io.BytesIO()
+    Image.fromarray(lut[index], mode='RGBA').save(buf, format='WEBP', lossless=True, method=method)
+    return buf.getvalue()
+
+
+TILE_ENCODERS = {'png': encode_png, 'webp': encode_webp}
+
+
+def encode_tile(index, lut, tile_format=None):
+    """Encode a (256, 256) index tile in `tile_format` (defaults to TILE_FORMAT)."""
+    tile_format = tile_format or TILE_FORMAT
+    if tile_format not in TILE_ENCODERS:
+        raise ValueError(f"Unknown tile format {tile_format!r} (expected one of {sorted(TILE_ENCODERS)})")
+    return TILE_ENCODERS[tile_format](index, lut)
+
+
+class DirectoryTileWriter:
+    """
+    Write tiles to out_dir/{z}/{x}/{y}.png, the layout gdal2tiles --xyz produced.
+
+    With `store_dir`, each tile is written once to store_dir/<sha1>.png and
+    hardlinked into place, so a tile repeated across zooms, passes or dates
+    costs one directory entry instead of another copy on disk.
+    """
+
+    def __init__(self, out_dir, store_dir=None, extension='png'):
+        self.out_dir = out_dir
+        self.store_dir = store_dir
+        self.extension = extension
+        self._made_dirs = set()
+
+    def _makedirs(self, path):
+        if path not in self._made_dirs:
+            os.makedirs(path, exist_ok=True)
+            self._made_dirs.add(path)
+
+    def _stored(self, tile_bytes):
+        """Path of the content-addressed copy of tile_bytes, writing it if new."""
+        digest = hashlib.sha1(tile_bytes).hexdigest()
+        bucket = os.path.join(self.store_dir, digest[:2])
+        path = os.path.join(bucket, f"{digest[2:]}.{self.extension}")
+        if not os.path.exists(path):
+            self._makedirs(bucket)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(tile_bytes)
+            os.replace(tmp_path, path)
+        return path
+
+    def write(self, z, x, y, tile_bytes):
+        tile_dir = os.path.join(self.out_dir, str(z), str(x))
+        self._makedirs(tile_dir)
+        tile_path = os.path.join(tile_dir, f"{y}.{self.extension}")
+
+        # Never write through an existing path: it may be a link into the store
+        try:
+            os.unlink(tile_path)
+        except FileNotFoundError:
+            pass
+
+        if self.store_dir is not None:
+            try:
+                os.link(self._stored(tile_bytes), tile_path)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                    raise
+                # Filesystem without (enough) hardlinks: fall back to a plain copy
+        with open(tile_path, 'wb') as f:
+            f.write(tile_bytes)
+
+    def close(self):
+        pass
+
+
+def prune_tile_store(store_dir):
+    """Delete stored tiles no longer linked from any tile directory; returns the count."""
+    removed = 0
+    if not os.path.isdir(store_dir):
+        return removed
+    for root, _, names in os.walk(store_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.stat(path).st_nlink == 1:
+                os.unlink(path)
+                removed += 1
+    return removed
+
+
+def default_store_dir(out_dir):
+    """Content store for out_dir = <product>/tiles/<date>: <product>/tile_store."""
+    if TILE_STORE_DIR:
+        return TILE_STORE_DIR
+    tiles_root = os.path.dirname(os.path.normpath(out_dir))
+    return os.path.join(os.path.dirname(tiles_root), 'tile_store')
+
+
+class MBTilesWriter:
+    """
+    Write tiles into a single MBTiles (SQLite) archive.
+
+    An existing archive is updated in place, so the global (z0-7) and local
+    (z8-10) passes of a date land in the same file.  All inserts happen in
+    one transaction committed on close().  Tiles use the map/images layout
+    with a `tiles` view, so identical tiles are stored as one image blob.
+    """
+
+    def __init__(self, path, name=None, extension='png'):
+        self.path = path
+        self.extension = extension
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS images (tile_id TEXT PRIMARY KEY, tile_data BLOB);
+            CREATE TABLE IF NOT EXISTS map (
+                zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS map_index ON map (zoom_level, tile_column, tile_row);
+            CREATE VIEW IF NOT EXISTS tiles AS
+                SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column,
+                       map.tile_row AS tile_row, images.tile_data AS tile_data
+                FROM map JOIN images ON images.tile_id = map.tile_id;
+        """)
+        self._metadata = {
+            'name': name or os.path.splitext(os.path.basename(path))[0],
+            'format': self.extension,
+            'type': 'overlay',
+            'version': '1',
+        }
+
+    def write(self, z, x, y, tile_bytes):
+        tile_id = hashlib.sha1(tile_bytes).hexdigest()
+        self._db.execute(
+            "INSERT OR IGNORE INTO images VALUES (?, ?)", (tile_id, sqlite3.Binary(tile_bytes))
+        )
+        # MBTiles rows count from the south (TMS); XYZ rows count from the north
+        self._db.execute(
+            "INSERT OR REPLACE INTO map VALUES (?, ?, ?, ?)", (z, x, (2 ** z - 1) - y, tile_id)
+        )
+
+    def close(self):
+        # Drop images orphaned by tiles replaced in this pass
+        self._db.execute(
+            "DELETE FROM images WHERE tile_id NOT IN (SELECT tile_id FROM map)"
+        )
+        minzoom, maxzoom = self._db.execute(
+            "SELECT MIN(zoom_level), MAX(zoom_level) FROM map"
+        ).fetchone()
+        if minzoom is not None:
+            self._metadata.update(minzoom=str(minzoom), maxzoom=str(maxzoom))
+        self._db.executemany(
+            "INSERT OR REPLACE INTO metadata VALUES (?, ?)", self._metadata.items()
+        )
+        self._db.commit()
+        self._db.close()
+
+
+def tile_writer(out_dir, output=None, tile_format=None):
+    """Tile writer for out_dir: a {z}/{x}/{y} tree, or out_dir + ".mbtiles"."""
+    output = output or TILE_OUTPUT
+    extension = tile_format or TILE_FORMAT
+    if output == "mbtiles":
+        return MBTilesWriter(out_dir.rstrip(os.sep) + ".mbtiles", extension=extension)
+    if output != "directory":
+        raise ValueError(f"Unknown tile output {output!r} (expected 'directory' or 'mbtiles')")
+    store_dir = default_store_dir(out_dir) if TILE_DEDUP else None
+    return DirectoryTileWriter(out_dir, store_dir, extension=extension)
+
+
+def render_tiles(data, transform, out_dir, zooms, lut, vmin, vmax, resampling="bilinear",
+                 output=None, tile_format=None, clip_bounds=None):
+    """
+    Cut an XYZ tile pyramid from a north-up EPSG:3857 float array.
+
+    Parameters:
+    -----------
+    data : 2-D array
+        Values in EPSG:3857, NaN for nodata
+    transform : affine.Affine
+        Geotransform of `data` (as returned by rasterio / reproject_to_mercator)
+    out_dir : str
+        Tile root; tiles land in out_dir/{z}/{x}/{y}.<tile_format>, or in
+        out_dir.mbtiles when the output is "mbtiles"
+    zooms : iterable of int
+        Zoom levels to render (e.g. range(0, 8) for gdal2tiles -z 0-7)
+    lut : (256, 4) uint8 array
+        Colormap from colormap_lut()
+    vmin, vmax : float
+        Value range stretched across colormap indices 1..255
+    output : str, optional
+        "directory" or "mbtiles"; defaults to TILE_OUTPUT
+    tile_format : str, optional
+        "png" (paletted) or "webp"; defaults to TILE_FORMAT
+    clip_bounds : (minx, miny, maxx, maxy), optional
+        EPSG:3857 box (see mercator_bounds()); only tiles intersecting it
+        are rendered, so one projected array can feed several regions
+
+    Only the deepest zoom is resampled from `data`; every shallower level is
+    built by 2x2 reduction of the float values below it (see downsample()),
+    and each level is colorized separately.  The deepest zoom is rendered
+    in blocks of 2 ** BLOCK_LEVELS tiles, and the levels above the blocks
+    are reduced tile by tile, to bound memory.
+
+    Returns the number of tiles written; fully transparent tiles are
+    skipped and not counted.
+    """
+    data = np.asarray(data, dtype=np.float32)
+    bounds = array_bounds(data.shape, transform)
+    if clip_bounds is not None:
+        bounds = (
+            max(bounds[0], clip_bounds[0]), max(bounds[1], clip_bounds[1]),
+            min(bounds[2], clip_bounds[2]), min(bounds[3], clip_bounds[3])
+        )
+        if bounds[0] >= bounds[2] or bounds[1] >= bounds[3]:
+            return 0
+    tile_format = tile_format or TILE_FORMAT
+    writer = tile_writer(out_dir, output, tile_format)
+    count = 0
+
+    # Single-color tiles (open ocean, solid land fill) recur many times per
+    # pyramid; encode each color once
+    solid_tiles = {}
+
+    def emit(z, x, y, values):
+        nonlocal count
+        index = scale_to_index(values, vmin, vmax)
+        first = index.flat[0]
+        if (index == first).all():
+            if lut[first, 3] == 0:
+                return  # nothing visible: no tile
+            if first not in solid_tiles:
+                solid_tiles[first] = encode_tile(index, lut, tile_format)
+            tile_bytes = solid_tiles[first]
+        else:
+            tile_bytes = encode_tile(index, lut, tile_format)
+        writer.write(z, x, y, tile_bytes)
+        count += 1
+
+    zooms = sorted(set(zooms))
+    if not zooms:
+        writer.close()
+        return count
+    z_max, z_min = zooms[-1], zooms[0]
+    levels = min(BLOCK_LEVELS, z_max - z_min)
+    z_block = z_max - levels
+    block = 2 ** levels
+
+    # Deepest zoom, one block per z_block tile, reduced down to z_block; only
+    # the deepest tiles that intersect the data are sampled
+    overview = {}
+    tx0, tx1, ty0, ty1 = tile_range(bounds, z_max)
+    bx0, bx1, by0, by1 = tile_range(bounds, z_block)
+    for bx in range(bx0, bx1 + 1):
+        for by in range(by0, by1 + 1):
+            x0, x1 = max(tx0, bx * block), min(tx1, (bx + 1) * block - 1)
+            y0, y1 = max(ty0, by * block), min(ty1, (by + 1) * block - 1)
+            mosaic = np.full((block * TILE_SIZE, block * TILE_SIZE), np.nan, dtype=np.float32)
+            r, c = (y0 - by * block) * TILE_SIZE, (x0 - bx * block) * TILE_SIZE
+            mosaic[r:(y1 + 1 - by * block) * TILE_SIZE, c:(x1 + 1 - bx * block) * TILE_SIZE] = sample_mosaic(
+                data, transform, z_max, x0, y0, x1 - x0 + 1, y1 - y0 + 1, resampling
+            )
+            overview[(bx, by)] = _emit_levels(
+                mosaic, z_max, bx * block, by * block, z_block, zooms, bounds, emit, resampling
+            )
+
+    # Shallower zooms from the z_block overview, one level at a time: each
+    # parent tile is the 2x2 reduction of its children (missing ones NaN), so
+    # only tiles over the data are held, never a mosaic of the whole grid
+    for z in range(z_block - 1, z_min - 1, -1):
+        parents = {}
+        for (x, y), values in overview.items():
+            if (x // 2, y // 2) not in parents:
+                parents[(x // 2, y // 2)] = np.full((2 * TILE_SIZE, 2 * TILE_SIZE), np.nan, dtype=np.float32)
+            r, c = (y % 2) * TILE_SIZE, (x % 2) * TILE_SIZE
+            parents[(x // 2, y // 2)][r:r + TILE_SIZE, c:c + TILE_SIZE] = values
+        overview = {key: downsample(mosaic, resampling) for key, mosaic in parents.items()}
+        del parents
+        if z not in zooms:
+            continue
+        x0, x1, y0, y1 = tile_range(bounds, z)
+        for (x, y), values in sorted(overview.items()):
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                emit(z, x, y, values)
+
+    writer.close()
+    return count
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# tools/tile_server.py
+# Minimal HTTP server for the processed_data tree.
+#
+# Tile requests (<product>/tiles/<date>/<z>/<x>/<y>.png) are answered from
+# <product>/tiles/<date>.mbtiles when that archive exists, otherwise from the
+# loose {z}/{x}/{y}.png file.  Every other path (range JSON, date lists,
+# colormaps) is served as a static file, so the web app can point
+# BASE_DATA_PATH or TILE_SERVER_URL in scripts/config.js straight at it.
+#
+#   python tile_server.py --root /home/finn.wimberly/Documents/CCCFA_app_dev/data/processed_data --port 8085
+
+import os
+import re
+import sys
+import sqlite3
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_ROOT = "/home/finn.wimberly/Documents/CCCFA_app_dev/data/processed_data"
+DEFAULT_PORT = 8085
+
+TILE_PATTERN = re.compile(r"^/(?P<archive>.+)/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.(?P<ext>png|webp)$")
+CONTENT_TYPES = {'png': 'image/png', 'webp': 'image/webp'}
+
+# Open archives keyed by (path, inode) so a re-created archive is re-opened
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def open_archive(path):
+    """Shared read-only connection to an MBTiles archive, or None if it doesn't exist."""
+    try:
+        inode = os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+    key = (path, inode)
+    with _connections_lock:
+        db = _connections.get(key)
+        if db is None:
+            db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            _connections[key] = db
+    return db
+
+
+def read_tile(path, z, x, y):
+    """Tile bytes for XYZ (z, x, y) from an MBTiles archive, or None."""
+    db = open_archive(path)
+    if db is None:
+        return None
+    row = db.execute(
+        "SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",
+        (z, x, (2 ** z - 1) - y)
+    ).fetchone()
+    return row[0] if row else None
+
+
+class TileHandler(SimpleHTTPRequestHandler):
+    """Static file handler that looks inside .mbtiles archives for tile paths."""
+
+    def do_GET(self):
+        match = TILE_PATTERN.match(self.path.split('?', 1)[0])
+        if match:
+            archive = os.path.join(self.directory, match['archive'].lstrip('/')) + ".mbtiles"
+            archive = os.path.normpath(archive)
+            if archive.startswith(os.path.normpath(self.directory) + os.sep) and os.path.exists(archive):
+                tile = read_tile(archive, int(match['z']), int(match['x']), int(match['y']))
+                if tile is None:
+                    self.send_error(404, "Tile not in archive")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPES[match['ext']])
+                self.send_header("Content-Length", str(len(tile)))
+                self.end_headers()
+                self.wfile.write(tile)
+                return
+        super().do_GET()
+
+    def end_headers(self):
+        # The map page may be served from a different origin than the tiles
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "public, max-age=3600")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        # Keep cron/nohup logs quiet; errors still go through log_error
+        pass
+
+    def log_error(self, format, *args):
+        sys.stderr.write("%s - %s\n" % (self.address_string(), format % args))
+
+
+def parse_args(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Serve processed_data tiles from MBTiles archives or tile directories."
+    )
+    parser.add_argument(
+        "--root",
+        default=os.environ.get("TILE_SERVER_ROOT", DEFAULT_ROOT),
+        help=f"processed_data directory to serve. Default: {DEFAULT_ROOT}",
+    )
+    parser.add_argument(
+        "--host",
+        default=os.environ.get("TILE_SERVER_HOST", "127.0.0.1"),
+        help="Interface to bind. Default: 127.0.0.1",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=int(os.environ.get("TILE_SERVER_PORT", DEFAULT_PORT)),
+        help=f"Port to listen on. Default: {DEFAULT_PORT}",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    handler = partial(TileHandler, directory=os.path.abspath(args.root))
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Serving {args.root} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
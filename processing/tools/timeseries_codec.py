@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/timeseries_codec.py
+# Compact columnar encoding of the dashboard's regional time-series JSON.
+#
+# sst_timeseries.json / sss_timeseries.json map every date string to a value,
+# three times per region.  The compact form stores the time axis once (a
+# start date and a cadence, or an explicit date list when the axis is
+# irregular) and one column of float32 values per (region, variable):
+#
+#   <name>.compact.json   metadata, plus the values inline as JSON arrays
+#                         (null = missing) in "json" mode
+#   <name>.<hash>.bin     little-endian float32, C order
+#                         [region][variable][time], NaN = missing ("binary");
+#                         named by a hash of its content and written before
+#                         the metadata that points at it, so a reader never
+#                         pairs new values with the old time axis
+#
+# Each file also gets precompressed .gz and .br copies for servers that serve
+# static precompressed variants (brotli is optional; .br is skipped without
+# it).  The legacy dict JSON is still written alongside: the incremental
+# time-series runs read it back as their state, and the dashboard falls back
+# to it when no compact file is present.
+
+import os
+import glob
+import gzip
+import json
+import hashlib
+from datetime import date
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # .br variants are skipped
+    brotli = None
+
+
+FORMAT_NAME = 'cccfa-timeseries'
+FORMAT_VERSION = 1
+
+# Decimal places kept in the inline JSON arrays (float32 carries ~7 digits)
+JSON_DECIMALS = 4
+
+
+def _add_months(d, n):
+    """Same day-of-month n months after d."""
+    month = d.month - 1 + n
+    return d.replace(year=d.year + month // 12, month=month % 12 + 1)
+
+
+def time_axis(dates):
+    """
+    Compact description of a sorted list of 'YYYY-MM-DD' strings.
+
+    Returns (axis, full_dates): axis holds 'start', 'cadence' ('D' daily or
+    'M' monthly on a fixed day) and 'length', or an explicit 'dates' list
+    when neither fits; full_dates is every date on that axis, gaps included
+    (their values are stored as missing).
+    """
+    if not dates:
+        return {'dates': [], 'length': 0}, []
+    days = [date.fromisoformat(d) for d in dates]
+    first, last = days[0], days[-1]
+
+    span = (last - first).days + 1
+    if span <= 2 * len(days):
+        full = [date.fromordinal(first.toordinal() + i) for i in range(span)]
+        return {'start': first.isoformat(), 'cadence': 'D', 'length': span}, [d.isoformat() for d in full]
+
+    if all(d.day == first.day for d in days):
+        n = (last.year - first.year) * 12 + last.month - first.month + 1
+        full = [_add_months(first, i) for i in range(n)]
+        return {'start': first.isoformat(), 'cadence': 'M', 'length': n}, [d.isoformat() for d in full]
+
+    return {'dates': list(dates), 'length': len(dates)}, list(dates)
+
+
+def encode(time_series, variables):
+    """
+    Columnar form of a {region: {'name', var: {date: value}}} time-series dict.
+
+    Returns (meta, values): the metadata dict (axis, region ids and names,
+    variable order) and a float32 (region, variable, time) array with NaN
+    for missing values.
+    """
+    regions = list(time_series)
+    dates = sorted({d for region in regions for var in variables
+                    for d in time_series[region].get(var, {})})
+    axis, full_dates = time_axis(dates)
+    index = {d: i for i, d in enumerate(full_dates)}
+
+    values = np.full((len(regions), len(variables), len(full_dates)), np.nan, dtype=np.float32)
+    for r, region in enumerate(regions):
+        for v, var in enumerate(variables):
+            for d, value in time_series[region].get(var, {}).items():
+                if value is not None:
+                    values[r, v, index[d]] = value
+
+    meta = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        **axis,
+        'regions': regions,
+        'names': [time_series[region].get('name', region) for region in regions],
+        'variables': list(variables),
+    }
+    return meta, values
+
+
+def _write_bytes(path, payload):
+    """Write payload and its .gz/.br variants, each via a temp file and rename."""
+    variants = [(path, payload), (f"{path}.gz", gzip.compress(payload, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((f"{path}.br", brotli.compress(payload, quality=11)))
+    for out_path, data in variants:
+        tmp_path = f"{out_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, out_path)
+
+
+def write_compact(time_series, json_path, variables, mode='binary'):
+    """
+    Write the compact form next to the legacy JSON at json_path.
+
+    Parameters:
+    -----------
+    time_series : dict
+        {region: {'name': str, var: {'YYYY-MM-DD': value or None}}}
+    json_path : str
+        The legacy JSON path; outputs are <stem>.compact.json (+ <stem>.<hash>.bin)
+    variables : list of str
+        Variables to encode, in order (e.g. ['sst', 'ssta', 'clim'])
+    mode : str
+        "binary" (values in the .bin sidecar) or "json" (values inline)
+
+    Returns the list of files written (without the .gz/.br variants).
+    """
+    stem = os.path.splitext(json_path)[0]
+    meta_path = f"{stem}.compact.json"
+    meta, values = encode(time_series, variables)
+    written = []
+
+    # Sidecar named by the metadata being replaced; kept for one more run so
+    # a page that already holds that metadata can still fetch its values
+    previous = None
+    if os.path.exists(meta_path):
+        try:
+            with open(meta_path) as f:
+                previous = json.load(f).get('binary')
+        except ValueError:
+            pass
+
+    if mode == 'binary':
+        payload = values.astype('<f4').tobytes()
+        bin_path = f"{stem}.{hashlib.sha1(payload).hexdigest()[:12]}.bin"
+        meta['binary'] = os.path.basename(bin_path)
+        meta['dtype'] = 'float32'
+        # Values first: the metadata below is what makes them visible
+        _write_bytes(bin_path, payload)
+        written.append(bin_path)
+    else:
+        meta['values'] = [
+            [[None if np.isnan(x) else round(float(x), JSON_DECIMALS) for x in column]
+             for column in region_values]
+            for region_values in values
+        ]
+
+    _write_bytes(meta_path, json.dumps(meta, separators=(',', ':')).encode())
+    written.append(meta_path)
+
+    # Drop sidecars no longer referenced by the current or previous metadata
+    keep = {meta.get('binary'), previous}
+    for old in glob.glob(f"{glob.escape(stem)}.*bin*"):
+        name = os.path.basename(old)
+        if name.endswith(('.bin', '.bin.gz', '.bin.br')) and name.split('.bin')[0] + '.bin' not in keep:
+            os.remove(old)
+    return written
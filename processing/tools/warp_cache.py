@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/warp_cache.py
+# Persistent EPSG:4326 -> EPSG:3857 bilinear warp maps for fixed-grid products.
+#
+# OSTIA, the OSTIA anomaly and SMAP arrive on the same lat/lon grid every day,
+# so the source-pixel indices and bilinear weights of the Mercator warp only
+# need computing once.  Plate carree -> Web Mercator is separable (output
+# columns depend only on longitude, output rows only on latitude), so a warp
+# map is two small 1-D index/weight tables; applying it is one broadcast
+# NumPy gather.  Maps are saved as .npz files keyed by the source grid, its
+# bounds and the target resolution.
+
+import os
+import hashlib
+
+import numpy as np
+from affine import Affine
+from rasterio.warp import calculate_default_transform
+
+
+# Web Mercator sphere radius (EPSG:3857)
+EARTH_RADIUS = 6378137.0
+
+# Warp maps already loaded by this process, keyed like the files on disk
+_loaded = {}
+
+
+def warp_key(shape, src_transform, src_crs="EPSG:4326", resolution=None):
+    """Short hash identifying a source grid + bounds + target resolution."""
+    parts = [
+        "x".join(str(int(n)) for n in shape),
+        ",".join(f"{v:.10g}" for v in tuple(src_transform)[:6]),
+        str(src_crs),
+        str(resolution),
+    ]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+
+def _axis_weights(coords, size):
+    """
+    Bilinear neighbour indices and weights along one axis.
+
+    `coords` are fractional source pixel coordinates (edge-based, so pixel
+    centres sit at i + 0.5).  Returns (index (2, n) int32, weight (2, n)
+    float32); neighbours off the grid get zero weight and points outside the
+    source extent get zero weight on both sides, matching GDAL's bilinear.
+    """
+    inside = (coords >= 0) & (coords <= size)
+    centred = coords - 0.5
+    i0 = np.floor(centred).astype(np.int64)
+    frac = (centred - i0).astype(np.float32)
+
+    index = np.stack([i0, i0 + 1])
+    weight = np.stack([1 - frac, frac])
+    weight[(index < 0) | (index >= size)] = 0
+    weight[:, ~inside] = 0
+    index = np.clip(index, 0, size - 1).astype(np.int32)
+    return index, weight
+
+
+def build_warp(shape, src_transform, src_crs="EPSG:4326", resolution=None):
+    """
+    Compute the warp map for a north-up lat/lon grid.
+
+    Returns a dict with the destination transform/shape and the row/column
+    index and weight tables used by apply_warp().
+    """
+    height, width = shape
+    left = src_transform.c
+    top = src_transform.f
+    right = left + src_transform.a * width
+    bottom = top + src_transform.e * height
+
+    kwargs = {'resolution': resolution} if resolution else {}
+    dst_transform, dst_width, dst_height = calculate_default_transform(
+        src_crs, "EPSG:3857", width, height, left, bottom, right, top, **kwargs
+    )
+
+    # Destination pixel centres back to lon/lat (spherical Mercator inverse)
+    xs = dst_transform.c + (np.arange(dst_width) + 0.5) * dst_transform.a
+    ys = dst_transform.f + (np.arange(dst_height) + 0.5) * dst_transform.e
+    lons = np.degrees(xs / EARTH_RADIUS)
+    lats = np.degrees(np.arctan(np.sinh(ys / EARTH_RADIUS)))
+
+    # Bring longitudes into the source's convention (SMAP uses 0-360)
+    west = min(left, right)
+    lons = (lons - west) % 360 + west
+
+    col_index, col_weight = _axis_weights((lons - left) / src_transform.a, width)
+    row_index, row_weight = _axis_weights((lats - top) / src_transform.e, height)
+
+    return {
+        'dst_transform': np.array(tuple(dst_transform)[:6]),
+        'dst_shape': np.array([dst_height, dst_width]),
+        'row_index': row_index,
+        'row_weight': row_weight,
+        'col_index': col_index,
+        'col_weight': col_weight,
+    }
+
+
+def load_or_build(shape, src_transform, cache_dir, src_crs="EPSG:4326", resolution=None):
+    """Return the warp map for this grid, building and saving it on first use."""
+    key = warp_key(shape, src_transform, src_crs, resolution)
+    if key in _loaded:
+        return _loaded[key]
+
+    path = os.path.join(cache_dir, f"warp_{key}.npz")
+    if os.path.exists(path):
+        with np.load(path) as f:
+            warp = {name: f[name] for name in f.files}
+    else:
+        print(f"Building warp map {key} for grid {shape[0]}x{shape[1]}")
+        warp = build_warp(shape, src_transform, src_crs, resolution)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write then rename so concurrent date workers never read a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **warp)
+        os.replace(tmp_path, path)
+
+    _loaded[key] = warp
+    return warp
+
+
+def apply_warp(data, warp):
+    """
+    Warp a source array with a cached map.
+
+    Returns (dst_array, dst_transform) like tile_engine.reproject_to_mercator.
+    As in GDAL's bilinear warp, a destination pixel is nodata when its
+    nearest source pixel is NaN; otherwise NaN neighbours are left out of
+    the sum and the remaining weights re-normalized.
+    """
+    data = np.asarray(data, dtype=np.float32)
+    rows = warp['row_index']
+    cols = warp['col_index']
+
+    # One gather: (2 row neighbours, 2 column neighbours, dst rows, dst cols)
+    vals = data[rows[:, None, :, None], cols[None, :, None, :]]
+    weight = warp['row_weight'][:, None, :, None] * warp['col_weight'][None, :, None, :]
+    weight = np.where(np.isfinite(vals), weight, 0)
+
+    num = np.sum(np.nan_to_num(vals) * weight, axis=(0, 1))
+    den = np.sum(weight, axis=(0, 1))
+
+    # Nearest neighbour = the larger weight along each axis
+    near_r = np.argmax(warp['row_weight'], axis=0)
+    near_c = np.argmax(warp['col_weight'], axis=0)
+    near_valid = np.isfinite(vals[
+        near_r[:, None], near_c[None, :],
+        np.arange(len(near_r))[:, None], np.arange(len(near_c))[None, :]
+    ])
+
+    dst = np.full(den.shape, np.nan, dtype=np.float32)
+    np.divide(num, den, out=dst, where=(den > 0) & near_valid)
+    return dst, Affine(*warp['dst_transform'])
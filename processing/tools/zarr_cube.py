@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# tools/zarr_cube.py
+# Append-only Zarr time cubes, one per gridded product.
+#
+# The tile, time-series and figure scripts each re-open the raw NetCDF files
+# one at a time.  The ingest stage (../ingest/zarr_ingest.py) appends every
+# downloaded file to a per-product store instead: cropped to the region the
+# consumers use, float32, chunked one time step by 256 x 256 cells and
+# compressed with zarr's default codec, with consolidated metadata so
+# opening a cube is a single metadata read.  Consumers then take weekly or
+# monthly windows and regional series as lazy slices of open_cube().
+#
+# Each time step is stamped with the date parsed from the raw file name, so
+# products without a time dimension (SMAP) line up with those that have one.
+# Stores are append-only: files dated before the last stored step are
+# reported and left for a --rebuild.
+
+import os
+import re
+import glob
+import fcntl
+from datetime import datetime
+from contextlib import contextmanager
+
+import numpy as np
+
+
+DEFAULT_STORE_DIR = '/vast/clidex/data/obs/CCCFA/zarr'
+
+# Spatial chunk edge (cells); every chunk holds a single time step
+CHUNK_SIZE = 256
+
+# Raw files per append (one metadata rewrite per batch)
+DEFAULT_BATCH = 32
+
+# Raw archive layout per product.  bounds crops in the file's own longitude
+# convention (None keeps the whole file, e.g. the regional VIIRS sector).
+PRODUCTS = {
+    'OSTIA': {
+        'raw_dir': '/vast/clidex/data/obs/SST/OSTIA/data/daily',
+        'pattern': '*.nc',
+        'variables': ['analysed_sst'],
+        'date_regex': r'(\d{4}-\d{2}-\d{2})\.nc$',
+        'date_format': '%Y-%m-%d',
+        'lat': 'latitude', 'lon': 'longitude',
+        'bounds': {'min_lon': -86, 'max_lon': -39, 'min_lat': 19, 'max_lat': 51},
+    },
+    'SMAP_8day': {
+        'raw_dir': '/vast/clidex/data/obs/SSS/SMAP/SMAP_RSS_v6.0/data/8daily',
+        'pattern': '*.nc',
+        'variables': ['sss_smap_40km'],
+        'date_regex': r'_(\d{4}_\d{3})_FNL',
+        'date_format': '%Y_%j',
+        'lat': 'lat', 'lon': 'lon',
+        'bounds': {'min_lon': 274, 'max_lon': 321, 'min_lat': 19, 'max_lat': 51},
+    },
+    'SMAP_monthly': {
+        'raw_dir': '/vast/clidex/data/obs/SSS/SMAP/SMAP_RSS_v6.0/data/monthly',
+        'pattern': 'RSS_smap_SSS_L3_monthly_*.nc',
+        'variables': ['sss_smap_40km'],
+        'date_regex': r'_(\d{4}_\d{2})_FNL',
+        'date_format': '%Y_%m',
+        'lat': 'lat', 'lon': 'lon',
+        'bounds': {'min_lon': 274, 'max_lon': 321, 'min_lat': 19, 'max_lat': 51},
+    },
+    'GlobColour': {
+        'raw_dir': '/home/finn.wimberly/Documents/CCCFA_app_dev/data/raw_data/CHL/GlobColour/daily',
+        'pattern': '*.nc',
+        'variables': ['CHL'],
+        'date_regex': r'(\d{4}-\d{2}-\d{2})\.nc$',
+        'date_format': '%Y-%m-%d',
+        'lat': 'latitude', 'lon': 'longitude',
+        'bounds': None,
+    },
+    'VIIRS': {
+        'raw_dir': '/vast/clidex/data/obs/SST/NOAAVIIRS/3day',
+        'pattern': '*.nc4',
+        'variables': ['sst'],
+        'date_regex': r'ACSPOCW_(\d{7})_',
+        'date_format': '%Y%j',
+        'lat': 'lat', 'lon': 'lon',
+        'bounds': None,
+    },
+}
+
+
+def store_path(product, store_dir=None):
+    """Location of a product's cube."""
+    return os.path.join(store_dir or DEFAULT_STORE_DIR, f"{product}.zarr")
+
+
+def file_date(filename, spec):
+    """Date stamped on a raw file (from its name), or None if the name doesn't match."""
+    match = re.search(spec['date_regex'], os.path.basename(filename))
+    if not match:
+        return None
+    return np.datetime64(datetime.strptime(match.group(1), spec['date_format']), 'ns')
+
+
+def raw_files(product):
+    """Raw files of a product on disk, as a sorted list of (date, path)."""
+    spec = PRODUCTS[product]
+    dated = []
+    for path in glob.glob(os.path.join(spec['raw_dir'], spec['pattern'])):
+        date = file_date(path, spec)
+        if date is not None:
+            dated.append((date, path))
+    return sorted(dated)
+
+
+def stored_times(path):
+    """Time steps already in a cube (empty if it doesn't exist yet)."""
+    import xarray as xr
+
+    if not os.path.exists(path):
+        return np.array([], dtype='datetime64[ns]')
+    with xr.open_zarr(path, consolidated=True) as ds:
+        return ds['time'].values
+
+
+def _crop(ds, spec):
+    """Crop to spec['bounds'], whichever way latitude runs."""
+    bounds = spec['bounds']
+    lat = ds[spec['lat']].values
+    lat_slice = (slice(bounds['min_lat'], bounds['max_lat']) if lat[0] < lat[-1]
+                 else slice(bounds['max_lat'], bounds['min_lat']))
+    return ds.sel({spec['lat']: lat_slice, spec['lon']: slice(bounds['min_lon'], bounds['max_lon'])})
+
+
+def read_step(path, spec, date):
+    """One raw file as a single float32 time step stamped with `date`."""
+    import xarray as xr
+
+    with xr.open_dataset(path) as ds:
+        ds = ds[spec['variables']]
+        if 'time' in ds.dims:
+            ds = ds.isel(time=0, drop=True)
+        ds = ds.drop_vars('time', errors='ignore')
+        if spec['bounds'] is not None:
+            ds = _crop(ds, spec)
+        ds = ds.load()
+
+    for name in spec['variables']:
+        ds[name] = ds[name].astype(np.float32)
+    # Drop the NetCDF packing (scale_factor, int16, _FillValue) so every
+    # append writes with the cube's own encoding
+    for name in ds.variables:
+        ds[name].encoding = {}
+    return ds.expand_dims(time=[date])
+
+
+def _encoding(ds, spec):
+    """Chunking for the first write; later appends inherit it."""
+    encoding = {'time': {'units': 'days since 1970-01-01', 'dtype': 'float64'}}
+    for name in spec['variables']:
+        var = ds[name]
+        encoding[name] = {
+            'chunks': tuple(1 if dim == 'time' else min(CHUNK_SIZE, size)
+                            for dim, size in zip(var.dims, var.shape)),
+        }
+    return encoding
+
+
+@contextmanager
+def _store_lock(path):
+    """Exclusive lock so two ingest runs never append to the same cube at once."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def append_files(product, files=None, store_dir=None, batch=DEFAULT_BATCH):
+    """
+    Append raw files newer than the cube's last time step.
+
+    Parameters:
+    -----------
+    product : str
+        Key of PRODUCTS
+    files : list of (date, path), optional
+        Files to consider; default every raw file on disk
+    store_dir : str, optional
+        Directory holding the cubes (default DEFAULT_STORE_DIR)
+    batch : int
+        Files concatenated per append
+
+    Returns the number of time steps appended.
+    """
+    import xarray as xr
+
+    spec = PRODUCTS[product]
+    path = store_path(product, store_dir)
+    files = raw_files(product) if files is None else sorted(files)
+
+    with _store_lock(path):
+        times = stored_times(path)
+        last = times.max() if times.size else None
+
+        # One file per date, newer than what's stored
+        new = {}
+        for date, filename in files:
+            if last is None or date > last:
+                new.setdefault(date, filename)
+        missed = sorted({date for date, _ in files if last is not None and date < last} - set(times))
+        if missed:
+            print(f"[WARNING] {product}: {len(missed)} file(s) dated before {str(last)[:10]} are not in "
+                  f"the cube (first {str(missed[0])[:10]}); rerun with --rebuild to include them")
+
+        new = sorted(new.items())
+        for start in range(0, len(new), batch):
+            steps = [read_step(filename, spec, date) for date, filename in new[start:start + batch]]
+            chunk = xr.concat(steps, dim='time')
+            if os.path.exists(path):
+                chunk.to_zarr(path, append_dim='time', consolidated=True)
+            else:
+                chunk.to_zarr(path, mode='w-', encoding=_encoding(chunk, spec), consolidated=True)
+            print(f"{product}: appended {len(steps)} step(s) through {str(new[start + len(steps) - 1][0])[:10]}")
+
+    return len(new)
+
+
+def open_cube(product, store_dir=None):
+    """Lazily open a product's cube (dims time + the file's spatial dims)."""
+    import xarray as xr
+
+    return xr.open_zarr(store_path(product, store_dir), consolidated=True)
@@ -6,6 +6,8 @@
 
 import xarray as xr
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # figures are rendered in forked worker processes
 import matplotlib.pyplot as plt
 import numpy as np
 from datetime import datetime
@@ -19,6 +21,15 @@ warnings.filterwarnings('ignore')
 import cmocean
 import glob
 from matplotlib.colors import LogNorm
+import sys
+import time
+
+# Shared processing helpers live in ../tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import bathy_cache
+import climatology_cache
+import fast_render
+import parallel
 
 
 # In[2]:
@@ -42,7 +53,7 @@ def plot_map(ax, region, plotbathy=False, inc=2):
 
 
 def get_recent_ostia_monthly_data():
-    """Load and combine all monthly OSTIA SST files available from the last 18 months"""
+    """Lazily open all monthly OSTIA SST files available from the last 18 months as one (time, lat, lon) array"""
     data_dir = '/vast/clidex/data/obs/SST/OSTIA/data/monthly'
     files = sorted([os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith('.nc')])
     file_trimmed = files[-18::]
@@ -51,24 +62,15 @@ def get_recent_ostia_monthly_data():
         print("No monthly files found.")
         return None
     
-    datasets = [xr.open_dataset(f) for f in file_trimmed]
-    sst_datasets = [ds['analysed_sst'] for ds in datasets]
-    combined = xr.concat(sst_datasets, dim='time')
+    # One multi-file open, stacked along time in file (date) order
+    combined = xr.open_mfdataset(file_trimmed, combine='nested', concat_dim='time')['analysed_sst']
     return combined
 
 
 # In[7]:
 
-# Read in bathymetry data set
-local_file_path = "/vast/clidex/data/bathymetry/ETOPO1/ETOPO1_Bed_g_gmt4.grd"
-bath_ds = xr.open_dataset(local_file_path)
-
-# Convert depths from meters to fathoms (1 fathom = 1.8288 meters)
-fathoms = bath_ds['z'] / 1.8288
-
-# Mask land (above sea level): keep xarray structure
-masked_fathoms = fathoms.where(bath_ds['z'] < 0)
-
+# Isobaths [fathoms]; the cropped ETOPO1 grid and contour lines of each plot
+# region are cached by tools/bathy_cache.py (built from the global grid once)
 contour_levels = [-2000, -1000]
 
 
@@ -106,9 +108,10 @@ def create_ostia_sst_monthly_plots_combined(data, region=[-75, -62, 36, 45]):
         gl = plot_map(ax, region, inc=2)
         sst = data.isel(time=i) - 273.15
 
-        im = ax.contourf(sst.longitude, sst.latitude, sst.values,
-                         levels=levels_c, transform=ccrs.PlateCarree(),
-                         cmap=cmocean.cm.thermal, extend='both')
+        # Rasterized banded field (tools/fast_render.py; FIG_RENDER=contour for contourf)
+        im = fast_render.filled_field(ax, sst.longitude, sst.latitude, sst.values,
+                                      levels_c, cmocean.cm.thermal, extend='both',
+                                      transform=ccrs.PlateCarree())
 
         # Label with formatted date
         date_str = pd.to_datetime(data.time[i].values).strftime('%b %Y')
@@ -118,20 +121,15 @@ def create_ostia_sst_monthly_plots_combined(data, region=[-75, -62, 36, 45]):
                 fontsize=8,
                 bbox=dict(facecolor='white', alpha=0.7, edgecolor='none', pad=1))
 
-        # Subset bathymetry to region
-        lon_mask = (bath_ds['x'] >= region[0]) & (bath_ds['x'] <= region[1])
-        lat_mask = (bath_ds['y'] >= region[2]) & (bath_ds['y'] <= region[3])
-        bathy_subset = masked_fathoms.where(lon_mask & lat_mask, drop=True)
-
-        #Add contours
-        contours = ax.contour(bathy_subset['x'], bathy_subset['y'], bathy_subset,
-                      levels=contour_levels,
-                      colors='black',
-                      linewidths=0.4,
-                      linestyles='dotted',
-                      transform=ccrs.PlateCarree())
+        # Cached isobaths for this region
+        bathy = bathy_cache.load_or_build(region, contour_levels)
+        bathy_cache.draw_contours(ax, bathy,
+                                  colors='black',
+                                  linewidths=0.4,
+                                  linestyles='dotted',
+                                  transform=ccrs.PlateCarree())
 
-        ax.clabel(contours, contours.levels, inline=True, fmt=lambda val: f"{int(abs(val))} fm", fontsize=6)
+        bathy_cache.label_contours(ax, bathy, fmt=lambda val: f"{int(abs(val))} fm", fontsize=6, transform=ccrs.PlateCarree())
 
 
         # Turn off extra axis labels
@@ -178,21 +176,9 @@ def create_ostia_sst_monthly_plots_combined(data, region=[-75, -62, 36, 45]):
 # In[22]:
 
 
-#process data
-combined_data = get_recent_ostia_monthly_data()
-
-
-# In[23]:
-
-
-combined_data
-
-
-# In[24]:
-
-
-#plot data
-create_ostia_sst_monthly_plots_combined(combined_data)
+def ostia_monthly_figure():
+    """Figure job: OSTIA monthly SST means"""
+    create_ostia_sst_monthly_plots_combined(get_recent_ostia_monthly_data())
 
 
 # ## And now our SST anomaly plots:
@@ -202,13 +188,8 @@ create_ostia_sst_monthly_plots_combined(combined_data)
 
 def get_ostia_baseline(baseline_type='2007_2024'):
     """Get OSTIA baseline data"""
-    base_path = '/vast/clidex/data/obs/SST/OSTIA/baselines'
-    if baseline_type == '2007_2024':
-        file = os.path.join(base_path, 'ostia_baseline_2007_2024_85W-40W_20N-50N.nc')
-    elif baseline_type == '2010_2019':
-        file = os.path.join(base_path, 'ostia_baseline_2010_2019_85W-40W_20N-50N.nc')
-    else:
-        raise ValueError(f"Unknown baseline type: {baseline_type}")
+    # Baseline names and files are configured in tools/climatology_cache.py
+    file = climatology_cache.ostia_baseline_file(baseline_type)
     
     if os.path.exists(file):
         with xr.open_dataset(file) as ds:
@@ -228,18 +209,17 @@ def calculate_monthly_anomalies(data, baseline_data):
     sst = data - 273.15
     baseline = baseline_data - 273.15
 
-    if sst.latitude.size != baseline.latitude.size or sst.longitude.size != baseline.longitude.size:
+    if (sst.latitude.size != baseline.latitude.size or sst.longitude.size != baseline.longitude.size
+            or not np.array_equal(sst.latitude, baseline.latitude)
+            or not np.array_equal(sst.longitude, baseline.longitude)):
         sst = sst.interp_like(baseline)
 
-    doy = data.time.dt.dayofyear.values
+    # Baseline day nearest each month's date, stacked on the months' time axis
+    doy = xr.DataArray(data.time.dt.dayofyear.values, dims='time', coords={'time': data.time.values})
+    baseline_aligned = baseline.sel(dayofyear=doy, method='nearest').drop_vars('dayofyear')
 
-    anomalies = xr.zeros_like(sst)
-    for i in range(len(sst.time)):
-        baseline_day = baseline.sel(dayofyear=doy[i], method='nearest')
-        anomalies[i] = sst[i] - baseline_day
-
-    # Preserve the actual timestamps
-    anomalies = anomalies.assign_coords(time=data.time)
+    # All months in one broadcast subtraction; the actual timestamps are kept
+    anomalies = (sst - baseline_aligned).transpose(*sst.dims).load()
     
     return anomalies
 
@@ -277,24 +257,19 @@ def plot_combined_anomalies(anomalies, baseline_type, region=[-75, -62, 36, 45])
         gl = plot_map(ax, region, inc=2)
         anomaly_month = anomalies.isel(time=i).squeeze()
 
-        im = ax.contourf(anomaly_month.longitude, anomaly_month.latitude, anomaly_month.values, 
-                         levels=levels_c, transform=ccrs.PlateCarree(),
-                         cmap='RdBu_r', extend='both')
-
-        # Subset bathymetry to region
-        lon_mask = (bath_ds['x'] >= region[0]) & (bath_ds['x'] <= region[1])
-        lat_mask = (bath_ds['y'] >= region[2]) & (bath_ds['y'] <= region[3])
-        bathy_subset = masked_fathoms.where(lon_mask & lat_mask, drop=True)
+        im = fast_render.filled_field(ax, anomaly_month.longitude, anomaly_month.latitude, anomaly_month.values,
+                                      levels_c, 'RdBu_r', extend='both',
+                                      transform=ccrs.PlateCarree())
 
-        #Add contours
-        contours = ax.contour(bathy_subset['x'], bathy_subset['y'], bathy_subset,
-                      levels=contour_levels,
-                      colors='black',
-                      linewidths=0.4,
-                      linestyles='dotted',
-                      transform=ccrs.PlateCarree())
+        # Cached isobaths for this region
+        bathy = bathy_cache.load_or_build(region, contour_levels)
+        bathy_cache.draw_contours(ax, bathy,
+                                  colors='black',
+                                  linewidths=0.4,
+                                  linestyles='dotted',
+                                  transform=ccrs.PlateCarree())
 
-        ax.clabel(contours, contours.levels, inline=True, fmt=lambda val: f"{int(abs(val))} fm", fontsize=6)
+        bathy_cache.label_contours(ax, bathy, fmt=lambda val: f"{int(abs(val))} fm", fontsize=6, transform=ccrs.PlateCarree())
 
 
         # Label with formatted date
@@ -349,20 +324,15 @@ def plot_combined_anomalies(anomalies, baseline_type, region=[-75, -62, 36, 45])
 # In[28]:
 
 
-#load all monthly SST data
-data = combined_data
-
-#load baseline
-baseline = get_ostia_baseline('2007_2024')
-
-#calculate anomalies
-anomalies = calculate_monthly_anomalies(data, baseline)
-
-#anomalies
-
+def ostia_anomaly_figure(baseline_type):
+    """Figure job: OSTIA monthly SST anomalies against one baseline"""
+    #load all monthly SST data and the baseline
+    data = get_recent_ostia_monthly_data()
+    baseline = get_ostia_baseline(baseline_type)
 
-#plot
-plot_combined_anomalies(anomalies, '2007_2024')
+    #calculate anomalies and plot
+    anomalies = calculate_monthly_anomalies(data, baseline)
+    plot_combined_anomalies(anomalies, baseline_type)
 
 
 # ## SSS Monthly averages:
@@ -425,26 +395,21 @@ def create_smap_sss_monthly_plots_combined(data, region=[-75, -62, 36, 45]):
         gl = plot_map(ax, region, inc=2)
         sss = data.isel(time=i)['sss_smap']
     
-        # Colored filled contours
-        im = ax.contourf(sss.lon, sss.lat, sss.values,
-                         levels=levels, transform=ccrs.PlateCarree(),
-                         cmap=cmap, extend='both', vmin=vmin, vmax=vmax)
-
-        # Subset bathymetry to region
-        lon_mask = (bath_ds['x'] >= region[0]) & (bath_ds['x'] <= region[1])
-        lat_mask = (bath_ds['y'] >= region[2]) & (bath_ds['y'] <= region[3])
-        bathy_subset = masked_fathoms.where(lon_mask & lat_mask, drop=True)
-
-        #Add contours
-        contours = ax.contour(bathy_subset['x'], bathy_subset['y'], bathy_subset,
-                      levels=contour_levels,
-                      colors='black',
-                      linewidths=0.4,
-                      alpha = 0.6,
-                      linestyles='--',
-                      transform=ccrs.PlateCarree())
-
-        #ax.clabel(contours, contours.levels, inline=True, fmt=lambda val: f"{int(abs(val))} fm", fontsize=6)
+        # Colored filled field (rasterized bands, see tools/fast_render.py)
+        im = fast_render.filled_field(ax, sss.lon, sss.lat, sss.values,
+                                      levels, cmap, extend='both', vmin=vmin, vmax=vmax,
+                                      transform=ccrs.PlateCarree())
+
+        # Cached isobaths for this region
+        bathy = bathy_cache.load_or_build(region, contour_levels)
+        bathy_cache.draw_contours(ax, bathy,
+                                  colors='black',
+                                  linewidths=0.4,
+                                  alpha = 0.6,
+                                  linestyles='--',
+                                  transform=ccrs.PlateCarree())
+
+        #bathy_cache.label_contours(ax, bathy, fmt=lambda val: f"{int(abs(val))} fm", fontsize=6, transform=ccrs.PlateCarree())
     
         # Overlay black contour lines at 34 and 35 PSU
         cs = ax.contour(sss.lon, sss.lat, sss.values,
@@ -488,35 +453,28 @@ def create_smap_sss_monthly_plots_combined(data, region=[-75, -62, 36, 45]):
     plt.show()
 
 
+def smap_monthly_figure():
+    """Figure job: SMAP monthly SSS"""
+    create_smap_sss_monthly_plots_combined(get_recent_smap_monthly_data())
 
-# Process data
-combined_sss_data = get_recent_smap_monthly_data()
-
-#combined_sss_data
-
-# Plot data
-create_smap_sss_monthly_plots_combined(combined_sss_data)
 
 # ## Chlorophyll
 
-# Path where your monthly files are stored
-data_path = "/vast/clidex/data/obs/GlobColour/monthly/"
-
-# Find all monthly files
-file_list = sorted(glob.glob(os.path.join(data_path, "*.nc")))
-files_trimmed = file_list[-18::]
+def get_recent_globcolour_monthly_data():
+    """Open the most recent 18 monthly GlobColour CHL files as one dataset"""
+    # Path where your monthly files are stored
+    data_path = "/vast/clidex/data/obs/GlobColour/monthly/"
 
-# # Check found files
-# print(f"Found {len(file_list)} monthly files:")
-# for f in file_list:
-#     print(f)
+    # Find all monthly files
+    file_list = sorted(glob.glob(os.path.join(data_path, "*.nc")))
+    files_trimmed = file_list[-18::]
 
+    if not files_trimmed:
+        print("No monthly files found.")
+        return None
 
-# Open all datasets into one, concatenate along time dimension
-ds = xr.open_mfdataset(files_trimmed, combine='by_coords')
-
-## Print basic information
-#ds
+    # Open all datasets into one, concatenate along time dimension
+    return xr.open_mfdataset(files_trimmed, combine='by_coords')
 
 
 def create_chl_monthly_plots_combined(data, region=[-75, -62, 36, 45]):
@@ -563,18 +521,14 @@ def create_chl_monthly_plots_combined(data, region=[-75, -62, 36, 45]):
                 fontsize=8,
                 bbox=dict(facecolor='white', alpha=0.7, edgecolor='none', pad=1))
 
-        # Subset bathymetry to region (if bath_ds and masked_fathoms are preloaded)
-        lon_mask = (bath_ds['x'] >= region[0]) & (bath_ds['x'] <= region[1])
-        lat_mask = (bath_ds['y'] >= region[2]) & (bath_ds['y'] <= region[3])
-        bathy_subset = masked_fathoms.where(lon_mask & lat_mask, drop=True)
-
-        contours = ax.contour(bathy_subset['x'], bathy_subset['y'], bathy_subset,
-                              levels=contour_levels,
-                              colors='black',
-                              linewidths=0.4,
-                              linestyles='dotted',
-                              transform=ccrs.PlateCarree())
-        ax.clabel(contours, contours.levels, inline=True, fmt=lambda val: f"{int(abs(val))} fm", fontsize=6)
+        # Cached isobaths for this region
+        bathy = bathy_cache.load_or_build(region, contour_levels)
+        bathy_cache.draw_contours(ax, bathy,
+                                  colors='black',
+                                  linewidths=0.4,
+                                  linestyles='dotted',
+                                  transform=ccrs.PlateCarree())
+        bathy_cache.label_contours(ax, bathy, fmt=lambda val: f"{int(abs(val))} fm", fontsize=6, transform=ccrs.PlateCarree())
 
         # Turn off extra axis labels
         if i not in [j * ncols for j in range(nrows)]:
@@ -604,11 +558,65 @@ def create_chl_monthly_plots_combined(data, region=[-75, -62, 36, 45]):
     plt.show()
 
 
+def chl_monthly_figure():
+    """Figure job: GlobColour monthly CHL"""
+    create_chl_monthly_plots_combined(get_recent_globcolour_monthly_data())
+
+
+# ## Render every figure
+#
+# The figures share no data, so each one is a job for the process pool in
+# tools/parallel.py: a worker loads only its own product's files, draws and
+# saves the figure, and the run takes about as long as the slowest figure.
+# TILE_WORKERS sets the pool size (1 renders them one after another
+# in-process); MONTHLY_BASELINES lists the anomaly baselines to draw
+# (comma-separated keys of tools/climatology_cache.py, default 2007_2024,
+# the figure time.html shows).
+
 # In[8]:
 
-create_chl_monthly_plots_combined(ds)
 
+def figure_jobs():
+    """{figure name: (job function, args)} for this run"""
+    baselines = os.environ.get('MONTHLY_BASELINES', '2007_2024')
+    jobs = {'OSTIA_SST_monthly_averages': (ostia_monthly_figure, ())}
+    for baseline_type in [b for b in baselines.split(',') if b]:
+        jobs[f'OSTIA_SST_combined_anomalies_{baseline_type}'] = (ostia_anomaly_figure, (baseline_type,))
+    jobs['SMAP_SSS_monthly_averages'] = (smap_monthly_figure, ())
+    jobs['GlobColour_CHL_monthly_averages'] = (chl_monthly_figure, ())
+    return jobs
+
+
+FIGURE_JOBS = figure_jobs()
+
+
+def render_figure(name):
+    """Run one figure job; returns (name, seconds)"""
+    func, args = FIGURE_JOBS[name]
+    start = time.perf_counter()
+    func(*args)
+    plt.close('all')
+    return name, time.perf_counter() - start
+
+
+def main() -> int:
+    # Build the shared isobath cache once so the workers inherit it
+    bathy_cache.load_or_build([-75, -62, 36, 45], contour_levels)
+
+    start = time.perf_counter()
+    timings = dict(parallel.map_jobs(render_figure, [(name,) for name in FIGURE_JOBS]))
+    total = time.perf_counter() - start
 
+    print("Figure timings:")
+    for name in FIGURE_JOBS:
+        if name in timings:
+            print(f"  {name}: {timings[name]:.1f} s")
+        else:
+            print(f"  {name}: FAILED")
+    print(f"All figures: {total:.1f} s wall, {sum(timings.values()):.1f} s summed")
+    return 0 if len(timings) == len(FIGURE_JOBS) else 1
 
 
+if __name__ == "__main__":
+    raise SystemExit(main())
 
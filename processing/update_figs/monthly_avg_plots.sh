@@ -14,6 +14,16 @@ MONTHLY_PNGS_DIR="/vast/clidex/data/obs/CCCFA/processed_data/monthly_avg_pngs"
 # Log start and take snapshot
 log_changes "start" "$MONTHLY_PNGS_DIR"
 
+# Map rendering (see ../tools/fast_render.py): "raster" banded pcolormesh or "contour" for contourf
+export FIG_RENDER="${FIG_RENDER:-raster}"
+export FIG_PANEL_CELLS="${FIG_PANEL_CELLS:-800}"
+
+# Figure-level worker pool (see ../tools/parallel.py): one worker per figure
+export TILE_WORKERS="${TILE_WORKERS:-5}"
+export TILE_WORKER_MEM_GB="${TILE_WORKER_MEM_GB:-8}"
+# Anomaly baselines to draw (comma-separated keys of ../tools/climatology_cache.py)
+export MONTHLY_BASELINES="${MONTHLY_BASELINES:-2007_2024}"
+
 # Activate environment and run
 source ~/mambaforge/etc/profile.d/conda.sh
 conda activate spyder_salinity
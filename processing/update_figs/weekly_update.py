@@ -26,6 +26,16 @@ from matplotlib.patches import Rectangle
 import matplotlib.dates as mdates
 import matplotlib.cm as cm
 from matplotlib.colors import Normalize
+import sys
+
+# Shared processing helpers live in ../tools
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools'))
+import bathy_cache
+import climatology_cache
+import fast_render
+import manifest
+import profile_store
+import series_store
 
 
 # In[9]:
@@ -46,33 +56,36 @@ def plot_map(ax, region, plotbathy=False, inc=2):
 # In[10]:
 
 
-def fetch_week_of_data():
-    """Load and combine all monthly OSTIA SST files available"""
+# Region shown in the weekly figure [lon_min, lon_max, lat_min, lat_max]
+plot_region = [-72, -66, 38.5, 43.5]
+
+
+def fetch_week_of_data(region=plot_region):
+    """Load the last seven daily OSTIA SST files, cropped to the plot region"""
     data_dir = '/vast/clidex/data/obs/SST/OSTIA/data/daily'
-    files = sorted([os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith('.nc')])
-    this_weeks_files = files[-7::]
+    # Latest dates come from the download manifest, not a directory listing
+    this_weeks_files = [path for _, path in manifest.latest(data_dir, 7)]
     if not this_weeks_files:
         print("No files found for this week.")
         return None
-    
-    datasets = [xr.open_dataset(f) for f in this_weeks_files]
-    combined = xr.concat(datasets, dim='time')
-    return combined
-
 
-# In[11]:
+    def crop(ds):
+        # Applied lazily to each file before combining, so only the region is read
+        return ds[['analysed_sst']].sel(
+            latitude=slice(region[2], region[3]), longitude=slice(region[0], region[1])
+        )
 
+    combined = xr.open_mfdataset(
+        this_weeks_files, combine='nested', concat_dim='time', preprocess=crop
+    )
+    return combined.load()
 
-# Read in bathymetry data set
-local_file_path = "/vast/clidex/data/bathymetry/ETOPO1/ETOPO1_Bed_g_gmt4.grd"
-bath_ds = xr.open_dataset(local_file_path)
 
-# Convert depths from meters to fathoms (1 fathom = 1.8288 meters)
-fathoms = bath_ds['z'] / 1.8288
+# In[11]:
 
-# Mask land (above sea level): keep xarray structure
-masked_fathoms = fathoms.where(bath_ds['z'] < 0)
 
+# Isobaths [fathoms]; the cropped ETOPO1 grid and contour lines of each plot
+# region are cached by tools/bathy_cache.py (built from the global grid once)
 contour_levels = [-1000, -100]
 
 
@@ -95,13 +108,8 @@ weekly_mean = current_week['analysed_sst'].mean(dim='time', skipna=True)
 
 def get_ostia_baseline(baseline_type='2007_2024'):
     """Get OSTIA baseline data"""
-    base_path = '/vast/clidex/data/obs/SST/OSTIA/baselines'
-    if baseline_type == '2007_2024':
-        file = os.path.join(base_path, 'ostia_baseline_2007_2024_85W-40W_20N-50N.nc')
-    elif baseline_type == '2010_2019':
-        file = os.path.join(base_path, 'ostia_baseline_2010_2019_85W-40W_20N-50N.nc')
-    else:
-        raise ValueError(f"Unknown baseline type: {baseline_type}")
+    # Baseline names and files are configured in tools/climatology_cache.py
+    file = climatology_cache.ostia_baseline_file(baseline_type)
     
     if os.path.exists(file):
         with xr.open_dataset(file) as ds:
@@ -120,8 +128,14 @@ def calculate_weekly_anomalies(data, baseline_data):
     sst = data['analysed_sst'] - 273.15
     baseline = baseline_data - 273.15
 
+    # Same extent as the (region-cropped) data
+    baseline = baseline.sel(
+        latitude=slice(float(sst.latitude.min()), float(sst.latitude.max())),
+        longitude=slice(float(sst.longitude.min()), float(sst.longitude.max())),
+    )
+
     # Regrid if necessary
-    if sst.latitude.size != baseline.latitude.size or sst.longitude.size != baseline.longitude.size:
+    if not (np.array_equal(sst.latitude, baseline.latitude) and np.array_equal(sst.longitude, baseline.longitude)):
         sst = sst.interp_like(baseline)
 
     # Compute day-of-year for all input times
@@ -180,30 +194,39 @@ def get_profiles_from_past_month(metadata_file):
     """
     Get all CTD profiles from the past month in OC, IC, or GoM regions.
     
+    Reads the consolidated profile store (tools/profile_store.py) next to
+    the metadata file when there is one, else the metadata CSV.
+    
     Args:
         metadata_file (str): Path to the metadata CSV file
         
     Returns:
         DataFrame: DataFrame of profiles from the past month in target regions
     """
-    # Read metadata
-    df = pd.read_csv(metadata_file)
-    
-    # Convert Date column to datetime
-    df['Date'] = pd.to_datetime(df['Date'])
-    
     # Calculate date range (past month)
     today = datetime.now()
     one_month_ago = today - timedelta(days=31)
-    
-    # Filter profiles from the past month
-    recent_profiles = df[df['Date'] >= one_month_ago]
-    
-    # Filter for profiles in OC, IC, or GoM regions
     target_regions = ['OC', 'IC', 'GoM']
-    filtered_profiles = recent_profiles[
-        recent_profiles['Regions'].str.contains('|'.join(target_regions), na=False)
-    ]
+
+    store = profile_store.load(os.path.dirname(metadata_file))
+    if store is not None:
+        # One read of profiles.nc; casts picked by date and region
+        recent_profiles = profile_store.select(store, start=one_month_ago)
+        filtered_profiles = profile_store.select(store, regions=target_regions, start=one_month_ago)
+    else:
+        # Read metadata
+        df = pd.read_csv(metadata_file)
+        
+        # Convert Date column to datetime
+        df['Date'] = pd.to_datetime(df['Date'])
+        
+        # Filter profiles from the past month
+        recent_profiles = df[df['Date'] >= one_month_ago]
+        
+        # Filter for profiles in OC, IC, or GoM regions
+        filtered_profiles = recent_profiles[
+            recent_profiles['Regions'].str.contains('|'.join(target_regions), na=False)
+        ]
     
     print(f"Found {len(recent_profiles)} profiles from the past month")
     print(f"Found {len(filtered_profiles)} profiles in OC, IC, or GoM regions")
@@ -213,8 +236,14 @@ def get_profiles_from_past_month(metadata_file):
 
 
 def load_profile_data(profile_id, data_dir):
-    """Load CTD profile data from CSV file"""
+    """Load CTD profile data from the consolidated store, or its CSV file if the store doesn't have it"""
     try:
+        store = profile_store.load(data_dir)
+        if store is not None:
+            data = profile_store.measurements(store, profile_id)
+            if data is not None:
+                return data
+
         file_path = os.path.join(data_dir, f"{profile_id}_measurements.csv")
         if not os.path.exists(file_path):
             print(f"File not found: {file_path}")
@@ -237,6 +266,20 @@ def load_profile_data(profile_id, data_dir):
         return None
 
 
+def sample_ostia_at_profiles(profiles_df):
+    """OSTIA SST [°C] at each profile's position and date (NaN where unavailable), or None without the series store"""
+    if profiles_df.empty or not os.path.exists(series_store.series_path('OSTIA')):
+        return None
+    # Nearest cell and day for every cast, read from the time-chunked OSTIA copy
+    values = series_store.sample_points(
+        'OSTIA',
+        profiles_df['Longitude'].astype(float).values,
+        profiles_df['Latitude'].astype(float).values,
+        pd.to_datetime(profiles_df['Date']).values,
+    )
+    return values - 273.15
+
+
 # In[57]:
 
 
@@ -290,14 +333,16 @@ def create_combined_ostia_sst_ctd_overview(mean_sst, mean_anom, dates_recent, re
     ax1.set_extent(region, crs=ccrs.PlateCarree())
     plot_map(ax1, region, inc=2)
 
-    im_sst = ax1.contourf(
+    # Rasterized banded field (tools/fast_render.py; FIG_RENDER=contour for contourf)
+    im_sst = fast_render.filled_field(
+        ax1,
         mean_sst_subset.longitude,
         mean_sst_subset.latitude,
         sst_F.values,
-        levels=levels_c,
-        transform=ccrs.PlateCarree(),
-        cmap=cmocean.cm.thermal,
+        levels_c,
+        cmocean.cm.thermal,
         extend="both",
+        transform=ccrs.PlateCarree(),
     )
 
     # --------- Subset mean_anom ---------
@@ -317,39 +362,36 @@ def create_combined_ostia_sst_ctd_overview(mean_sst, mean_anom, dates_recent, re
     ax2.set_extent(region, crs=ccrs.PlateCarree())
     plot_map(ax2, region, inc=2)
 
-    im_anom = ax2.contourf(
+    im_anom = fast_render.filled_field(
+        ax2,
         mean_anom_subset.longitude,
         mean_anom_subset.latitude,
         mean_anom_F.values,
-        levels=levels_anom,
-        transform=ccrs.PlateCarree(),
-        cmap="RdBu_r",
+        levels_anom,
+        "RdBu_r",
         extend="both",
+        transform=ccrs.PlateCarree(),
     )
 
     # --------- Bathymetry ---------
-    lon_mask = (bath_ds["x"] >= region[0]) & (bath_ds["x"] <= region[1])
-    lat_mask = (bath_ds["y"] >= region[2]) & (bath_ds["y"] <= region[3])
-    bathy_subset = masked_fathoms.where(lon_mask & lat_mask, drop=True)
+    bathy = bathy_cache.load_or_build(region, contour_levels)
 
     for ax in [ax1, ax2]:
-        contours = ax.contour(
-            bathy_subset["x"],
-            bathy_subset["y"],
-            bathy_subset,
-            levels=contour_levels,
+        bathy_cache.draw_contours(
+            ax,
+            bathy,
             colors="black",
             linewidths=0.6,
             linestyles="dotted",
             transform=ccrs.PlateCarree(),
         )
-        ax.clabel(
-            contours,
-            contours.levels,
-            inline=True,
+        bathy_cache.label_contours(
+            ax,
+            bathy,
             fmt=lambda val: f"{int(abs(val))} fm",
             fontsize=10,
             manual=[(-68, 42), (-68, 38)],
+            transform=ccrs.PlateCarree(),
         )
 
     # --------- OC Rectangle ---------
@@ -427,6 +469,10 @@ def create_combined_ostia_sst_ctd_overview(mean_sst, mean_anom, dates_recent, re
     # Track successful profiles
     successful_profiles = []
     profile_locations = []
+
+    # Satellite surface temperature at each cast, for comparison with the CTD
+    ostia_at_casts = sample_ostia_at_profiles(profiles_df)
+    ostia_labelled = False
     
     for idx, (_, profile) in enumerate(profiles_df.iterrows()):
         profile_id = profile['Profile ID']
@@ -453,6 +499,13 @@ def create_combined_ostia_sst_ctd_overview(mean_sst, mean_anom, dates_recent, re
         # Plot temperature
         ax_temp.plot(temp_farenheit, depth_fathoms, 
                     color=color, alpha=0.7, linewidth=1.5)
+
+        # OSTIA SST at the cast, drawn at the surface
+        if ostia_at_casts is not None and np.isfinite(ostia_at_casts[idx]):
+            ax_temp.scatter(ostia_at_casts[idx] * 9 / 5 + 32, 0, marker='*', s=90,
+                            color=color, edgecolors='black', linewidth=0.6, zorder=5,
+                            label=None if ostia_labelled else 'OSTIA SST at cast')
+            ostia_labelled = True
         
         # Plot salinity
         ax_sal.plot(data['salinity'], depth_fathoms, 
@@ -471,6 +524,8 @@ def create_combined_ostia_sst_ctd_overview(mean_sst, mean_anom, dates_recent, re
     ax_temp.set_title('Temperature vs Depth')
     ax_temp.grid(True, alpha=0.3)
     ax_temp.invert_yaxis()
+    if ostia_labelled:
+        ax_temp.legend(loc='lower right', fontsize=9)
     
     ax_sal.set_xlabel('Salinity (PSU)')
     #ax_sal.set_ylabel('Depth (fathoms)')
@@ -585,7 +640,7 @@ profiles_df = get_profiles_from_past_month(metadata_file)
 
 # Create combined plot
 create_combined_ostia_sst_ctd_overview(weekly_mean, anomaly_mean, dates_recent, recent_ssta, 
-                                      profiles_df, data_dir, region=[-72, -66, 38.5, 43.5])
+                                      profiles_df, data_dir, region=plot_region)
 
 
 # In[ ]:
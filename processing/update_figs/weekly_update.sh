@@ -14,6 +14,10 @@ WEEKLY_UPDATES_DIR="/vast/clidex/data/obs/CCCFA/processed_data/weekly_updates"
 # Log start and take snapshot
 log_changes "start" "$WEEKLY_UPDATES_DIR"
 
+# Map rendering (see ../tools/fast_render.py): "raster" banded pcolormesh or "contour" for contourf
+export FIG_RENDER="${FIG_RENDER:-raster}"
+export FIG_PANEL_CELLS="${FIG_PANEL_CELLS:-800}"
+
 # Activate environment and run
 source ~/mambaforge/etc/profile.d/conda.sh
 conda activate spyder_salinity
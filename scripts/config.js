@@ -7,6 +7,14 @@ export const BASE_DATA_PATH = '../data';
 // symlink used to run locally and test prior to pushing
 // export const BASE_DATA_PATH = '/data/processed_data'; 
 
+// Tile server (processing/tools/tile_server.py) for dates written as .mbtiles
+// archives; null serves the {z}/{x}/{y}.png directories from BASE_DATA_PATH
+export const TILE_SERVER_URL = null;
+// export const TILE_SERVER_URL = 'http://localhost:8085';
+
+// Tile image format written by processing/tools/tile_engine.py (TILE_FORMAT: 'png' or 'webp')
+export const TILE_FORMAT = 'png';
+
 // Daily date files
 export const DATE_FILES = {
   SST: `${BASE_DATA_PATH}/SST/sst_dates.txt`,
@@ -83,20 +91,21 @@ export const FISHBOT_DATA = {
 
 // Centralized paths for map tiles, ranges, colormaps, and bathymetry
 export function getTilePath(layerType, date) {
-  const base = BASE_DATA_PATH;
+  // same URL layout either way; the tile server resolves <date> to <date>.mbtiles
+  const base = TILE_SERVER_URL || BASE_DATA_PATH;
   switch (layerType) {
     case 'SST':
-      return `${base}/SST/tiles/${date}/{z}/{x}/{y}.png`;
+      return `${base}/SST/tiles/${date}/{z}/{x}/{y}.${TILE_FORMAT}`;
     case 'SSS':
-      return `${base}/SSS/tiles/${date}/{z}/{x}/{y}.png`;
+      return `${base}/SSS/tiles/${date}/{z}/{x}/{y}.${TILE_FORMAT}`;
     case 'CHL':
-      return `${base}/CHL/tiles/${date}/{z}/{x}/{y}.png`;
+      return `${base}/CHL/tiles/${date}/{z}/{x}/{y}.${TILE_FORMAT}`;
     case 'OSTIA_SST':
-      return `${base}/OSTIA_SST/tiles/${date}/{z}/{x}/{y}.png`;
+      return `${base}/OSTIA_SST/tiles/${date}/{z}/{x}/{y}.${TILE_FORMAT}`;
     case 'OSTIA_anomaly':
-      return `${base}/OSTIA_anomaly/tiles/${date}/{z}/{x}/{y}.png`;
+      return `${base}/OSTIA_anomaly/tiles/${date}/{z}/{x}/{y}.${TILE_FORMAT}`;
     case 'DOPPIO':
-      return `${base}/doppio/tiles/${date}/{z}/{x}/{y}.png`;
+      return `${base}/doppio/tiles/${date}/{z}/{x}/{y}.${TILE_FORMAT}`;
     default:
       return null;
   }
@@ -1,31 +1,47 @@
 import { PROFILE_DATA } from '../config.js';
 
-// Function to load metadata from the CSV and filter profiles by date
-function loadProfilesMetadata(startDate, endDate, dataType = 'CTD') {
-  const metadataPath = dataType === 'CTD' 
-    ? PROFILE_DATA.CTD_METADATA
-    : PROFILE_DATA.EMOLT_METADATA;
+// Consolidated profile stores (<dir>/profiles.json, written by the
+// downloaders), fetched once per data type; resolves to null when a directory
+// has none, in which case the per-profile CSVs are read instead
+const profileStores = {};
 
-  console.log(`Loading ${dataType} profiles from:`, metadataPath);
-  console.log('Profile Date range:', startDate, 'to', endDate);
+function loadProfileStore(dataType) {
+  if (!(dataType in profileStores)) {
+    const dir = dataType === 'CTD' ? PROFILE_DATA.CTD_MEASUREMENTS_DIR : PROFILE_DATA.EMOLT_MEASUREMENTS_DIR;
+    profileStores[dataType] = fetch(`${dir}/profiles.json`)
+      .then((response) => (response.ok ? response.json() : null))
+      .then((store) => {
+        if (store) {
+          // Row of every profile ID, for slicing its measurements by offset
+          store.index = new Map(store.profiles['Profile ID'].map((id, i) => [String(id), i]));
+        }
+        return store;
+      })
+      .catch(() => null);
+  }
+  return profileStores[dataType];
+}
 
-  // Parse input dates with explicit format
-  const parsedStartDate = moment(startDate, 'YYYY-MM-DD');
-  const parsedEndDate = moment(endDate, 'YYYY-MM-DD');
+// Metadata rows of a profile store, keyed like the metadata CSV columns
+function profileStoreRows(store) {
+  const columns = Object.keys(store.profiles);
+  return store.profiles['Profile ID'].map((_, i) => {
+    const row = {};
+    columns.forEach((column) => {
+      row[column] = store.profiles[column][i];
+    });
+    return row;
+  });
+}
 
+// Function to load metadata from the CSV
+function loadProfilesMetadataCsv(metadataPath) {
   return new Promise((resolve, reject) => {
     Papa.parse(metadataPath, {
       download: true,
       header: true,
       complete: (results) => {
-        console.log(`Loaded ${results.data.length} ${dataType} profiles`);
-        const filteredProfiles = results.data.filter((profile) => {
-          // Parse profile date with explicit format (assuming it's in YYYY-MM-DD format in the CSV)
-          const profileDate = moment(profile['Date'], 'YYYY-MM-DD');
-          return profileDate.isBetween(parsedStartDate, parsedEndDate, 'day', '[]');
-        });
-        console.log(`Filtered to ${filteredProfiles.length} profiles in date range`);
-        resolve(filteredProfiles);
+        resolve(results.data);
       },
       error: (error) => {
         console.error('Error loading profile metadata:', error);
@@ -35,8 +51,70 @@ function loadProfilesMetadata(startDate, endDate, dataType = 'CTD') {
   });
 }
 
-// Function to load measurement data from a CSV for a specific profile ID
-function loadMeasurementData(profileId, dataType = 'CTD') {
+// Function to load profile metadata (profile store, else the CSV) and filter profiles by date
+async function loadProfilesMetadata(startDate, endDate, dataType = 'CTD') {
+  const metadataPath = dataType === 'CTD' 
+    ? PROFILE_DATA.CTD_METADATA
+    : PROFILE_DATA.EMOLT_METADATA;
+
+  // Parse input dates with explicit format
+  const parsedStartDate = moment(startDate, 'YYYY-MM-DD');
+  const parsedEndDate = moment(endDate, 'YYYY-MM-DD');
+
+  const store = await loadProfileStore(dataType);
+  let profiles;
+  if (store) {
+    console.log(`Loading ${dataType} profiles from the profile store`);
+    profiles = profileStoreRows(store);
+  } else {
+    console.log(`Loading ${dataType} profiles from:`, metadataPath);
+    profiles = await loadProfilesMetadataCsv(metadataPath);
+  }
+  console.log('Profile Date range:', startDate, 'to', endDate);
+  console.log(`Loaded ${profiles.length} ${dataType} profiles`);
+
+  const filteredProfiles = profiles.filter((profile) => {
+    // Parse profile date with explicit format (YYYY-MM-DD in both the CSV and the store)
+    const profileDate = moment(profile['Date'], 'YYYY-MM-DD');
+    return profileDate.isBetween(parsedStartDate, parsedEndDate, 'day', '[]');
+  });
+  console.log(`Filtered to ${filteredProfiles.length} profiles in date range`);
+  return filteredProfiles;
+}
+
+// Measurements of one profile from a profile store: its slice of every column
+function profileStoreMeasurements(store, row, dataType) {
+  const start = store.offsets[row];
+  const end = store.offsets[row + 1];
+  const columns = dataType === 'CTD'
+    ? ['temperature', 'depth', 'salinity', 'density']
+    : ['temperature', 'depth'];
+
+  const measurements = {};
+  columns.forEach((column) => {
+    measurements[column] = [];
+  });
+  for (let i = start; i < end; i++) {
+    // Same rows as the CSV path: temperature and depth must be present
+    if (store.columns.temperature[i] === null || store.columns.depth[i] === null) {
+      continue;
+    }
+    columns.forEach((column) => {
+      const value = store.columns[column][i];
+      measurements[column].push(value === null ? NaN : value);
+    });
+  }
+  return measurements;
+}
+
+// Function to load measurement data for a specific profile ID, from the
+// profile store when it has the profile, else from the profile's CSV
+async function loadMeasurementData(profileId, dataType = 'CTD') {
+  const store = await loadProfileStore(dataType);
+  if (store && store.index.has(String(profileId))) {
+    return profileStoreMeasurements(store, store.index.get(String(profileId)), dataType);
+  }
+
   const dir = dataType === 'CTD' ? PROFILE_DATA.CTD_MEASUREMENTS_DIR : PROFILE_DATA.EMOLT_MEASUREMENTS_DIR;
   const measurementsPath = `${dir}/${profileId}_measurements.csv`;
 
@@ -85,5 +163,85 @@ function loadMeasurementData(profileId, dataType = 'CTD') {
     });
   });
 }
-export { loadProfilesMetadata, loadMeasurementData };
+// Dates on a compact time axis: start + cadence ('D' daily, 'M' monthly on a
+// fixed day) or an explicit list
+function compactDates(meta) {
+  if (meta.dates) {
+    return meta.dates;
+  }
+  const [year, month, day] = meta.start.split('-').map(Number);
+  const dates = new Array(meta.length);
+  for (let i = 0; i < meta.length; i++) {
+    const d = meta.cadence === 'M'
+      ? new Date(Date.UTC(year, month - 1 + i, day))
+      : new Date(Date.UTC(year, month - 1, day + i));
+    dates[i] = d.toISOString().slice(0, 10);
+  }
+  return dates;
+}
+
+// Function to load a regional time series, preferring the compact columnar
+// copy (<stem>.compact.json + float32 <stem>.<hash>.bin) written next to the legacy
+// JSON; returns the legacy shape {region: {name, var: {date: value|null}}}
+async function loadTimeSeries(legacyUrl) {
+  const stem = legacyUrl.replace(/\.json$/, '');
+  const base = legacyUrl.slice(0, legacyUrl.lastIndexOf('/') + 1);
+
+  const loadLegacy = async () => {
+    const response = await fetch(legacyUrl);
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    return response.json();
+  };
+
+  const metaResponse = await fetch(`${stem}.compact.json`);
+  if (!metaResponse.ok) {
+    console.log(`No compact time series at ${stem}.compact.json, loading ${legacyUrl}`);
+    return loadLegacy();
+  }
+  const meta = await metaResponse.json();
+
+  // Values as [region][variable][time]
+  const nTime = meta.length;
+  let column;
+  if (meta.binary) {
+    const binResponse = await fetch(base + meta.binary);
+    if (!binResponse.ok) {
+      throw new Error(`HTTP error! status: ${binResponse.status}`);
+    }
+    const values = new Float32Array(await binResponse.arrayBuffer());
+    // The sidecar must hold exactly the columns the metadata describes
+    const expected = meta.regions.length * meta.variables.length * nTime;
+    if (values.length !== expected) {
+      console.log(`${meta.binary} holds ${values.length} values, expected ${expected}; loading ${legacyUrl}`);
+      return loadLegacy();
+    }
+    column = (r, v) => values.subarray((r * meta.variables.length + v) * nTime, (r * meta.variables.length + v + 1) * nTime);
+  } else {
+    column = (r, v) => meta.values[r][v];
+  }
+
+  const dates = compactDates(meta);
+  const data = {};
+  meta.regions.forEach((region, r) => {
+    data[region] = { name: meta.names[r] };
+    meta.variables.forEach((variable, v) => {
+      const values = column(r, v);
+      const series = {};
+      for (let i = 0; i < nTime; i++) {
+        const value = values[i];
+        // Missing values and axis gaps are left out (the charts skip nulls either way)
+        if (value === null || Number.isNaN(value)) {
+          continue;
+        }
+        series[dates[i]] = meta.binary ? Math.round(value * 1e4) / 1e4 : value;
+      }
+      data[region][variable] = series;
+    });
+  });
+  return data;
+}
+
+export { loadProfilesMetadata, loadMeasurementData, loadTimeSeries };
 